@@ -4,6 +4,7 @@ from wiithon.builder.copy_source import CopyPartitionSource
 from wiithon.builder.directory_source import DirectoryPartitionSource
 from wiithon.builder.disc_builder import WiiDiscBuilder
 from wiithon.builder.source import PartitionSource
+from wiithon.crypto.group_cache import EncryptedGroupCache
 from wiithon.disc.enums import WiiPartType
 from wiithon.disc.partition import WiiPartitionInfo
 from wiithon.disc.patcher import WiiIsoPatcher
@@ -57,7 +58,7 @@ __all__ = [
     "WiiIsoReader", "WiiIsoPatcher", "WiiPartitionInfo", "WiiPartType",
 
     ## Builder
-    "WiiDiscBuilder", "PartitionSource", "CopyPartitionSource", "DirectoryPartitionSource",
+    "WiiDiscBuilder", "PartitionSource", "CopyPartitionSource", "DirectoryPartitionSource", "EncryptedGroupCache",
 
     ## FST
     "FST", "FSTNode", "FSTFile", "FSTDirectory",
@@ -1,8 +1,8 @@
 import copy
 from collections.abc import Callable
-from pathlib import Path
 
 from wiithon.builder.source import PartitionSource
+from wiithon.crypto.part_reader import CryptPartReader
 from wiithon.disc.reader import WiiIsoReader
 from wiithon.disc.structs.certificate import Certificate
 from wiithon.disc.structs.disc_header import DiscHeader
@@ -18,7 +18,17 @@ class CopyPartitionSource(PartitionSource):
     def __init__(self, reader: WiiIsoReader, partition: WiiPartitionEntry,
                  fst_modifier: Callable[[FST], None] | None = None,
                  dol_modifiers: list[Callable[[DOL], None]] | None = None,
-                 file_overrides: dict[str, bytes] | None = None) -> None:
+                 file_overrides: dict[str, bytes] | None = None,
+                 crypto: CryptPartReader | None = None) -> None:
+        """
+        :param reader: Source image
+        :param partition: Partition to copy
+        :param fst_modifier: Called on the copied FST
+        :param dol_modifiers: Called on the copied DOL
+        :param file_overrides: New data of some files, by path
+        :param crypto: Reader of the partition data to read the files from, instead of a new one.
+                       Lets several sources share a `SharedCryptPartReader`
+        """
         copy_partition = copy.copy(partition)
         self.partition_info = reader.open_partition(copy_partition)
         self.partition_type = partition.part_type
@@ -41,6 +51,7 @@ class CopyPartitionSource(PartitionSource):
             modifier(self.dol)
 
         self._file_overrides: dict[str, bytes] = file_overrides or {}
+        self._crypto = crypto or self.partition_info.crypto
 
     def get_partition_type(self) -> int:
         return self.partition_type
@@ -74,10 +85,10 @@ class CopyPartitionSource(PartitionSource):
         if key in self._file_overrides:
             return self._file_overrides[key]
 
-        node = self.fst.find_node(str(Path(*path)) if path else "")
+        node = self.fst.find_node(path)
 
         if node and not hasattr(node, "children"):  # ie: is a file
-            data = self.partition_info.crypto.read_at(node.original_offset, node.length)
+            data = self._crypto.read_at(node.original_offset, node.length)
             return data
 
         raise FstFileNotFoundError(f"File not found in FST: {path}")
@@ -1,12 +1,18 @@
+import copy
 import hashlib
 import itertools
 import struct
-from collections.abc import Callable
+from collections.abc import Callable, Iterable
+from contextlib import ExitStack
 from io import BytesIO
 from typing import BinaryIO
 
 from wiithon.binary.align import align
+from wiithon.builder.journal import BuildJournal, PartitionJournal
+from wiithon.builder.manifest import BuildManifest, FileRecord, IncrementalBuild, PartitionManifest
+from wiithon.builder.prefetch import DEFAULT_PREFETCH_BYTES, FilePrefetcher
 from wiithon.builder.source import PartitionSource
+from wiithon.crypto.group_cache import GroupCache
 from wiithon.crypto.layout import GROUP_DATA_SIZE, GROUP_SIZE, SHA1_SIZE
 from wiithon.crypto.part_writer import CryptPartWriter
 from wiithon.disc.layout import (
@@ -57,11 +63,51 @@ def fakesign_tmd(tmd_bytes: bytearray, h3: bytes, data_size: int) -> None:
             break
 
 class WiiDiscBuilder:
-    def __init__(self, header: DiscHeader, region: bytes) -> None:
+    def __init__(self, header: DiscHeader, region: bytes,
+                 *, encrypted_cache: GroupCache | None = None,
+                 incremental: IncrementalBuild | None = None,
+                 record_manifest: bool = False,
+                 journal: BuildJournal | None = None,
+                 prefetch_bytes: int = DEFAULT_PREFETCH_BYTES,
+                 encrypted: bool = True, hashed: bool = True) -> None:
+        """
+        :param header: Disc header written at the start of the image
+        :param region: Region settings (0x20 bytes)
+        :param encrypted_cache: Optional cache of encrypted groups shared by every partition
+        :param incremental: Optional previous build whose unchanged groups are reused
+        :param record_manifest: Fill `manifest` with the layout and digests of the image.
+                                Always done for an incremental build, so the next one can be incremental too
+        :param journal: Optional build journal. Groups are recorded in it as they are written, and the groups
+                        an interrupted run already recorded are not written again
+        :param prefetch_bytes: How much file data a background thread may read ahead of the encryption, room for
+                               each file being taken from its FST length before it is read. Only a replaced
+                               file larger than its FST length, or a single file larger than the budget, exceeds
+                               it. 0 reads the files inline
+        :param encrypted: Encrypt the partition data. False makes a development image that Dolphin reads,
+                          flagged in the disc header, without any AES. It cannot use a cache, be incremental,
+                          resumable or have a manifest
+        :param hashed: Fill the hash headers of the partition data. Only possible without encryption:
+                       the partition data is then written linearly
+        """
+        if encrypted and not hashed:
+            raise ValueError("Encrypted partition data always has hash headers")
+        if not encrypted and (encrypted_cache is not None or incremental is not None or journal is not None
+                              or record_manifest):
+            raise ValueError("Unencrypted builds cannot be cached, incremental, resumable or have a manifest")
+
         self.header: DiscHeader = header
         self.region: bytes = region
         self.partitions: list[tuple] = []
         self.current_data_offset = FIRST_PARTITION_OFFSET
+        self.encrypted_cache = encrypted_cache
+        self.incremental = incremental
+        self.manifest: BuildManifest | None = (
+            BuildManifest() if record_manifest or incremental is not None else None
+        )
+        self.journal = journal
+        self.prefetch_bytes = prefetch_bytes
+        self.encrypted = encrypted
+        self.hashed = hashed
 
     def _write_certificate_chain(self, stream: BinaryIO, part_data_off: int,
                                  offset: int, source: PartitionSource) -> int:
@@ -109,29 +155,94 @@ class WiiDiscBuilder:
         part_disc_header.FST_max_size = part_disc_header.FST_size
 
     @staticmethod
-    def _write_file_data(crypt_writer: CryptPartWriter, files: list, source: PartitionSource,
-                         total_bytes: int, progress_cb: Callable | None) -> None:
-        crypt_writer.seek(align(crypt_writer.current_position, FILE_ALIGNMENT))
-        by_bytes = total_bytes > 0
-        processed_bytes = 0
+    def _skip_committed_files(crypt_writer: CryptPartWriter, files: list, resume: PartitionJournal,
+                              records: list[FileRecord] | None) -> tuple[int, int]:
+        """
+        Skip the leading files that an interrupted run already wrote in committed groups
 
-        for processed_files, (paths, node) in enumerate(files, start=1):
-            node.offset = crypt_writer.current_position
-            file_data = source.get_file_data(paths + [node.name])
-            node.length = len(file_data)
-            crypt_writer.write(file_data)
+        :return: (number of files skipped, their total length)
+        """
+        committed_end = resume.committed_groups() * GROUP_DATA_SIZE
+        skipped = 0
+        skipped_bytes = 0
+
+        for index, (paths, node) in enumerate(files):
+            entry = resume.files.get(index)
+            if entry is None:
+                break
+
+            path, offset, length, digest = entry
+            end = align(offset + length, FILE_ALIGNMENT)
+            if path != "/".join(paths + [node.name]) or offset != crypt_writer.current_position or end > committed_end:
+                break
+
+            node.offset = offset
+            node.length = length
+            if records is not None:
+                records.append(FileRecord(path, offset, length, digest))
 
-            if by_bytes and progress_cb:
-                processed_bytes += node.length
-                progress_cb(int((processed_bytes / total_bytes) * 100))
+            crypt_writer.seek(end)
+            skipped += 1
+            skipped_bytes += length
 
-            position = crypt_writer.current_position
-            next_start = align(position, FILE_ALIGNMENT)
-            if next_start > position:
-                crypt_writer.write(b'\x00' * (next_start - position))
+        return skipped, skipped_bytes
+
+    @staticmethod
+    def _write_file_data(crypt_writer: CryptPartWriter, files: list, source: PartitionSource,
+                         total_bytes: int, progress_cb: Callable | None,
+                         records: list[FileRecord] | None = None,
+                         resume: PartitionJournal | None = None,
+                         on_file: Callable[[int, FileRecord], None] | None = None,
+                         prefetch_bytes: int = 0) -> None:
+        crypt_writer.seek(align(crypt_writer.current_position, FILE_ALIGNMENT))
+        by_bytes = total_bytes > 0
+        skipped, processed_bytes = 0, 0
+        if resume is not None:
+            skipped, processed_bytes = WiiDiscBuilder._skip_committed_files(crypt_writer, files, resume, records)
+
+        remaining = files[skipped:]
+        with ExitStack() as stack:
+            paths_to_fetch = [paths + [node.name] for paths, node in remaining]
+            if prefetch_bytes > 0:
+                file_datas: Iterable[bytes] = stack.enter_context(
+                    FilePrefetcher(source, paths_to_fetch, prefetch_bytes, [node.length for _, node in remaining])
+                )
+            else:
+                file_datas = map(source.get_file_data, paths_to_fetch)
+
+            for processed_files, ((paths, node), file_data) in enumerate(
+                    zip(remaining, file_datas, strict=True), start=skipped + 1
+            ):
+                WiiDiscBuilder._write_file(crypt_writer, paths, node, file_data, records, on_file, processed_files - 1)
+
+                if by_bytes and progress_cb:
+                    processed_bytes += node.length
+                    progress_cb(int((processed_bytes / total_bytes) * 100))
+
+                if not by_bytes and progress_cb:
+                    progress_cb(int((processed_files / len(files)) * 100))
 
-            if not by_bytes and progress_cb:
-                progress_cb(int((processed_files / len(files)) * 100))
+    @staticmethod
+    def _write_file(crypt_writer: CryptPartWriter, paths: list[str], node: FSTFile, file_data: bytes,
+                    records: list[FileRecord] | None, on_file: Callable[[int, FileRecord], None] | None,
+                    file_index: int) -> None:
+        """Write one file and its alignment padding, placing its node"""
+        node.offset = crypt_writer.current_position
+        node.length = len(file_data)
+        crypt_writer.write(file_data)
+
+        if records is not None or on_file is not None:
+            record = FileRecord("/".join(paths + [node.name]), node.offset, node.length,
+                                hashlib.sha256(file_data).hexdigest())
+            if records is not None:
+                records.append(record)
+            if on_file is not None:
+                on_file(file_index, record)
+
+        position = crypt_writer.current_position
+        next_start = align(position, FILE_ALIGNMENT)
+        if next_start > position:
+            crypt_writer.write(b'\x00' * (next_start - position))
 
     def add_partition(self, stream: BinaryIO, new_partition: PartitionSource, progress_cb: Callable | None) -> None:
         """
@@ -144,6 +255,11 @@ class WiiDiscBuilder:
             progress_cb(0)
             
         part_data_off = self.current_data_offset
+        if self._in_place:
+            # Whatever the headers below do not cover still holds the previous build
+            stream.seek(part_data_off)
+            stream.write(bytes(PART_DATA_OFFSET))
+
         self.partitions.append(
             (WiiPartitionEntry(part_data_off, new_partition.get_partition_type()), part_data_off, 0)
         )
@@ -169,18 +285,32 @@ class WiiDiscBuilder:
 
         # Open encrypted writer at 0x20000 relative to part_data_off
         crypt_start = part_data_off + PART_DATA_OFFSET
-        crypt_writer = CryptPartWriter(stream, crypt_start, part_header.ticket.title_key)
+        title_key = part_header.ticket.title_key
+        part_manifest = PartitionManifest(crypt_start, title_key) if self.manifest is not None else None
+        resume, on_flush, on_file = self._open_journal(stream, crypt_start)
+        crypt_writer = CryptPartWriter(stream, crypt_start, title_key,
+                                       encrypted_cache=self.encrypted_cache,
+                                       incremental=self.incremental,
+                                       record_digests=part_manifest is not None,
+                                       on_flush=on_flush,
+                                       encrypted=self.encrypted,
+                                       hashed=self.hashed)
+        if resume is not None:
+            crypt_writer.restore_groups(resume.groups)
         fst_to_bytes = FSTToBytes(new_partition.get_fst().entries)
         files, total_bytes = self._collect_files(fst_to_bytes)
         part_disc_header = new_partition.get_encrypted_header()
+        self._set_crypto_flags(part_disc_header)
 
         self._write_system_files(crypt_writer, new_partition, part_disc_header, fst_to_bytes)
-        self._write_file_data(crypt_writer, files, new_partition, total_bytes, progress_cb)
+        self._write_file_data(crypt_writer, files, new_partition, total_bytes, progress_cb,
+                              part_manifest.files if part_manifest is not None else None, resume, on_file,
+                              self.prefetch_bytes)
 
         # Align total size to next full group
         groups = (crypt_writer.current_position + GROUP_DATA_SIZE - 1) // GROUP_DATA_SIZE
         total_size = groups * GROUP_DATA_SIZE
-        total_encrypted_size = groups * GROUP_SIZE
+        total_encrypted_size = groups * (GROUP_SIZE if self.hashed else GROUP_DATA_SIZE)
         self.current_data_offset += PART_DATA_OFFSET + total_encrypted_size
         
         # Rewrite FST according to offset of datas
@@ -191,9 +321,18 @@ class WiiDiscBuilder:
         crypt_writer.seek(0)
         part_disc_header.write(crypt_writer)
         crypt_writer.close()
+        if self._in_place:
+            crypt_writer.fill_unwritten_groups(groups)
 
 
         h3 = crypt_writer.get_h3_table()
+        if part_manifest is not None:
+            part_manifest.groups = [
+                (crypt_writer.group_digests[group], h3[group * SHA1_SIZE: (group + 1) * SHA1_SIZE])
+                for group in range(groups)
+            ]
+            self.manifest.partitions.append(part_manifest)
+
         # Write h3
         stream.seek(part_data_off + PART_H3_OFFSET)
         stream.write(h3)
@@ -211,9 +350,51 @@ class WiiDiscBuilder:
         part_header.write(stream)
 
 
+    def _open_journal(self, stream: BinaryIO, crypt_start: int) -> tuple[
+        PartitionJournal | None,
+        Callable[[int, bytes, bytes], None] | None,
+        Callable[[int, FileRecord], None] | None,
+    ]:
+        """
+        Start journaling the partition being added
+
+        :return: (what an interrupted run did for it, group callback, file callback)
+        """
+        journal = self.journal
+        if journal is None:
+            return None, None, None
+
+        index = len(self.partitions) - 1
+        resume = journal.resume_state(index, crypt_start)
+        journal.begin_partition(index, crypt_start)
+
+        def on_flush(group: int, h3: bytes, digest: bytes) -> None:
+            journal.commit_group(index, group, h3, digest, stream)
+
+        def on_file(file_index: int, record: FileRecord) -> None:
+            journal.record_file(index, file_index, record.path, record.offset, record.length, record.digest)
+
+        return resume, on_flush, on_file
+
+    @property
+    def _in_place(self) -> bool:
+        """Whether the build is written over the previous one, see `IncrementalBuild`"""
+        return self.incremental is not None and self.incremental.in_place
+
+    def _set_crypto_flags(self, header: DiscHeader) -> None:
+        """Flag a disc header with the encryption and hashing of the partition data"""
+        header.disable_disc_encryption = 0 if self.encrypted else 1
+        header.disable_hash_verification = 0 if self.hashed else 1
+
     def finish(self, stream: BinaryIO) -> None:
+        # The header may be the one of the source disc, still read with its own flags
+        header = copy.copy(self.header)
+        self._set_crypto_flags(header)
+        if self._in_place:
+            stream.seek(0)
+            stream.write(bytes(FIRST_PARTITION_OFFSET))
         stream.seek(0)
-        self.header.write(stream)
+        header.write(stream)
         stream.seek(PARTITION_TABLE_OFFSET)
         stream.write(struct.pack(">I", len(self.partitions)))
         stream.write(struct.pack(">I", PARTITION_TABLE_ENTRIES >> 2))
@@ -0,0 +1,183 @@
+"""
+Build journal, to resume an interrupted build
+
+The journal is an append-only JSON lines file written next to the output. It records where each partition
+starts, where each file was placed and every group flushed to the output, with its H3 hash.
+A group is only recorded once its ciphertext has been written, so after a crash every recorded group is
+already correct on disk.
+
+When the same build is started again with the journal, the files that only cover recorded groups are not
+read nor written, and their groups are neither hashed nor encrypted again.
+The journal starts with a fingerprint of the build inputs: a journal left by a build of other inputs is discarded
+and the build starts over
+"""
+import json
+import os
+from pathlib import Path
+from typing import BinaryIO
+
+from wiithon.crypto.layout import GROUP_SIZE
+
+JOURNAL_SUFFIX: str = ".journal"
+
+
+class PartitionJournal:
+    """
+    What an interrupted run already did for one partition
+
+    Attributes:
+        data_offset : Absolute offset of the encrypted data in the image
+        files       : (path, offset, length, digest) of each placed file, by index in layout order
+        groups      : (H3 hash, plaintext digest) of each flushed group, by group index
+    """
+    def __init__(self, data_offset: int) -> None:
+        self.data_offset: int = data_offset
+        self.files: dict[int, tuple[str, int, int, str]] = {}
+        self.groups: dict[int, tuple[bytes, bytes]] = {}
+
+    def committed_groups(self) -> int:
+        """Number of leading groups already on disk: groups [0, n) can be skipped"""
+        count = 0
+        while count in self.groups:
+            count += 1
+        return count
+
+
+class BuildJournal:
+    def __init__(self, path: str | Path, *, durable: bool = False, fingerprint: str | None = None) -> None:
+        """
+        Open a journal, loading what a previous run recorded in it
+
+        :param path: Journal file, created if needed
+        :param durable: fsync the output and the journal at each group. Survives power loss, but slower
+        :param fingerprint: Digest of the build inputs. What a run with another fingerprint recorded is discarded
+        """
+        self.path = Path(path)
+        self.durable = durable
+        self.fingerprint = fingerprint
+        self._partitions: dict[int, PartitionJournal] = {}
+
+        recorded = self._load() if self.path.exists() else None
+        if recorded != fingerprint:
+            self._partitions.clear()
+            self.path.unlink(missing_ok=True)
+
+        resumed = self.path.exists()
+        self._file = self.path.open("a", encoding="utf-8")  # noqa: SIM115
+        if not resumed:
+            self._append({"type": "inputs", "fingerprint": fingerprint})
+
+    @staticmethod
+    def path_for(image_path: str | Path) -> Path:
+        """Return the journal path of an image: `game.iso` -> `game.iso.journal`"""
+        image_path = Path(image_path)
+        return image_path.with_name(image_path.name + JOURNAL_SUFFIX)
+
+    def resume_state(self, index: int, data_offset: int) -> PartitionJournal | None:
+        """
+        :param index: Partition index
+        :param data_offset: Absolute offset of the partition data in this run
+        :return: What a previous run did for this partition, None if nothing can be reused
+        """
+        state = self._partitions.get(index)
+        if state is None or state.data_offset != data_offset:
+            return None
+        return state
+
+    def committed_size(self) -> int:
+        """End of the last committed group in the image. Whatever lies past it was never committed"""
+        return max(
+            (state.data_offset + state.committed_groups() * GROUP_SIZE for state in self._partitions.values()),
+            default=0,
+        )
+
+    def begin_partition(self, index: int, data_offset: int) -> None:
+        state = self._partitions.get(index)
+        if state is None or state.data_offset != data_offset:
+            self._partitions[index] = PartitionJournal(data_offset)
+        self._append({"type": "partition", "partition": index, "data_offset": data_offset})
+
+    def record_file(self, index: int, file_index: int, path: str, offset: int, length: int, digest: str) -> None:
+        self._partitions[index].files[file_index] = (path, offset, length, digest)
+        self._append({
+            "type": "file", "partition": index, "index": file_index,
+            "path": path, "offset": offset, "length": length, "digest": digest,
+        })
+
+    def commit_group(self, index: int, group: int, h3: bytes, digest: bytes, stream: BinaryIO) -> None:
+        """
+        Record a group whose ciphertext was written to stream
+
+        :param index: Partition index
+        :param group: Group index in the partition
+        :param h3: H3 hash of the group
+        :param digest: Plaintext digest of the group
+        :param stream: The output, flushed before the group is recorded
+        """
+        stream.flush()
+        if self.durable:
+            _fsync(stream)
+
+        self._partitions[index].groups[group] = (h3, digest)
+        self._append({"type": "group", "partition": index, "group": group, "h3": h3.hex(), "digest": digest.hex()})
+
+    def close(self) -> None:
+        self._file.close()
+
+    def discard(self) -> None:
+        """Close and delete the journal, once the build is complete"""
+        self.close()
+        self.path.unlink(missing_ok=True)
+
+    def _append(self, record: dict) -> None:
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        if self.durable:
+            os.fsync(self._file.fileno())
+
+    def _load(self) -> str | None:
+        """
+        :return: Fingerprint of the inputs of the recorded run
+        """
+        fingerprint = None
+        for line in self.path.read_text(encoding="utf-8").splitlines():
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Last line cut by the interruption
+                break
+
+            if record["type"] == "inputs":
+                fingerprint = record["fingerprint"]
+                continue
+
+            index = record["partition"]
+            match record["type"]:
+                case "partition":
+                    state = self._partitions.get(index)
+                    if state is None or state.data_offset != record["data_offset"]:
+                        self._partitions[index] = PartitionJournal(record["data_offset"])
+                case "file":
+                    self._partitions[index].files[record["index"]] = (
+                        record["path"], record["offset"], record["length"], record["digest"]
+                    )
+                case "group":
+                    self._partitions[index].groups[record["group"]] = (
+                        bytes.fromhex(record["h3"]), bytes.fromhex(record["digest"])
+                    )
+        return fingerprint
+
+    def __enter__(self) -> "BuildJournal":
+        return self
+
+    def __exit__(self, *args: int) -> None:
+        self.close()
+
+
+def _fsync(stream: BinaryIO) -> None:
+    try:
+        fileno = stream.fileno()
+    except (AttributeError, OSError):
+        # In-memory stream, nothing to sync
+        return
+    os.fsync(fileno)
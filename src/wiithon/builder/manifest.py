@@ -0,0 +1,138 @@
+"""
+Build manifest: layout and digests of a built image, saved as JSON next to it
+
+A later build can be given the manifest and the previous image, it then reuses the encrypted groups
+whose plaintext did not change instead of hashing and encrypting them again.
+Groups are matched by plaintext digest, so an unchanged group is reused even if it moved
+"""
+import json
+from pathlib import Path
+from typing import BinaryIO
+
+from wiithon.crypto.layout import GROUP_SIZE
+from wiithon.exceptions import InvalidFormatError
+
+MANIFEST_VERSION: int = 1
+MANIFEST_SUFFIX: str = ".manifest.json"
+
+
+class FileRecord:
+    """Placement and content digest of one file of a partition"""
+    def __init__(self, path: str, offset: int, length: int, digest: str) -> None:
+        self.path: str = path
+        self.offset: int = offset
+        self.length: int = length
+        self.digest: str = digest
+
+    def __repr__(self) -> str:
+        return f"FileRecord({self.path}, offset: {self.offset:X}, length: {self.length:X})"
+
+
+class PartitionManifest:
+    """
+    Manifest of one partition
+
+    Attributes:
+        data_offset : Absolute offset of the encrypted data in the image
+        title_key   : 16-byte decrypted title key
+        files       : Every file, in layout order
+        groups      : (plaintext digest, H3 hash) of every group, indexed by group
+    """
+    def __init__(self, data_offset: int, title_key: bytes) -> None:
+        self.data_offset: int = data_offset
+        self.title_key: bytes = title_key
+        self.files: list[FileRecord] = []
+        self.groups: list[tuple[bytes, bytes]] = []
+
+    def to_dict(self) -> dict:
+        return {
+            "data_offset": self.data_offset,
+            "title_key": self.title_key.hex(),
+            "files": [
+                {"path": f.path, "offset": f.offset, "length": f.length, "digest": f.digest}
+                for f in self.files
+            ],
+            "groups": [{"digest": digest.hex(), "h3": h3.hex()} for digest, h3 in self.groups],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PartitionManifest":
+        obj = cls(data["data_offset"], bytes.fromhex(data["title_key"]))
+        obj.files = [FileRecord(f["path"], f["offset"], f["length"], f["digest"]) for f in data["files"]]
+        obj.groups = [(bytes.fromhex(g["digest"]), bytes.fromhex(g["h3"])) for g in data["groups"]]
+        return obj
+
+
+class BuildManifest:
+    def __init__(self) -> None:
+        self.partitions: list[PartitionManifest] = []
+
+    @staticmethod
+    def path_for(image_path: str | Path) -> Path:
+        """Return the manifest path of an image: `game.iso` -> `game.iso.manifest.json`"""
+        image_path = Path(image_path)
+        return image_path.with_name(image_path.name + MANIFEST_SUFFIX)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "BuildManifest":
+        try:
+            data = json.loads(Path(path).read_text(encoding="utf-8"))
+        except json.JSONDecodeError as e:
+            raise InvalidFormatError(f"{path} is not a build manifest: {e}") from e
+
+        if not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION:
+            raise InvalidFormatError(f"Unsupported build manifest version in {path}")
+
+        obj = cls()
+        obj.partitions = [PartitionManifest.from_dict(p) for p in data["partitions"]]
+        return obj
+
+    def save(self, path: str | Path) -> None:
+        data = {"version": MANIFEST_VERSION, "partitions": [p.to_dict() for p in self.partitions]}
+        Path(path).write_text(json.dumps(data), encoding="utf-8")
+
+
+class IncrementalBuild:
+    """
+    Groups of a previous build, looked up by plaintext digest
+
+    With a previous image stream, matching groups are copied from it.
+    Without one, the build is written over the previous image: a matching group is kept as is
+    when it sits at the same place, and is rebuilt otherwise
+    """
+    def __init__(self, manifest: BuildManifest, previous: BinaryIO | None = None) -> None:
+        """
+        :param manifest: Manifest of the previous build
+        :param previous: The previous image, or None if the build overwrites it in place
+        """
+        self.manifest = manifest
+        self.previous = previous
+        self.reused: int = 0
+
+        self._groups: dict[tuple[bytes, bytes], tuple[int, bytes]] = {}
+        for partition in manifest.partitions:
+            for index, (digest, h3) in enumerate(partition.groups):
+                physical_offset = partition.data_offset + index * GROUP_SIZE
+                self._groups.setdefault((partition.title_key, digest), (physical_offset, h3))
+
+    @property
+    def in_place(self) -> bool:
+        return self.previous is None
+
+    def find(self, title_key: bytes, digest: bytes) -> tuple[int, bytes] | None:
+        """
+        Find a group of the previous build
+
+        :param title_key: 16-byte decrypted title key
+        :param digest: Plaintext digest, see `group_digest`
+        :return: (absolute offset in the previous image, H3 hash) or None
+        """
+        return self._groups.get((title_key, digest))
+
+    def read_group(self, physical_offset: int) -> bytes:
+        """Read an encrypted group from the previous image"""
+        if self.previous is None:
+            raise ValueError("No previous image to copy from, the build is done in place")
+
+        self.previous.seek(physical_offset)
+        return self.previous.read(GROUP_SIZE)
@@ -0,0 +1,98 @@
+"""
+Read file data ahead of the builder
+
+`PartitionSource.get_file_data` is mostly I/O (and AES decryption for `CopyPartitionSource`) while the builder
+mostly hashes and encrypts. A background thread fetches the next files in layout order while the builder
+encrypts the current ones, so both overlap. The thread stays at most `max_bytes` ahead of the builder: given the
+expected size of the files, room for a file is taken before reading it
+"""
+import threading
+from collections import deque
+from collections.abc import Iterator
+
+from wiithon.builder.source import PartitionSource
+
+# Budget of file data read ahead. A single bigger file is still fetched, alone
+DEFAULT_PREFETCH_BYTES: int = 64 * 1024 * 1024
+
+
+class FilePrefetcher:
+    def __init__(self, source: PartitionSource, paths: list[list[str]],
+                 max_bytes: int = DEFAULT_PREFETCH_BYTES, sizes: list[int] | None = None) -> None:
+        """
+        Start fetching the files in a background thread
+
+        :param source: Partition source to read the files from. Only the background thread uses it
+        :param paths: Path of each file, in the order they will be consumed
+        :param max_bytes: Maximum size of the data fetched but not consumed yet, the file being read included.
+            A single bigger file is fetched alone
+        :param sizes: Expected size of each file, reserved before it is read. Without them, a file is read as soon
+            as the data waiting is within `max_bytes`, which can then be exceeded by the size of that file
+        """
+        self.source = source
+        self.paths = paths
+        self.max_bytes = max_bytes
+        self.sizes = sizes
+
+        self._ready: deque[bytes | BaseException] = deque()
+        # Size of the files ready, plus the room reserved for the file being read
+        self._held_bytes: int = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="wiithon-prefetch", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        for index, path in enumerate(self.paths):
+            expected = self.sizes[index] if self.sizes is not None else 0
+            with self._condition:
+                while not self._closed and self._held_bytes and self._held_bytes + expected > self.max_bytes:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                self._held_bytes += expected
+
+            try:
+                data: bytes | BaseException = self.source.get_file_data(path)
+            except BaseException as e:  # noqa: BLE001 - handed over to the consumer
+                data = e
+
+            with self._condition:
+                if self._closed:
+                    return
+                self._ready.append(data)
+                # The file may not have the expected size (a replaced file)
+                self._held_bytes += (len(data) if isinstance(data, bytes | bytearray) else 0) - expected
+                self._condition.notify_all()
+
+            if isinstance(data, BaseException):
+                return
+
+    def __iter__(self) -> Iterator[bytes]:
+        for _ in self.paths:
+            with self._condition:
+                while not self._ready:
+                    self._condition.wait()
+                data = self._ready.popleft()
+                if isinstance(data, BaseException):
+                    raise data
+
+                self._held_bytes -= len(data)
+                self._condition.notify_all()
+
+            yield data
+
+    def close(self) -> None:
+        """Stop the background thread and drop what it fetched"""
+        with self._condition:
+            self._closed = True
+            self._ready.clear()
+            self._held_bytes = 0
+            self._condition.notify_all()
+        self._thread.join()
+
+    def __enter__(self) -> "FilePrefetcher":
+        return self
+
+    def __exit__(self, *args: int) -> None:
+        self.close()
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import os
+import re
 import sys
 from pathlib import Path
 from typing import Annotated
@@ -7,24 +9,40 @@ from typing import Annotated
 import typer
 from rich.markup import escape
 from rich.panel import Panel
-from rich.progress import BarColumn, Progress, SpinnerColumn, TextColumn, TimeElapsedColumn
+from rich.progress import (
+    BarColumn,
+    DownloadColumn,
+    Progress,
+    SpinnerColumn,
+    TextColumn,
+    TimeElapsedColumn,
+    TransferSpeedColumn,
+)
 from rich.table import Table
 from rich.tree import Tree
 
 from wiithon.cli._common import (
     JsonOption,
     PartitionTypeOption,
+    PartTypeChoice,
     abort,
     console,
+    err_console,
     render_table,
     require_file,
     select_partitions,
     write_json,
 )
+from wiithon.disc.extractor import extract_disc, extracted_size
+from wiithon.disc.grep import GrepMatch, compile_pattern, grep_disc
+from wiithon.disc.hashing import ALGORITHMS, hash_disc
 from wiithon.disc.partition import WiiPartitionInfo
 from wiithon.disc.reader import WiiIsoReader
+from wiithon.disc.scrubber import scrub_disc
 from wiithon.disc.structs.partition_entry import WiiPartitionEntry
-from wiithon.fst.node import FSTDirectory, FSTFile, FSTNode
+from wiithon.disc.usage import disc_usage
+from wiithon.fst.node import FSTFile, FSTNode
+from wiithon.library.blob_store import BlobStore
 
 iso_app = typer.Typer(help="Operations on Wii ISO files.")
 
@@ -70,7 +88,8 @@ def _find_in_partitions(
 ) -> tuple[WiiPartitionInfo, FSTNode]:
     """Return (partition, node) for the first partition containing path"""
     for entry in entries:
-        partition = reader.open_partition(entry)
+        # Only the directories on the path are built
+        partition = reader.open_partition(entry, lazy_fst=True)
         node = partition.fst.find_node(path)
         if node is not None:
             return partition, node
@@ -94,17 +113,24 @@ def _extract_node(partition: WiiPartitionInfo, node: FSTNode, path: str, dest: P
 
     return written
 
-def _print_hexdump(data: bytes, limit: int) -> None:
+def _print_hexdump(data: bytes, limit: int, *, total: int | None = None, base: int = 0) -> None:
+    """
+    :param data: Bytes to dump, possibly only the first `limit` ones
+    :param limit: Bytes shown, 0 for all of them
+    :param total: Size of the whole data, if `data` is cut already
+    :param base: Offset shown for the first byte
+    """
     shown = data[:limit] if limit else data
+    total = len(data) if total is None else total
 
     for offset in range(0, len(shown), _HEXDUMP_WIDTH):
         chunk = shown[offset:offset + _HEXDUMP_WIDTH]
         hexa = " ".join(f"{b:02x}" for b in chunk).ljust(_HEXDUMP_WIDTH * 3 - 1)
         text = "".join(chr(b) if 0x20 <= b < 0x7F else "." for b in chunk)
-        console.print(f"[dim]{offset:08x}[/dim]  {hexa}  [cyan]{escape(text)}[/cyan]", soft_wrap=True)
+        console.print(f"[dim]{base + offset:08x}[/dim]  {hexa}  [cyan]{escape(text)}[/cyan]", soft_wrap=True)
 
-    if limit and len(data) > limit:
-        console.print(f"\n[dim]... {len(data) - limit} more byte(s), use -n 0 to print everything[/dim]",
+    if limit and total > limit:
+        console.print(f"\n[dim]... {total - limit} more byte(s), use -n 0 to print everything[/dim]",
                       soft_wrap=True)
 
 def _print_tree(paths: list[str], partition_type: str) -> None:
@@ -164,6 +190,26 @@ def iso_list(
 
         console.print(f"\n[bold]{len(part['files'])}[/bold] file(s)")
 
+def _extract_to_store(iso: Path, dest: Path, partition_type: PartTypeChoice | None, store: BlobStore, name: str,
+                      *, hardlink: bool) -> None:
+    with WiiIsoReader(str(iso)) as reader, Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        TextColumn("{task.completed} file(s)"),
+        TimeElapsedColumn()
+    ) as progress:
+        entries = select_partitions(reader, partition_type)
+        task = progress.add_task(f"Storing {iso}...", total=None)
+        result = store.add_disc(reader, name, entries, lambda _: progress.advance(task))
+
+    written = store.materialize(name, dest, hardlink=hardlink)
+    console.print(
+        f"[green]ヾ(≧▽≦*)o[/green] {result.written} new blob(s) ({result.bytes_written} bytes), "
+        f"{result.existing + result.reused} already stored. Manifest [bold]{name}[/bold] in [bold]{store.root}[/bold]"
+    )
+    console.print(f"\n[bold]{written}[/bold] file(s) extracted to [bold]{dest}[/bold]")
+
+
 @iso_app.command("extract")
 def iso_extract(
     iso: Annotated[Path, typer.Argument(help="Path to the Wii ISO.")],
@@ -172,11 +218,38 @@ def iso_extract(
     file: Annotated[
         str | None, typer.Option("--file", "-f", help="Extract only this file or directory.")
     ] = None,
+    store: Annotated[
+        Path | None, typer.Option("--store", "-s", help="Write each content once into this blob store.")
+    ] = None,
+    name: Annotated[
+        str | None, typer.Option("--name", help="Name of the disc manifest in the store. Defaults to the ISO name.")
+    ] = None,
+    hardlink: Annotated[
+        bool, typer.Option("--link/--copy", help="Hardlink or copy the stored files into the output directory.")
+    ] = True,
+    jobs: Annotated[int, typer.Option("--jobs", "-j", min=1, help="Threads decrypting, and threads writing.")] = 4,
+    incremental: Annotated[
+        bool, typer.Option("--incremental", "-i", help="Only write the files that changed since the last extraction.")
+    ] = False,
+    verify: Annotated[
+        bool, typer.Option("--verify", help="With --incremental, digest kept files instead of trusting their mtime.")
+    ] = False,
+    deep: Annotated[
+        bool, typer.Option("--deep", "-d", help="Unpack Yaz0/LZ77 files and RARC/U8 archives, recursively.")
+    ] = False,
 ) -> None:
     """Extract all files from a partition"""
     require_file(iso)
+    if deep and (store is not None or file is not None or incremental):
+        abort("--deep cannot be used with --store, --file or --incremental.")
     dest.mkdir(parents=True, exist_ok=True)
 
+    if store is not None:
+        if file is not None:
+            abort("--file cannot be used with --store.")
+        _extract_to_store(iso, dest, partition_type, BlobStore(store), name or iso.stem, hardlink=hardlink)
+        return
+
     if file is not None:
         target = file.strip("/").replace("\\", "/")
         with WiiIsoReader(str(iso)) as reader:
@@ -188,29 +261,28 @@ def iso_extract(
         return
 
     with WiiIsoReader(str(iso)) as reader:
-        total = 0
-        for p in select_partitions(reader, partition_type):
-            root = dest / p.get_readable_part_type()
-            partition = reader.open_partition(p)
-            files = partition.list_files()
-            label = p.get_readable_part_type()
-
-            with Progress(
-                SpinnerColumn(),
-                TextColumn("[progress.description]{task.description}"),
-                BarColumn(),
-                TextColumn("{task.completed}/{task.total}"),
-                TimeElapsedColumn()
-            ) as progress:
-                task = progress.add_task(f"Extracting {label} partition from {iso}...", total=len(files))
-                for path in files:
-                    out = root / path
-                    out.parent.mkdir(parents=True, exist_ok=True)
-                    out.write_bytes(partition.read_file(path))
-                    progress.advance(task)
-
-            total += len(files)
-            console.print(f"[green]ヾ(≧▽≦*)o[/green] Extracted {len(files)} file(s) to [bold]{root}[/bold]")
+        entries = select_partitions(reader, partition_type)
+    size = extracted_size(iso, entries)
+
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        DownloadColumn(),
+        TransferSpeedColumn(),
+        TimeElapsedColumn()
+    ) as progress:
+        task = progress.add_task(f"Extracting {iso}...", total=size)
+        result = extract_disc(iso, dest, entries, lambda written: progress.advance(task, written), jobs=jobs,
+                              incremental=incremental, quick_check=not verify, deep=deep)
+
+    for label, count in result.extracted.items():
+        console.print(f"[green]ヾ(≧▽≦*)o[/green] Extracted {count} file(s) to [bold]{dest / label}[/bold]")
+    if incremental:
+        console.print(f"{result.skipped} file(s) up to date, {result.removed} removed")
+    if deep:
+        console.print(f"{result.unpacked} packed file(s) unpacked into {result.unpacked_files} file(s)")
+    total = sum(result.extracted.values())
 
     console.print(f"\n[bold]{total}[/bold] file(s) extracted, yeiii (p≧w≦q)")
 
@@ -221,8 +293,12 @@ def iso_cat(
         path: Annotated[str, typer.Argument(help="Path of the file inside the partition.")],
         partition_type: PartitionTypeOption = None,
         limit: Annotated[int, typer.Option("--bytes", "-n", help="Bytes to show in hexdump mode (0 = all).")] = 512,
+        offset: Annotated[int, typer.Option("--offset", "-o", min=0, help="Start at this byte of the file.")] = 0,
+        length: Annotated[
+            int | None, typer.Option("--length", "-l", min=0, help="Bytes to print, up to the end by default.")
+        ] = None,
 ) -> None:
-    """Print one file from a partition: hexdump on a terminal, raw bytes when piped"""
+    """Print one file from a partition: hexdump on a terminal, raw bytes streamed as they are decrypted when piped"""
     require_file(iso)
     path = path.strip("/").replace("\\", "/")
 
@@ -230,12 +306,189 @@ def iso_cat(
         entries = select_partitions(reader, partition_type)
         partition, node = _find_in_partitions(reader, entries, path)
 
-        if isinstance(node, FSTDirectory):
+        if not isinstance(node, FSTFile):
             abort(f"{path} is a directory - use `wiithon iso list` to browse it")
 
-        data = partition.read_file(path)
+        available = max(0, node.length - offset)
+        size = available if length is None else min(length, available)
 
-    if sys.stdout.isatty():
-        _print_hexdump(data, limit)
-    else:
-        sys.stdout.buffer.write(data)
\ No newline at end of file
+        if sys.stdout.isatty():
+            data = b"".join(partition.iter_file(path, offset, min(size, limit) if limit else size))
+            _print_hexdump(data, limit, total=size, base=offset)
+            return
+
+        out = sys.stdout.buffer
+        try:
+            for chunk in partition.iter_file(path, offset, size):
+                out.write(chunk)
+                out.flush()
+        except BrokenPipeError:
+            # The consumer stopped reading, like `| head`: nothing left to do
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, sys.stdout.fileno())
+
+def _match_preview(data: bytes, width: int = 48) -> str:
+    shown = data[:width]
+    text = shown.hex(" ") if any(not 0x20 <= b < 0x7F for b in shown) else shown.decode("ascii")
+    return text + ("..." if len(data) > width else "")
+
+
+def _print_match(match: GrepMatch) -> None:
+    location = f"{match.partition}/{match.path}" + (f":{match.member}" if match.member else "")
+    console.print(f"[bold]{escape(location)}[/bold]  [dim]{match.offset:#010x}[/dim]  "
+                  f"[cyan]{escape(_match_preview(match.data))}[/cyan]", soft_wrap=True)
+
+
+@iso_app.command("grep")
+def iso_grep(
+        iso: Annotated[Path, typer.Argument(help="Path to the Wii ISO.")],
+        pattern: Annotated[str, typer.Argument(help="Bytes to find: text, hex with --hex, or a regex with --regex.")],
+        partition_type: PartitionTypeOption = None,
+        regex: Annotated[bool, typer.Option("--regex", "-E", help="The pattern is a regular expression.")] = False,
+        hexadecimal: Annotated[bool, typer.Option("--hex", "-x", help="The pattern is hex bytes.")] = False,
+        ignore_case: Annotated[bool, typer.Option("--ignore-case", "-i", help="Ignore the case of letters.")] = False,
+        deep: Annotated[
+            bool, typer.Option("--deep", "-d", help="Search inside Yaz0/LZ77 files and RARC/U8 archives.")
+        ] = False,
+        jobs: Annotated[int, typer.Option("--jobs", "-j", min=1, help="Worker processes.")] = 4,
+        as_json: JsonOption = False,
+) -> None:
+    """Find the files holding a byte pattern, and where"""
+    require_file(iso)
+    if regex and hexadecimal:
+        abort("--regex cannot be used with --hex.")
+    try:
+        raw = bytes.fromhex(pattern) if hexadecimal else pattern.encode("utf-8")
+        compiled = compile_pattern(raw, regex=regex, ignore_case=ignore_case)
+    except (ValueError, re.error) as e:
+        abort(f"Invalid pattern: {e}")
+    if not raw:
+        abort("The pattern is empty.")
+
+    with WiiIsoReader(str(iso)) as reader:
+        entries = select_partitions(reader, partition_type)
+    size = extracted_size(iso, entries)
+
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        DownloadColumn(),
+        TransferSpeedColumn(),
+        console=err_console,
+        transient=True,
+    ) as progress:
+        task = progress.add_task(f"Searching {iso}...", total=size)
+        matches = list(grep_disc(iso, compiled, entries, lambda searched: progress.advance(task, searched),
+                                 deep=deep, jobs=jobs))
+
+    if as_json:
+        write_json([match.to_dict() for match in matches])
+        return
+    for match in matches:
+        _print_match(match)
+    if not matches:
+        err_console.print("No match")
+        raise typer.Exit(code=1)
+
+
+@iso_app.command("usage")
+def iso_usage(
+        iso: Annotated[Path, typer.Argument(help="Path to the Wii ISO.")],
+        as_json: JsonOption = False,
+) -> None:
+    """Show how much of each partition is used by its files, the rest is junk that `scrub` zeroes"""
+    require_file(iso)
+
+    with WiiIsoReader(str(iso)) as reader:
+        usage = disc_usage(reader)
+        labels = [p.get_readable_part_type() for p in reader.partitions]
+
+    used_bytes = usage.used_bytes()
+    partitions = list(zip(labels, usage.partitions, strict=True))
+
+    if as_json:
+        write_json({
+            "image_size": usage.image_size,
+            "used_bytes": used_bytes,
+            "partitions": [
+                {
+                    "partition": label,
+                    "offset": partition.partition_offset,
+                    "blocks": len(partition.blocks),
+                    "used_blocks": partition.used_blocks(),
+                    "used_groups": len(partition.used_groups()),
+                }
+                for label, partition in partitions
+            ],
+        })
+        return
+
+    console.print(render_table(
+        ["Partition", "Offset", "Used blocks", "Used groups"],
+        (
+            [label.upper(), f"{partition.partition_offset:#x}", f"{partition.used_blocks()}/{len(partition.blocks)}",
+             str(len(partition.used_groups()))]
+            for label, partition in partitions
+        ),
+    ))
+    console.print(f"\n[bold]{used_bytes}[/bold] of {usage.image_size} byte(s) used "
+                  f"({used_bytes / max(usage.image_size, 1):.1%})")
+
+
+@iso_app.command("scrub")
+def iso_scrub(
+        iso: Annotated[Path, typer.Argument(help="Path to the Wii ISO.")],
+        output: Annotated[Path, typer.Argument(help="Scrubbed image. The container is chosen by extension.")],
+        whole_groups: Annotated[
+            bool, typer.Option("--whole-groups", help="Only zero whole unused groups, so every block kept verifies.")
+        ] = False,
+) -> None:
+    """Copy an image with its unused partition data replaced by zeros"""
+    require_file(iso)
+    if output.exists() and output.samefile(iso):
+        abort("The output must be another file.")
+
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TimeElapsedColumn()
+    ) as progress:
+        task = progress.add_task(f"Scrubbing {iso}...", total=100)
+        usage = scrub_disc(iso, output, lambda percent: progress.update(task, completed=percent),
+                           whole_groups=whole_groups)
+
+    console.print(f"[green](★‿★)[/green] Kept {usage.used_bytes(whole_groups=whole_groups)} of {usage.image_size} "
+                  f"byte(s) in [bold]{output}[/bold]")
+
+
+@iso_app.command("hash")
+def iso_hash(
+        iso: Annotated[Path, typer.Argument(help="Path to the Wii ISO.")],
+        files: Annotated[bool, typer.Option("--files/--no-files", help="Also hash every file.")] = False,
+        as_json: JsonOption = False,
+) -> None:
+    """CRC32, MD5 and SHA-1 of the image and of each partition, reading the image once"""
+    require_file(iso)
+
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TimeElapsedColumn(),
+        console=err_console,
+        transient=True,
+    ) as progress:
+        task = progress.add_task(f"Hashing {iso}...", total=100)
+        digests = hash_disc(iso, lambda percent: progress.update(task, completed=percent), files=files)
+
+    if as_json:
+        write_json(digests.to_dict())
+        return
+
+    rows = [["Image", digests.image["crc32"], digests.image["md5"], digests.image["sha1"]]]
+    for partition in digests.partitions:
+        rows.append([partition.partition_type.upper(), *(partition.digests[name] for name in ALGORITHMS)])
+        rows.extend([f"  {path}", *(digest[name] for name in ALGORITHMS)] for path, digest in partition.files.items())
+    console.print(render_table(["", "CRC32", "MD5", "SHA-1"], rows))
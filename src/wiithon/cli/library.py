@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Annotated
+
+import typer
+from rich.markup import escape
+from rich.progress import BarColumn, Progress, SpinnerColumn, TextColumn, TimeElapsedColumn
+
+from wiithon.cli._common import JsonOption, abort, console, err_console, render_table, titled_panel, write_json
+from wiithon.exceptions import WiithonError
+from wiithon.library.archive_index import ArchiveIndex, ArchiveIndexResult
+from wiithon.library.catalog import DiscRecord, LibraryCatalog
+from wiithon.library.content_index import ContentIndex, IndexResult
+from wiithon.library.scanner import find_discs, scan_library
+
+library_app = typer.Typer(help="Operations on directories of Wii discs.")
+
+CATALOG_NAME = "wiithon-library.sqlite"
+
+CatalogOption = Annotated[
+    Path | None,
+    typer.Option("--catalog", "-c", help=f"Catalog database. Defaults to {CATALOG_NAME} in the directory."),
+]
+# Required by the commands without a directory, which have nowhere to look for the catalog
+IndexedCatalogOption = Annotated[
+    Path,
+    typer.Option("--catalog", "-c", help=f"Catalog database written by `library index` ({CATALOG_NAME} in the "
+                                         "indexed directory unless given)."),
+]
+
+
+def _require_directory(path: Path) -> None:
+    if not path.exists():
+        abort(f"{path} does not exist.")
+    if not path.is_dir():
+        abort(f"{path} is not a directory.")
+
+
+def _disc_row(record: DiscRecord) -> list[str]:
+    if record.error is not None:
+        return [escape(record.path), "", f"[red]{escape(record.error)}[/red]", "", ""]
+    return [
+        escape(record.path), record.game_id or "", escape(record.title or ""),
+        str(record.disc_number), ", ".join(record.partitions),
+    ]
+
+
+@library_app.command("scan")
+def library_scan(
+        directory: Annotated[Path, typer.Argument(help="Directory holding the discs, searched recursively.")],
+        catalog: CatalogOption = None,
+        fst: Annotated[bool, typer.Option("--fst/--no-fst", help="Also catalog the files of each disc.")] = False,
+        jobs: Annotated[int | None, typer.Option("--jobs", "-j", min=1,
+                                                 help="Worker processes. Defaults to one per CPU.")] = None,
+        as_json: JsonOption = False,
+) -> None:
+    """Catalog the discs of a directory. Only new or changed discs are read"""
+    _require_directory(directory)
+    catalog_path = catalog or directory / CATALOG_NAME
+
+    with LibraryCatalog(catalog_path) as library, Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TimeElapsedColumn(),
+        console=err_console,
+        transient=True,
+    ) as progress:
+        task = progress.add_task(f"Scanning {directory}...", total=sum(1 for _ in find_discs(directory)))
+        result = scan_library(directory, library, lambda _: progress.advance(task), with_fst=fst, jobs=jobs)
+        progress.update(task, completed=progress.tasks[0].total)
+
+    if as_json:
+        write_json(result.to_dict())
+        return
+
+    console.print(
+        f"{len(result.scanned)} scanned, {len(result.unchanged)} unchanged, "
+        f"{len(result.removed)} removed, {len(result.failed)} failed. Catalog: {escape(str(catalog_path))}"
+    )
+    for path in result.failed:
+        err_console.print(f"Could not read {escape(path)}")
+
+
+@library_app.command("list")
+def library_list(
+        directory: Annotated[Path, typer.Argument(help="Directory holding the discs.")],
+        catalog: CatalogOption = None,
+        game_id: Annotated[str | None, typer.Option("--game-id", "-g", help="Only the discs of this game ID.")] = None,
+        as_json: JsonOption = False,
+) -> None:
+    """List the cataloged discs of a directory, without reading them"""
+    _require_directory(directory)
+    catalog_path = catalog or directory / CATALOG_NAME
+    if not catalog_path.is_file():
+        abort(f"No catalog at {catalog_path}, run `wiithon library scan` first.")
+
+    root = directory.resolve()
+    with LibraryCatalog(catalog_path) as library:
+        records = [record for record in library.discs(game_id) if Path(record.path).is_relative_to(root)]
+
+    if as_json:
+        write_json([record.to_dict() for record in records])
+        return
+
+    table = render_table(["Path", "Game ID", "Title", "Disc", "Partitions"], (_disc_row(r) for r in records))
+    console.print(titled_panel(table, str(directory)))
+
+
+@library_app.command("index")
+def library_index(
+        directory: Annotated[Path, typer.Argument(help="Directory holding the discs, searched recursively.")],
+        catalog: CatalogOption = None,
+        force: Annotated[bool, typer.Option("--force", help="Read the discs even if they did not change.")] = False,
+        archives: Annotated[
+            bool, typer.Option("--archives", "-a", help="Also index the files inside Yaz0/LZ77/RARC/U8 files.")
+        ] = False,
+        as_json: JsonOption = False,
+) -> None:
+    """Index the content of every file of the discs of a directory"""
+    _require_directory(directory)
+    catalog_path = catalog or directory / CATALOG_NAME
+
+    discs = list(find_discs(directory))
+    # (content result, archive result) of each disc indexed, the archive result None without `--archives`
+    results: list[tuple[IndexResult, ArchiveIndexResult | None]] = []
+    index = ArchiveIndex(catalog_path) if archives else ContentIndex(catalog_path)
+    with index, Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TimeElapsedColumn(),
+        console=err_console,
+        transient=True,
+    ) as progress:
+        task = progress.add_task(f"Indexing {directory}...", total=len(discs))
+        for disc in discs:
+            try:
+                result = index.index_disc(disc, force=force)
+                archive_result = index.index_archives(disc) if isinstance(index, ArchiveIndex) else None
+                results.append((result, archive_result))
+            except (WiithonError, OSError, ValueError) as e:
+                err_console.print(f"Could not index {escape(str(disc))}: {escape(str(e))}")
+            progress.advance(task)
+
+    if as_json:
+        write_json([
+            {**result.to_dict(), "archives": archive_result.to_dict()} if archive_result is not None
+            else result.to_dict()
+            for result, archive_result in results
+        ])
+        return
+
+    table = render_table(
+        ["Path", "Hashed", "Reused"],
+        ([escape(r.path), str(r.hashed), str(r.reused)] if not r.skipped else [escape(r.path), "unchanged", ""]
+         for r, _ in results),
+    )
+    console.print(titled_panel(table, str(directory)))
+    if archives:
+        console.print(render_table(
+            ["Path", "Archives opened", "Already scanned", "Not packed"],
+            ([escape(r.path), str(r.opened), str(r.cached), str(r.plain)] for _, r in results if r is not None),
+        ))
+
+
+@library_app.command("find")
+def library_find(
+        sha1: Annotated[str, typer.Argument(help="SHA-1 of the content, in hex.")],
+        catalog: IndexedCatalogOption,
+        as_json: JsonOption = False,
+) -> None:
+    """List the indexed discs holding a file with a given content"""
+    if not catalog.is_file():
+        abort(f"No catalog at {catalog}, run `wiithon library index` first.")
+    with ContentIndex(catalog) as index:
+        matches = index.find_blob(sha1)
+
+    if as_json:
+        write_json([{"disc": disc, "partition": partition, "path": path} for disc, partition, path in matches])
+        return
+    console.print(render_table(["Disc", "Partition", "Path"], ([escape(value) for value in m] for m in matches)))
+
+
+@library_app.command("member")
+def library_member(
+        name: Annotated[str, typer.Argument(help="File name, or path inside the archive.")],
+        catalog: IndexedCatalogOption,
+        as_json: JsonOption = False,
+) -> None:
+    """List the archives of the indexed discs holding a file, without opening them"""
+    if not catalog.is_file():
+        abort(f"No catalog at {catalog}, run `wiithon library index --archives` first.")
+    with ArchiveIndex(catalog) as index:
+        matches = index.find_member(name)
+
+    if as_json:
+        write_json([match.to_dict() for match in matches])
+        return
+    console.print(render_table(
+        ["Disc", "Partition", "Archive", "Member", "Size"],
+        ([escape(m.disc), m.partition, escape(m.archive), escape(m.member), str(m.size)] for m in matches),
+    ))
+
+
+@library_app.command("diff")
+def library_diff(
+        first: Annotated[Path, typer.Argument(help="Reference disc.")],
+        second: Annotated[Path, typer.Argument(help="Disc compared to it.")],
+        catalog: IndexedCatalogOption,
+        as_json: JsonOption = False,
+) -> None:
+    """Files added, removed or changed between two indexed discs, without reading them"""
+    if not catalog.is_file():
+        abort(f"No catalog at {catalog}, run `wiithon library index` first.")
+    with ContentIndex(catalog) as index:
+        indexed = set(index.discs())
+        for disc in (first, second):
+            if str(disc.resolve()) not in indexed:
+                abort(f"{disc} is not indexed.")
+        diff = index.diff(first, second)
+
+    if as_json:
+        write_json(diff.to_dict())
+        return
+
+    rows = ([status, escape(path)] for status, paths in diff.to_dict().items() for path in paths)
+    console.print(render_table(["Status", "Path"], rows))
@@ -7,6 +7,7 @@ from wiithon.crypto.layout import (
     BLOCK_HEADER_SIZE,
     BLOCK_PER_GROUP,
     BLOCK_SIZE,
+    GROUP_SIZE,
     H1_OFFSET,
     H1_SIZE,
     H2_OFFSET,
@@ -67,6 +68,17 @@ def encrypt_group(group_data: bytes | bytearray, title_key: bytes, h3_ref: bytea
     :param h3_ref: Optional bytearray of length 20 where the H3 hash will be stored
     :return: The encrypted 2MB data as bytes
     """
+    return encrypt_hashed_group(hash_group(group_data, h3_ref), title_key)
+
+
+def hash_group(group_data: bytes | bytearray, h3_ref: bytearray | None = None) -> bytearray:
+    """
+    Fill the H0, H1 and H2 hash headers of a full 2MB group, without encrypting it
+
+    :param group_data: 2MB bytes/bytearray to be hashed
+    :param h3_ref: Optional bytearray of length 20 where the H3 hash will be stored
+    :return: A copy of the group, with its hash headers
+    """
     buffer = bytearray(group_data)
 
     hasher = hashlib.sha1
@@ -114,27 +126,47 @@ def encrypt_group(group_data: bytes | bytearray, title_key: bytes, h3_ref: bytea
     if h3_ref is not None:
         h3_ref[:] = hasher(h2).digest()
 
-    # Placing H2 and encrypt
-    for subgroup_index in range(SUBGROUP_BY_GROUP):
-        for block_index in range(BLOCK_BY_SUBGROUP):
-            block_start = subgroup_index * SUBGROUP_SIZE + block_index * BLOCK_SIZE
+    # Placing H2 in the block headers
+    for block_start in range(0, GROUP_SIZE, BLOCK_SIZE):
+        buffer[block_start + H2_OFFSET: block_start + H2_OFFSET + len(h2)] = h2
+        buffer[
+            block_start + IV_OFFSET + IV_SIZE:
+            block_start + BLOCK_HEADER_SIZE
+        ] = b'\x00' * (BLOCK_HEADER_SIZE - IV_OFFSET - IV_SIZE)
 
-            # Placing H2 in the block header
-            buffer[block_start + H2_OFFSET: block_start + H2_OFFSET + len(h2)] = h2
-            buffer[
-                block_start + IV_OFFSET + IV_SIZE:
-                block_start + BLOCK_HEADER_SIZE
-            ] = b'\x00' * (BLOCK_HEADER_SIZE - IV_OFFSET - IV_SIZE)
-
-            cipher = AES.new(title_key, AES.MODE_CBC, b'\x00' * IV_SIZE)
-            encrypted = cipher.encrypt(bytes(buffer[block_start: block_start + BLOCK_HEADER_SIZE]))
-            buffer[block_start: block_start + BLOCK_HEADER_SIZE] = encrypted
-
-            # Encrypt data with the last 16 bytes (before padding) of encrypted header
-            iv = buffer[block_start + IV_OFFSET: block_start + IV_OFFSET + IV_SIZE]
-            cipher2 = AES.new(title_key, AES.MODE_CBC, bytes(iv))
-            buffer[block_start + BLOCK_HEADER_SIZE: block_start + BLOCK_SIZE] = cipher2.encrypt(
-                bytes(buffer[block_start + BLOCK_HEADER_SIZE: block_start + BLOCK_SIZE])
-            )
-
-    return bytes(buffer)
\ No newline at end of file
+    return buffer
+
+
+def encrypt_hashed_group(buffer: bytearray, title_key: bytes) -> bytes:
+    """
+    Encrypt a full 2MB group whose hash headers are filled, see `hash_group`
+
+    :param buffer: 2MB hashed group, encrypted in place
+    :param title_key: 16-byte decrypted title key
+    :return: The encrypted 2MB data as bytes
+    """
+    for block_start in range(0, GROUP_SIZE, BLOCK_SIZE):
+        cipher = AES.new(title_key, AES.MODE_CBC, b'\x00' * IV_SIZE)
+        encrypted = cipher.encrypt(bytes(buffer[block_start: block_start + BLOCK_HEADER_SIZE]))
+        buffer[block_start: block_start + BLOCK_HEADER_SIZE] = encrypted
+
+        # Encrypt data with the last 16 bytes (before padding) of encrypted header
+        iv = buffer[block_start + IV_OFFSET: block_start + IV_OFFSET + IV_SIZE]
+        cipher2 = AES.new(title_key, AES.MODE_CBC, bytes(iv))
+        buffer[block_start + BLOCK_HEADER_SIZE: block_start + BLOCK_SIZE] = cipher2.encrypt(
+            bytes(buffer[block_start + BLOCK_HEADER_SIZE: block_start + BLOCK_SIZE])
+        )
+
+    return bytes(buffer)
+
+
+def group_user_data(group_data: bytes | bytearray) -> bytes:
+    """
+    User data of an unencrypted group: the 0x7C00 bytes following the header of each block
+
+    :param group_data: Unencrypted group, blocks laid out with their 0x400 header
+    :return: The user data (0x1F0000 bytes for a full group)
+    """
+    return b"".join(
+        group_data[start + BLOCK_HEADER_SIZE: start + BLOCK_SIZE] for start in range(0, len(group_data), BLOCK_SIZE)
+    )
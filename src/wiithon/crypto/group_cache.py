@@ -0,0 +1,258 @@
+"""
+On-disk cache of encrypted groups
+
+A group ciphertext only depends on its plaintext and on the title key: the IVs are taken from the
+hash headers, and the hash headers are computed from the plaintext. So two builds producing the same
+plaintext group always produce the same ciphertext, and the H0/H1/H2 hashing plus the AES pass can be
+skipped by looking the result up here.
+
+Entries are keyed by (title key, plaintext digest) and evicted in least-recently-used order once the
+cache grows past its size bound.
+`SharedGroupCache` is the in-memory counterpart, for builds running concurrently in one process
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Protocol
+
+from wiithon.crypto.layout import BLOCK_HEADER_SIZE, BLOCK_PER_GROUP, BLOCK_SIZE, GROUP_SIZE, SHA1_SIZE
+
+# 2 GB, roughly a thousand groups
+DEFAULT_MAX_SIZE: int = 2 * 1024 * 1024 * 1024
+
+_ENTRY_SIZE: int = GROUP_SIZE + SHA1_SIZE
+
+
+def group_digest(group_data: bytes | bytearray) -> bytes:
+    """
+    SHA-256 of the user data of a decrypted 2MB group.
+
+    The hash headers are skipped: they are recomputed by `encrypt_group` and may hold stale bytes
+
+    :param group_data: 2MB group, blocks laid out with their 0x400 header
+    :return: 32-byte digest
+    """
+    view = memoryview(group_data)
+    hasher = hashlib.sha256()
+    for i in range(BLOCK_PER_GROUP):
+        block_start = i * BLOCK_SIZE
+        hasher.update(view[block_start + BLOCK_HEADER_SIZE: block_start + BLOCK_SIZE])
+
+    return hasher.digest()
+
+
+class GroupCache(Protocol):
+    """What `CryptPartWriter` needs from a cache of encrypted groups"""
+    def get(self, title_key: bytes, digest: bytes) -> tuple[bytes, bytes] | None: ...
+
+    def put(self, title_key: bytes, digest: bytes, encrypted: bytes, h3: bytes) -> None: ...
+
+
+class EncryptedGroupCache:
+    """
+    Size-bounded LRU cache of encrypted groups, stored as one file per group under `path`
+
+    Each entry holds the 2MB ciphertext followed by the 20-byte H3 hash of the group.
+    The recency of an entry is its file modification time, so it survives across processes
+    """
+    def __init__(self, path: str | Path, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        """
+        :param path: Cache directory, created if needed
+        :param max_size: Maximum total size of the entries in bytes
+        """
+        if max_size < _ENTRY_SIZE:
+            raise ValueError(f"Cache size must hold at least one group ({_ENTRY_SIZE:#x} bytes), got {max_size:#x}")
+
+        self.path = Path(path)
+        self.max_size = max_size
+        self.hits: int = 0
+        self.misses: int = 0
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._size: int = sum(entry.stat().st_size for entry in self._entries())
+
+    @property
+    def size(self) -> int:
+        """Total size of the cached entries, in bytes"""
+        return self._size
+
+    def get(self, title_key: bytes, digest: bytes) -> tuple[bytes, bytes] | None:
+        """
+        Look up an encrypted group
+
+        :param title_key: 16-byte decrypted title key
+        :param digest: Plaintext digest, see `group_digest`
+        :return: (encrypted group, H3 hash) or None if the group is not cached
+        """
+        entry = self._entry_path(title_key, digest)
+        try:
+            data = entry.read_bytes()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        # Truncated entry (interrupted write, disk full...), drop it
+        if len(data) != _ENTRY_SIZE:
+            self._remove(entry)
+            self.misses += 1
+            return None
+
+        entry.touch()
+        self.hits += 1
+        return data[:GROUP_SIZE], data[GROUP_SIZE:]
+
+    def put(self, title_key: bytes, digest: bytes, encrypted: bytes, h3: bytes) -> None:
+        """
+        Store an encrypted group, evicting the least recently used entries if needed
+
+        :param title_key: 16-byte decrypted title key
+        :param digest: Plaintext digest, see `group_digest`
+        :param encrypted: The 2MB encrypted group
+        :param h3: The 20-byte H3 hash of the group
+        """
+        if len(encrypted) != GROUP_SIZE or len(h3) != SHA1_SIZE:
+            raise ValueError(f"Expected a {GROUP_SIZE:#x}-byte group and a {SHA1_SIZE}-byte H3 hash")
+
+        entry = self._entry_path(title_key, digest)
+        if entry.exists():
+            entry.touch()
+            return
+
+        entry.parent.mkdir(exist_ok=True)
+        # Write then rename, so a concurrent reader never sees a partial entry
+        temporary = entry.with_suffix(".tmp")
+        temporary.write_bytes(encrypted + h3)
+        temporary.replace(entry)
+        self._size += _ENTRY_SIZE
+
+        self._evict()
+
+    def clear(self) -> None:
+        """Remove every entry"""
+        for entry in self._entries():
+            self._remove(entry)
+
+    def _entry_path(self, title_key: bytes, digest: bytes) -> Path:
+        key = hashlib.sha256(title_key + digest).hexdigest()
+        return self.path / key[:2] / key
+
+    def _entries(self) -> list[Path]:
+        return [entry for entry in self.path.glob("*/*") if entry.suffix != ".tmp"]
+
+    def _remove(self, entry: Path) -> None:
+        try:
+            size = entry.stat().st_size
+            entry.unlink()
+        except FileNotFoundError:
+            return
+        self._size -= size
+
+    def _evict(self) -> None:
+        if self._size <= self.max_size:
+            return
+
+        entries = sorted(self._entries(), key=lambda e: e.stat().st_mtime_ns)
+        for entry in entries:
+            if self._size <= self.max_size:
+                break
+            self._remove(entry)
+
+    def __repr__(self) -> str:
+        return f"EncryptedGroupCache({self.path}, size: {self._size:#x}/{self.max_size:#x})"
+
+
+class SharedGroupCache:
+    """
+    Thread-safe in-memory cache of encrypted groups, shared by builds running at the same time
+
+    A miss reserves the group for the caller, which is expected to `put` it: the other builds asking for it
+    meanwhile wait for that result instead of encrypting the same group again.
+    Optionally backed by an `EncryptedGroupCache`, checked on miss and filled on put
+    """
+    def __init__(self, max_groups: int = 64, backing: EncryptedGroupCache | None = None) -> None:
+        """
+        :param max_groups: Number of groups kept in memory
+        :param backing: Optional on-disk cache
+        """
+        self.max_groups = max_groups
+        self.backing = backing
+        self.hits: int = 0
+        self.misses: int = 0
+
+        self._entries: OrderedDict[tuple[bytes, bytes], tuple[bytes, bytes]] = OrderedDict()
+        self._pending: dict[tuple[bytes, bytes], threading.Event] = {}
+        self._closed = False
+        self._lock = threading.Lock()
+        self._backing_lock = threading.Lock()
+
+    def get(self, title_key: bytes, digest: bytes) -> tuple[bytes, bytes] | None:
+        """
+        Look up an encrypted group, waiting for it if another build is encrypting it
+
+        :param title_key: 16-byte decrypted title key
+        :param digest: Plaintext digest, see `group_digest`
+        :return: (encrypted group, H3 hash) or None. The caller must then `put` the group
+        """
+        key = (title_key, digest)
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+
+                pending = self._pending.get(key)
+                if pending is None or self._closed:
+                    self._pending.setdefault(key, threading.Event())
+                    self.misses += 1
+                    break
+
+            pending.wait()
+
+        if self.backing is not None:
+            with self._backing_lock:
+                entry = self.backing.get(title_key, digest)
+            if entry is not None:
+                self.put(title_key, digest, *entry, backing=False)
+                return entry
+
+        return None
+
+    def put(self, title_key: bytes, digest: bytes, encrypted: bytes, h3: bytes, *, backing: bool = True) -> None:
+        """
+        Store an encrypted group and wake up the builds waiting for it
+
+        :param title_key: 16-byte decrypted title key
+        :param digest: Plaintext digest, see `group_digest`
+        :param encrypted: The 2MB encrypted group
+        :param h3: The 20-byte H3 hash of the group
+        :param backing: Also store it in the backing cache
+        """
+        key = (title_key, digest)
+        with self._lock:
+            self._entries[key] = (encrypted, h3)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_groups:
+                self._entries.popitem(last=False)
+
+            pending = self._pending.pop(key, None)
+        if pending is not None:
+            pending.set()
+
+        if backing and self.backing is not None:
+            with self._backing_lock:
+                self.backing.put(title_key, digest, encrypted, h3)
+
+    def close(self) -> None:
+        """Stop waiting: builds blocked on a group that will never be put encrypt it themselves"""
+        with self._lock:
+            self._closed = True
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for event in pending:
+            event.set()
+
+    def __repr__(self) -> str:
+        return f"SharedGroupCache({len(self._entries)}/{self.max_groups} groups)"
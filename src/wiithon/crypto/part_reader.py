@@ -1,6 +1,8 @@
+import threading
+from collections import OrderedDict
 from typing import BinaryIO
 
-from wiithon.crypto.blocks import decrypt_group
+from wiithon.crypto.blocks import decrypt_group, group_user_data
 from wiithon.crypto.layout import GROUP_DATA_SIZE, GROUP_SIZE
 
 
@@ -8,15 +10,23 @@ class CryptPartReader:
     """
     TODO: Maybe changing the name, not very explicit ?
     """
-    def __init__(self, stream: BinaryIO, data_offset: int, title_key: bytes) -> None:
+    def __init__(self, stream: BinaryIO, data_offset: int, title_key: bytes,
+                 *, encrypted: bool = True, hashed: bool = True) -> None:
         """
         :param stream: Open stream (like ISO)
         :param data_offset: Absolute offset of partition data in the ISO
         :param title_key: 16-byte decrypted title key
+        :param encrypted: Whether the partition data is encrypted. Development discs may store it in plaintext
+        :param hashed: Whether the blocks have their hash headers. Without them, the partition data is linear
         """
+        if encrypted and not hashed:
+            raise ValueError("Encrypted partition data always has hash headers")
+
         self.stream = stream
         self.data_offset = data_offset
         self.title_key = title_key
+        self.encrypted = encrypted
+        self.hashed = hashed
         self._cached_group_index: int = -1
         self._cached_data: bytes = b''
 
@@ -29,12 +39,37 @@ class CryptPartReader:
         if group_index == self._cached_group_index:
             return
 
-        self.stream.seek(self.data_offset + group_index * GROUP_SIZE)
-        raw_group = self.stream.read(GROUP_SIZE)
-
-        self._cached_data = decrypt_group(raw_group, self.title_key)
+        self._cached_data = self.decode_group(self._read_group(group_index))
         self._cached_group_index = group_index
 
+    @property
+    def stored_group_size(self) -> int:
+        """Size of a group as stored on the disc"""
+        return GROUP_SIZE if self.hashed else GROUP_DATA_SIZE
+
+    def _read_group(self, group_index: int) -> bytes:
+        """Read a group as stored on the disc"""
+        size = self.stored_group_size
+        self.stream.seek(self.data_offset + group_index * size)
+        raw_group = self.stream.read(size)
+
+        # Containers may end the image at its last stored block, the end of a scrubbed group reads as zeros
+        if 0 < len(raw_group) < size:
+            raw_group += bytes(size - len(raw_group))
+        return raw_group
+
+    def decode_group(self, raw_group: bytes) -> bytes:
+        """
+        User data of a group as stored on the disc
+
+        :param raw_group: `stored_group_size` bytes of the partition data
+        """
+        if self.encrypted:
+            return decrypt_group(raw_group, self.title_key)
+        if self.hashed:
+            return group_user_data(raw_group)
+        return raw_group
+
     def read_at(self, offset: int, size: int) -> bytes:
         """
         Read decrypted data at an offset
@@ -59,4 +94,82 @@ class CryptPartReader:
             position += can_read
             remaining -= can_read
 
-        return bytes(result)
\ No newline at end of file
+        return bytes(result)
+
+
+class SharedCryptPartReader(CryptPartReader):
+    """
+    Thread-safe `CryptPartReader` keeping the last decrypted groups, for several consumers reading
+    the same partition at about the same place (like builds of variants of one disc).
+    Each group is decrypted once while it stays in the cache, even if consumers ask for it concurrently
+    """
+    def __init__(self, stream: BinaryIO, data_offset: int, title_key: bytes, max_groups: int = 16,
+                 *, encrypted: bool = True, hashed: bool = True) -> None:
+        """
+        :param stream: Open stream (like ISO). Only this reader may use it while it is shared
+        :param data_offset: Absolute offset of partition data in the ISO
+        :param title_key: 16-byte decrypted title key
+        :param max_groups: Number of decrypted groups kept
+        :param encrypted: Whether the partition data is encrypted
+        :param hashed: Whether the blocks have their hash headers
+        """
+        super().__init__(stream, data_offset, title_key, encrypted=encrypted, hashed=hashed)
+        self.max_groups = max_groups
+        self.decrypted_groups: int = 0
+
+        self._groups: OrderedDict[int, bytes] = OrderedDict()
+        self._pending: dict[int, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._stream_lock = threading.Lock()
+
+    def _get_group(self, group_index: int) -> bytes:
+        while True:
+            with self._lock:
+                data = self._groups.get(group_index)
+                if data is not None:
+                    self._groups.move_to_end(group_index)
+                    return data
+
+                pending = self._pending.get(group_index)
+                if pending is None:
+                    pending = self._pending[group_index] = threading.Event()
+                    break
+
+            # Another consumer is decrypting it
+            pending.wait()
+
+        try:
+            with self._stream_lock:
+                raw_group = self._read_group(group_index)
+
+            # Outside the locks, so consumers decrypt different groups in parallel
+            data = bytes(self.decode_group(raw_group))
+
+            with self._lock:
+                self._groups[group_index] = data
+                self.decrypted_groups += 1
+                while len(self._groups) > self.max_groups:
+                    self._groups.popitem(last=False)
+        finally:
+            with self._lock:
+                del self._pending[group_index]
+            pending.set()
+
+        return data
+
+    def read_at(self, offset: int, size: int) -> bytes:
+        result = bytearray()
+        remaining = size
+        position = offset
+
+        while remaining > 0:
+            group_index = position // GROUP_DATA_SIZE
+            offset_in_group: int = position % GROUP_DATA_SIZE
+            can_read = min(remaining, GROUP_DATA_SIZE - offset_in_group)
+
+            result.extend(self._get_group(group_index)[offset_in_group:offset_in_group + can_read])
+
+            position += can_read
+            remaining -= can_read
+
+        return bytes(result)
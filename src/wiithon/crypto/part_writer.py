@@ -1,8 +1,10 @@
-from typing import BinaryIO
+from collections.abc import Callable
+from typing import TYPE_CHECKING, BinaryIO
 
 from Crypto.Cipher import AES
 
-from wiithon.crypto.blocks import encrypt_group
+from wiithon.crypto.blocks import encrypt_group, group_user_data, hash_group
+from wiithon.crypto.group_cache import GroupCache, group_digest
 from wiithon.crypto.layout import (
     BLOCK_DATA_SIZE,
     BLOCK_HEADER_SIZE,
@@ -12,20 +14,47 @@ from wiithon.crypto.layout import (
     GROUP_SIZE,
     IV_OFFSET,
     IV_SIZE,
+    SHA1_SIZE,
 )
 from wiithon.disc.layout import H3_TABLE_SIZE
 
+if TYPE_CHECKING:
+    from wiithon.builder.manifest import IncrementalBuild
+
 
 class CryptPartWriter:
-    def __init__(self, stream: BinaryIO, data_offset: int, title_key: bytes) -> None:
+    def __init__(self, stream: BinaryIO, data_offset: int, title_key: bytes,
+                 *, encrypted_cache: GroupCache | None = None,
+                 incremental: "IncrementalBuild | None" = None,
+                 record_digests: bool = False,
+                 on_flush: Callable[[int, bytes, bytes], None] | None = None,
+                 encrypted: bool = True, hashed: bool = True) -> None:
         """
         :param stream: Binarty IO
         :param data_offset: Absolute offset of data of the partition
         :param title_key: The encrypted title key
+        :param encrypted_cache: Optional cache of encrypted groups, checked before hashing and encrypting a group
+        :param incremental: Optional previous build whose unchanged groups are reused
+        :param record_digests: Keep the plaintext digest of every flushed group in `group_digests`
+        :param on_flush: Called with (group index, H3 hash, plaintext digest) once a group is on the stream
+        :param encrypted: Encrypt the groups. Unencrypted partitions are only read by development setups (Dolphin)
+                          and never use `encrypted_cache` or `incremental`
+        :param hashed: Fill the hash headers of the blocks. Without them, the partition data is written linearly
         """
+        if encrypted and not hashed:
+            raise ValueError("Encrypted partition data always has hash headers")
+
         self.stream = stream
         self.data_offset = data_offset
         self.title_key = title_key
+        self.encrypted_cache = encrypted_cache
+        self.incremental = incremental
+        self.record_digests = record_digests or on_flush is not None
+        self.on_flush = on_flush
+        self.encrypted = encrypted
+        self.hashed = hashed
+        self.group_digests: dict[int, bytes] = {}
+        self._written_groups: set[int] = set()
 
         self.is_dirty = False
         self.group_cache = bytearray(GROUP_SIZE)
@@ -72,19 +101,35 @@ class CryptPartWriter:
 
     def _load_group(self, group: int) -> None:
         self.is_dirty = False
-        physical_offset = self.data_offset + (group * GROUP_SIZE)
-        self.stream.seek(physical_offset)
+        if self.incremental is not None and self.incremental.in_place and group not in self._written_groups:
+            # The stream still holds the previous build there: the group starts blank, as in a new image
+            self.group_cache = bytearray(GROUP_SIZE)
+            self.current_group = group
+            return
+
+        self.stream.seek(self._group_offset(group))
 
-        raw_group = self.stream.read(GROUP_SIZE)
+        stored_size = GROUP_SIZE if self.hashed else GROUP_DATA_SIZE
+        raw_group = self.stream.read(stored_size)
 
         # If group doesn't exists
-        if not raw_group or len(raw_group) < GROUP_SIZE:
+        if not raw_group or len(raw_group) < stored_size:
             self.group_cache = bytearray(GROUP_SIZE)
             self.current_group = group
             return
 
-        self.group_cache = bytearray(raw_group)
         self.current_group = group
+        if not self.hashed:
+            self.group_cache = bytearray(GROUP_SIZE)
+            for i in range(BLOCK_PER_GROUP):
+                start = i * BLOCK_SIZE + BLOCK_HEADER_SIZE
+                data_start = i * BLOCK_DATA_SIZE
+                self.group_cache[start: start + BLOCK_DATA_SIZE] = raw_group[data_start: data_start + BLOCK_DATA_SIZE]
+            return
+
+        self.group_cache = bytearray(raw_group)
+        if not self.encrypted:
+            return
 
         # Decrypt
         for i in range(BLOCK_PER_GROUP):
@@ -111,21 +156,112 @@ class CryptPartWriter:
         if not self.is_dirty or self.current_group is None:
             return
 
-        # H3 update
-        h3_ptr = None
-        h3_offset = self.current_group * 20
-        if h3_offset + 20 <= len(self.h3_table):
-            h3_ptr = memoryview(self.h3_table)[h3_offset : h3_offset + 20]
+        physical_offset = self._group_offset(self.current_group)
+        h3 = bytearray(SHA1_SIZE)
+        encrypted_data = self._encrypt_group(self.current_group, physical_offset, h3)
 
-        # Encrypt H0, H1, H2
-        encrypted_data = encrypt_group(self.group_cache, self.title_key, h3_ptr)
+        # H3 update
+        h3_offset = self.current_group * SHA1_SIZE
+        if h3_offset + SHA1_SIZE <= len(self.h3_table):
+            self.h3_table[h3_offset: h3_offset + SHA1_SIZE] = h3
 
-        physical_offset = self.data_offset + (self.current_group * GROUP_SIZE)
-        self.stream.seek(physical_offset)
-        self.stream.write(encrypted_data)
+        if encrypted_data is not None:
+            self.stream.seek(physical_offset)
+            self.stream.write(encrypted_data)
 
+        self._written_groups.add(self.current_group)
         self.is_dirty = False
 
+        if self.on_flush is not None:
+            self.on_flush(self.current_group, bytes(h3), self.group_digests[self.current_group])
+
+    def restore_groups(self, groups: dict[int, tuple[bytes, bytes]]) -> None:
+        """
+        Take over groups already written to the stream by an interrupted build
+
+        :param groups: (H3 hash, plaintext digest) by group index
+        """
+        for group, (h3, digest) in groups.items():
+            h3_offset = group * SHA1_SIZE
+            if h3_offset + SHA1_SIZE <= len(self.h3_table):
+                self.h3_table[h3_offset: h3_offset + SHA1_SIZE] = h3
+            self.group_digests[group] = digest
+            self._written_groups.add(group)
+
+    def fill_unwritten_groups(self, count: int) -> None:
+        """
+        Once closed, write blank the groups among the first `count` that this build never wrote. Only needed in
+        place, where they still hold the previous build
+        """
+        for group in range(count):
+            if group not in self._written_groups:
+                self._load_group(group)
+                self.is_dirty = True
+                self._flush_group()
+
+    def _encrypt_group(self, group: int, physical_offset: int, h3: bytearray) -> bytes | None:
+        """
+        Hash and encrypt the cached group, or reuse a previous result
+
+        :param group: Index of the cached group
+        :param physical_offset: Where the group will be written
+        :param h3: Receives the H3 hash of the group
+        :return: The encrypted group, None if the stream already holds it at physical_offset
+        """
+        if not self.encrypted:
+            return self._plain_group(group, h3)
+
+        if self.encrypted_cache is None and self.incremental is None and not self.record_digests:
+            # Encrypt H0, H1, H2
+            return encrypt_group(self.group_cache, self.title_key, h3)
+
+        digest = group_digest(self.group_cache)
+        self.group_digests[group] = digest
+
+        if self.incremental is not None and (previous := self.incremental.find(self.title_key, digest)) is not None:
+            previous_offset, previous_h3 = previous
+            if not self.incremental.in_place:
+                encrypted_data = self.incremental.read_group(previous_offset)
+                if len(encrypted_data) == GROUP_SIZE:
+                    self.incremental.reused += 1
+                    h3[:] = previous_h3
+                    return encrypted_data
+
+            # In place, the group is only kept if nothing overwrote it during this build
+            elif previous_offset == physical_offset and group not in self._written_groups:
+                self.incremental.reused += 1
+                h3[:] = previous_h3
+                return None
+
+        if self.encrypted_cache is not None:
+            cached = self.encrypted_cache.get(self.title_key, digest)
+            if cached is not None:
+                encrypted_data, h3[:] = cached
+                return encrypted_data
+
+        encrypted_data = encrypt_group(self.group_cache, self.title_key, h3)
+        if self.encrypted_cache is not None:
+            self.encrypted_cache.put(self.title_key, digest, encrypted_data, bytes(h3))
+
+        return encrypted_data
+
+    def _plain_group(self, group: int, h3: bytearray) -> bytes:
+        """
+        The cached group as written to an unencrypted partition
+
+        :param group: Index of the cached group
+        :param h3: Receives the H3 hash of the group, left blank without hash headers
+        """
+        if self.record_digests:
+            self.group_digests[group] = group_digest(self.group_cache)
+        if not self.hashed:
+            return group_user_data(self.group_cache)
+        return bytes(hash_group(self.group_cache, h3))
+
+    def _group_offset(self, group: int) -> int:
+        """Absolute offset of a group in the stream"""
+        return self.data_offset + group * (GROUP_SIZE if self.hashed else GROUP_DATA_SIZE)
+
     def seek(self, offset: int, whence: int = 0) -> None:
         if whence == 0:
             new_position = offset
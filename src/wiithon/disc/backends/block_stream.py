@@ -0,0 +1,179 @@
+"""
+Virtual disc image stored block by block in a container file
+
+The image is cut in fixed-size blocks, each stored anywhere in the container, or not stored at all when it only
+holds zeros. Reads and writes only touch the stored blocks, so an image never has to be expanded to a full ISO
+"""
+import io
+from abc import abstractmethod
+from typing import BinaryIO
+
+
+class BlockMappedStream(io.RawIOBase):
+    """
+    Seekable stream over a block-mapped image
+
+    Reading a block that is not stored gives zeros, and writing zeros to it does not store it.
+    Like a regular file, reading past the image size gives nothing.
+    Subclasses map block indexes to offsets in the container and save their block map in `_write_metadata`
+    """
+    def __init__(self, file: BinaryIO, block_size: int, size: int, *, writable: bool = False) -> None:
+        """
+        :param file: Container file, owned by the stream from now on
+        :param block_size: Size of a block in the image
+        :param size: Size of the image
+        :param writable: Whether the image can be modified
+        """
+        super().__init__()
+        self.block_size = block_size
+        self._file = file
+        self._size = size
+        self._position: int = 0
+        self._writable = writable
+        self._dirty = False
+        self._zeros = memoryview(bytes(block_size))
+
+    @abstractmethod
+    def _locate(self, block: int) -> int | None:
+        """Offset of a block in the container, None if it is not stored"""
+
+    def _allocate(self, block: int) -> int:
+        """Store a new block in the container, filled with zeros, and return its offset"""
+        raise io.UnsupportedOperation(f"{type(self).__name__} cannot store block {block}")
+
+    def _release(self, block: int) -> None:
+        """Forget a block past the end of the image after a truncation"""
+
+    def _stored_blocks(self) -> list[int]:
+        """Indexes of the stored blocks"""
+        return []
+
+    def _write_metadata(self) -> None:
+        """Save the block map to the container"""
+
+    def _resize_container(self, size: int) -> None:
+        """Grow or cut the container file to exactly size bytes"""
+        if self._file.seek(0, io.SEEK_END) < size:
+            self._file.seek(size - 1)
+            self._file.write(b"\x00")
+        else:
+            self._file.truncate(size)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def readable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return self._writable
+
+    def seekable(self) -> bool:
+        return True
+
+    def fileno(self) -> int:
+        return self._file.fileno()
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self._size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}")
+        self._position = position
+        return position
+
+    def readinto(self, buffer: bytearray | memoryview) -> int:
+        view = memoryview(buffer).cast("B")
+        size = min(len(view), max(0, self._size - self._position))
+
+        done = 0
+        while done < size:
+            block, offset = divmod(self._position, self.block_size)
+            chunk = min(size - done, self.block_size - offset)
+
+            location = self._locate(block)
+            if location is None:
+                view[done:done + chunk] = self._zeros[:chunk]
+            else:
+                self._file.seek(location + offset)
+                data = self._file.read(chunk)
+                view[done:done + len(data)] = data
+                # Last block of the container may be cut short
+                view[done + len(data):done + chunk] = self._zeros[:chunk - len(data)]
+
+            done += chunk
+            self._position += chunk
+
+        return done
+
+    def write(self, data: bytes | bytearray | memoryview) -> int:
+        if not self._writable:
+            raise io.UnsupportedOperation("Image opened read-only")
+
+        view = memoryview(data).cast("B")
+        done = 0
+        while done < len(view):
+            block, offset = divmod(self._position, self.block_size)
+            chunk = min(len(view) - done, self.block_size - offset)
+            part = view[done:done + chunk]
+
+            location = self._locate(block)
+            if location is None and part != self._zeros[:chunk]:
+                location = self._allocate(block)
+            if location is not None:
+                self._file.seek(location + offset)
+                self._file.write(part)
+
+            done += chunk
+            self._position += chunk
+
+        self._size = max(self._size, self._position)
+        self._dirty = True
+        return done
+
+    def truncate(self, size: int | None = None) -> int:
+        if not self._writable:
+            raise io.UnsupportedOperation("Image opened read-only")
+
+        size = self._position if size is None else size
+        first_dropped = -(-size // self.block_size)
+        for block in self._stored_blocks():
+            if block >= first_dropped:
+                self._release(block)
+
+        # Like a file, what is past the end reads as zeros if the image grows again
+        tail = size % self.block_size
+        if tail and (location := self._locate(size // self.block_size)) is not None:
+            self._file.seek(location + tail)
+            self._file.write(self._zeros[tail:])
+
+        self._size = size
+        self._dirty = True
+        return size
+
+    def flush(self) -> None:
+        if self.closed:
+            return
+        if self._dirty:
+            self._write_metadata()
+            self._dirty = False
+        self._file.flush()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            super().close()
+        finally:
+            self._file.close()
@@ -0,0 +1,148 @@
+"""
+CISO (compact ISO) container
+
+A 0x8000-byte header: the "CISO" magic word, the block size (little-endian u32) and a map with one byte per block
+of the disc, set when the block is stored. The stored blocks follow the header, in block order.
+Blocks that are not stored read as zeros
+
+`CisoStream` reads CISO files and writes them. Blocks are appended as they are first written with something else
+than zeros: the builder writes the disc in order, so they usually end up in block order already. If not, the blocks
+are put back in order when the stream is closed, and the file is only a valid CISO from then on
+"""
+import shutil
+import struct
+import tempfile
+from typing import BinaryIO
+
+from wiithon.disc.backends.block_stream import BlockMappedStream
+from wiithon.exceptions import InvalidDiscError
+
+CISO_MAGIC: bytes = b"CISO"
+CISO_HEADER_SIZE: int = 0x8000
+CISO_MAP_SIZE: int = CISO_HEADER_SIZE - 8
+DEFAULT_BLOCK_SIZE: int = 0x200000
+
+
+class CisoStream(BlockMappedStream):
+    def __init__(self, file: BinaryIO, block_size: int, blocks: list[int], *, writable: bool = False) -> None:
+        """
+        Prefer `CisoStream.open` and `CisoStream.create`
+
+        :param file: CISO file, owned by the stream from now on
+        :param block_size: Size of a block
+        :param blocks: Indexes of the stored blocks, in the order they are stored
+        :param writable: Whether the disc can be modified
+        """
+        super().__init__(file, block_size, (max(blocks) + 1) * block_size if blocks else 0, writable=writable)
+        self._locations: dict[int, int] = {
+            block: CISO_HEADER_SIZE + i * block_size for i, block in enumerate(blocks)
+        }
+        self._end: int = CISO_HEADER_SIZE + len(blocks) * block_size
+        self._ordered: bool = True
+
+    @classmethod
+    def open(cls, file: BinaryIO, *, writable: bool = False) -> "CisoStream":
+        """
+        Open a CISO file
+
+        :param file: CISO file
+        :param writable: Allow modifying the disc
+        """
+        file.seek(0)
+        header = file.read(CISO_HEADER_SIZE)
+        if len(header) != CISO_HEADER_SIZE or header[:4] != CISO_MAGIC:
+            raise InvalidDiscError(f"Not a CISO file, magic word is {header[:4]!r}")
+
+        (block_size,) = struct.unpack_from("<I", header, 4)
+        if block_size == 0 or block_size & (block_size - 1):
+            raise InvalidDiscError(f"Invalid CISO block size {block_size:#x}")
+
+        blocks = [block for block, present in enumerate(header[8:]) if present]
+        return cls(file, block_size, blocks, writable=writable)
+
+    @classmethod
+    def create(cls, file: BinaryIO, block_size: int = DEFAULT_BLOCK_SIZE) -> "CisoStream":
+        """
+        Start a new CISO file
+
+        :param file: Empty file, open for reading and writing
+        :param block_size: Size of a block, a power of two
+        """
+        if block_size == 0 or block_size & (block_size - 1):
+            raise ValueError(f"CISO block size must be a power of two, got {block_size:#x}")
+
+        stream = cls(file, block_size, [], writable=True)
+        stream._write_metadata()
+        return stream
+
+    def _locate(self, block: int) -> int | None:
+        return self._locations.get(block)
+
+    def _allocate(self, block: int) -> int:
+        if block >= CISO_MAP_SIZE:
+            raise ValueError(f"Offset {block * self.block_size:#x} is past the end of a CISO disc")
+
+        if self._locations and block < max(self._locations):
+            self._ordered = False
+
+        location = self._end
+        # Space left by a truncation still holds its old data
+        if location < self._file.seek(0, 2):
+            self._file.seek(location)
+            self._file.write(self._zeros)
+
+        self._locations[block] = location
+        self._end += self.block_size
+        return location
+
+    def _release(self, block: int) -> None:
+        location = self._locations.pop(block)
+        if location + self.block_size == self._end:
+            self._end = location
+        else:
+            self._ordered = False
+
+    def _stored_blocks(self) -> list[int]:
+        return list(self._locations)
+
+    def _write_metadata(self) -> None:
+        # Out of order, the map cannot describe the file until it is sorted on close
+        if not self._ordered:
+            return
+
+        header = bytearray(CISO_HEADER_SIZE)
+        header[:4] = CISO_MAGIC
+        struct.pack_into("<I", header, 4, self.block_size)
+        for block in self._locations:
+            header[8 + block] = 1
+
+        self._file.seek(0)
+        self._file.write(header)
+        self._resize_container(self._end)
+
+    def _sort_blocks(self) -> None:
+        """Rewrite the stored blocks in block order"""
+        order = sorted(self._locations)
+        with tempfile.TemporaryFile() as spill:
+            for block in order:
+                self._file.seek(self._locations[block])
+                data = self._file.read(self.block_size)
+                spill.write(data)
+                spill.write(self._zeros[len(data):])
+
+            spill.seek(0)
+            self._file.seek(CISO_HEADER_SIZE)
+            shutil.copyfileobj(spill, self._file)
+
+        self._locations = {block: CISO_HEADER_SIZE + i * self.block_size for i, block in enumerate(order)}
+        self._end = CISO_HEADER_SIZE + len(order) * self.block_size
+        self._ordered = True
+        self._dirty = True
+
+    def close(self) -> None:
+        if not self.closed and self._writable and not self._ordered:
+            self._sort_blocks()
+        super().close()
+
+    def __repr__(self) -> str:
+        return f"CisoStream(block size: {self.block_size:#x}, blocks: {len(self._locations)})"
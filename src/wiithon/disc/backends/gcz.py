@@ -0,0 +1,384 @@
+"""
+GCZ container: zlib-compressed blocks with an index
+
+A 32-byte little-endian header (magic, sub type, compressed data size, image size, block size, block count),
+then the offset of each block in the data area, the Adler-32 of each stored block, and the data area.
+The top bit of an offset marks a block stored uncompressed. Blocks are stored in block order
+
+`GczStream` reads any block in O(1) through the index, keeping the last decompressed blocks.
+`GczWriter` is the output side: blocks are compressed by a thread pool as soon as the builder leaves them,
+and the file is assembled in block order when the writer is closed
+"""
+import io
+import os
+import struct
+import tempfile
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO
+
+from wiithon.exceptions import CorruptedDataError, InvalidDiscError
+
+GCZ_MAGIC: bytes = struct.pack("<I", 0xB10BC001)
+GCZ_SUB_TYPE_WII: int = 1
+DEFAULT_BLOCK_SIZE: int = 0x8000
+
+UNCOMPRESSED_FLAG: int = 1 << 63
+
+_HEADER = struct.Struct("<4sIQQII")
+
+
+def _compress_block(data: bytes, level: int = zlib.Z_DEFAULT_COMPRESSION) -> tuple[bytes, bool]:
+    """Return the stored form of a block and whether it is compressed"""
+    compressed = zlib.compress(data, level)
+    if len(compressed) >= len(data):
+        return data, False
+    return compressed, True
+
+
+class GczStream(io.RawIOBase):
+    """Read-only stream of the image stored in a GCZ file"""
+    def __init__(self, file: BinaryIO, block_size: int, image_size: int, pointers: list[int],
+                 hashes: list[int], data_offset: int, data_size: int, cached_blocks: int = 16) -> None:
+        """
+        Prefer `GczStream.open`
+
+        :param file: GCZ file, owned by the stream from now on
+        :param block_size: Size of an uncompressed block
+        :param image_size: Size of the image
+        :param pointers: Offset of each block in the data area, flagged when stored uncompressed
+        :param hashes: Adler-32 of each stored block
+        :param data_offset: Offset of the data area in the file
+        :param data_size: Size of the data area
+        :param cached_blocks: Number of decompressed blocks kept
+        """
+        super().__init__()
+        self.block_size = block_size
+        self.cached_blocks = cached_blocks
+        self._file = file
+        self._size = image_size
+        self._pointers = pointers
+        self._hashes = hashes
+        self._data_offset = data_offset
+        self._data_size = data_size
+        self._position: int = 0
+        self._cache: OrderedDict[int, bytes] = OrderedDict()
+
+    @classmethod
+    def open(cls, file: BinaryIO, *, writable: bool = False) -> "GczStream":
+        """
+        Open a GCZ file
+
+        :param file: GCZ file
+        :param writable: GCZ images cannot be modified, must be False
+        """
+        if writable:
+            raise ValueError("GCZ images cannot be modified in place")
+
+        file.seek(0)
+        header = file.read(_HEADER.size)
+        if len(header) != _HEADER.size or header[:4] != GCZ_MAGIC:
+            raise InvalidDiscError(f"Not a GCZ file, magic word is {header[:4]!r}")
+
+        _, _, data_size, image_size, block_size, block_count = _HEADER.unpack(header)
+        if block_size == 0 or block_count * block_size < image_size:
+            raise InvalidDiscError(f"Invalid GCZ geometry: {block_count} blocks of {block_size:#x} bytes")
+
+        table = file.read(block_count * 12)
+        if len(table) != block_count * 12:
+            raise InvalidDiscError("GCZ block index is truncated")
+
+        pointers = list(struct.unpack_from(f"<{block_count}Q", table))
+        hashes = list(struct.unpack_from(f"<{block_count}I", table, block_count * 8))
+        return cls(file, block_size, image_size, pointers, hashes, _HEADER.size + len(table), data_size)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._position = _seek_position(self._position, self._size, offset, whence)
+        return self._position
+
+    def _block(self, index: int) -> bytes:
+        data = self._cache.get(index)
+        if data is not None:
+            self._cache.move_to_end(index)
+            return data
+
+        pointer = self._pointers[index]
+        start = pointer & ~UNCOMPRESSED_FLAG
+        end = (self._pointers[index + 1] & ~UNCOMPRESSED_FLAG
+               if index + 1 < len(self._pointers) else self._data_size)
+
+        self._file.seek(self._data_offset + start)
+        stored = self._file.read(end - start)
+        if zlib.adler32(stored) != self._hashes[index]:
+            raise CorruptedDataError(f"GCZ block {index} does not match its hash")
+
+        data = stored if pointer & UNCOMPRESSED_FLAG else zlib.decompress(stored)
+        if len(data) != self.block_size:
+            raise CorruptedDataError(f"GCZ block {index} is {len(data):#x} bytes, expected {self.block_size:#x}")
+
+        self._cache[index] = data
+        if len(self._cache) > self.cached_blocks:
+            self._cache.popitem(last=False)
+        return data
+
+    def readinto(self, buffer: bytearray | memoryview) -> int:
+        view = memoryview(buffer).cast("B")
+        size = min(len(view), max(0, self._size - self._position))
+
+        done = 0
+        while done < size:
+            block, offset = divmod(self._position, self.block_size)
+            chunk = min(size - done, self.block_size - offset)
+            view[done:done + chunk] = self._block(block)[offset:offset + chunk]
+            done += chunk
+            self._position += chunk
+
+        return done
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            super().close()
+        finally:
+            self._file.close()
+
+
+class GczWriter(io.RawIOBase):
+    """
+    Writable stream producing a GCZ file
+
+    The blocks the builder is writing stay uncompressed in a window. Once a block leaves it, it is compressed in
+    the background and spilled to a temporary file. Reading or writing it again decompresses it back into the
+    window, so the builder can still revisit what it wrote (like the first group of a partition).
+    On close, the header, the index and the blocks in block order are written to the file
+    """
+    def __init__(self, file: BinaryIO, block_size: int = DEFAULT_BLOCK_SIZE, *,
+                 window_blocks: int = 256, workers: int | None = None,
+                 level: int = zlib.Z_DEFAULT_COMPRESSION) -> None:
+        """
+        :param file: Empty file, owned by the writer from now on
+        :param block_size: Size of an uncompressed block
+        :param window_blocks: Number of uncompressed blocks kept before being compressed
+        :param workers: Compression threads, one per CPU by default. zlib releases the GIL while compressing
+        :param level: zlib compression level
+        """
+        super().__init__()
+        self.block_size = block_size
+        self.window_blocks = window_blocks
+        self.level = level
+        self._file = file
+        self._size: int = 0
+        self._position: int = 0
+
+        self._window: OrderedDict[int, bytearray] = OrderedDict()
+        self._compressing: dict[int, Future[tuple[bytes, bool]]] = {}
+        # block -> (offset in the spill file, stored size, is compressed, Adler-32)
+        self._spilled: dict[int, tuple[int, int, bool, int]] = {}
+
+        self._workers = workers or os.cpu_count() or 1
+        self._pool = ThreadPoolExecutor(self._workers, thread_name_prefix="wiithon-gcz")
+        name = getattr(file, "name", None)
+        self._spill = tempfile.TemporaryFile(dir=Path(name).parent if isinstance(name, str) else None)  # noqa: SIM115
+        self._zeros = bytes(block_size)
+        self._zero_block = _compress_block(self._zeros, level)
+
+    @classmethod
+    def create(cls, file: BinaryIO) -> "GczWriter":
+        return cls(file)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def readable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._position = _seek_position(self._position, self._size, offset, whence)
+        return self._position
+
+    def _stored(self, block: int) -> bytes | None:
+        """Uncompressed content of a block out of the window, None if never written"""
+        future = self._compressing.get(block)
+        if future is not None:
+            data, compressed = future.result()
+        elif block in self._spilled:
+            offset, size, compressed, _ = self._spilled[block]
+            self._spill.seek(offset)
+            data = self._spill.read(size)
+        else:
+            return None
+        return zlib.decompress(data) if compressed else data
+
+    def _window_block(self, block: int) -> bytearray:
+        data = self._window.get(block)
+        if data is not None:
+            self._window.move_to_end(block)
+            return data
+
+        stored = self._stored(block)
+        self._compressing.pop(block, None)
+        self._spilled.pop(block, None)
+        data = self._window[block] = bytearray(stored if stored is not None else self.block_size)
+
+        while len(self._window) > self.window_blocks:
+            self._submit(*self._window.popitem(last=False))
+        return data
+
+    def _submit(self, block: int, data: bytearray) -> None:
+        # Blocks of zeros are left out, they are stored as such when the file is assembled
+        if data == self._zeros:
+            return
+
+        self._compressing[block] = self._pool.submit(_compress_block, bytes(data), self.level)
+        self._harvest(wait=len(self._compressing) > 4 * self._workers)
+
+    def _harvest(self, *, wait: bool = False) -> None:
+        """Spill the compressed blocks, waiting for the oldest one if wait"""
+        for block, future in list(self._compressing.items()):
+            if not future.done() and not wait:
+                continue
+            wait = False
+
+            data, compressed = future.result()
+            offset = self._spill.seek(0, io.SEEK_END)
+            self._spill.write(data)
+            self._spilled[block] = (offset, len(data), compressed, zlib.adler32(data))
+            del self._compressing[block]
+
+    def readinto(self, buffer: bytearray | memoryview) -> int:
+        view = memoryview(buffer).cast("B")
+        size = min(len(view), max(0, self._size - self._position))
+
+        done = 0
+        while done < size:
+            block, offset = divmod(self._position, self.block_size)
+            chunk = min(size - done, self.block_size - offset)
+
+            data = self._window.get(block)
+            if data is None:
+                data = self._stored(block) or self._zeros
+            view[done:done + chunk] = data[offset:offset + chunk]
+
+            done += chunk
+            self._position += chunk
+
+        return done
+
+    def write(self, data: bytes | bytearray | memoryview) -> int:
+        view = memoryview(data).cast("B")
+        done = 0
+        while done < len(view):
+            block, offset = divmod(self._position, self.block_size)
+            chunk = min(len(view) - done, self.block_size - offset)
+            self._window_block(block)[offset:offset + chunk] = view[done:done + chunk]
+            done += chunk
+            self._position += chunk
+
+        self._size = max(self._size, self._position)
+        return done
+
+    def truncate(self, size: int | None = None) -> int:
+        size = self._position if size is None else size
+        first_dropped = -(-size // self.block_size)
+        for blocks in (self._window, self._compressing, self._spilled):
+            for block in [b for b in blocks if b >= first_dropped]:
+                del blocks[block]
+
+        tail = size % self.block_size
+        if tail and size < self._size:
+            self._window_block(size // self.block_size)[tail:] = bytes(self.block_size - tail)
+
+        self._size = size
+        return size
+
+    def _assemble(self) -> None:
+        while self._window:
+            self._submit(*self._window.popitem(last=False))
+        while self._compressing:
+            self._harvest(wait=True)
+
+        block_count = -(-self._size // self.block_size)
+        zero_data, zero_compressed = self._zero_block
+
+        pointers: list[int] = []
+        hashes: list[int] = []
+        position = 0
+        zero_hash = zlib.adler32(zero_data)
+        for block in range(block_count):
+            if block in self._spilled:
+                _, size, compressed, adler = self._spilled[block]
+            else:
+                size, compressed, adler = len(zero_data), zero_compressed, zero_hash
+            hashes.append(adler)
+            pointers.append(position | (0 if compressed else UNCOMPRESSED_FLAG))
+            position += size
+
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(GCZ_MAGIC, GCZ_SUB_TYPE_WII, position, self._size,
+                                      self.block_size, block_count))
+        self._file.write(struct.pack(f"<{block_count}Q", *pointers))
+        self._file.write(struct.pack(f"<{block_count}I", *hashes))
+
+        for block in range(block_count):
+            if block in self._spilled:
+                offset, size, _, _ = self._spilled[block]
+                self._spill.seek(offset)
+                self._file.write(self._spill.read(size))
+            else:
+                self._file.write(zero_data)
+        self._file.truncate()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            self._assemble()
+        finally:
+            self._pool.shutdown()
+            self._spill.close()
+            self._file.close()
+            super().close()
+
+    def __repr__(self) -> str:
+        return f"GczWriter(block size: {self.block_size:#x}, size: {self._size:#x})"
+
+
+def _seek_position(position: int, size: int, offset: int, whence: int) -> int:
+    if whence == io.SEEK_SET:
+        new_position = offset
+    elif whence == io.SEEK_CUR:
+        new_position = position + offset
+    elif whence == io.SEEK_END:
+        new_position = size + offset
+    else:
+        raise ValueError(f"Invalid whence: {whence}")
+
+    if new_position < 0:
+        raise ValueError(f"Negative seek position {new_position}")
+    return new_position
@@ -0,0 +1,63 @@
+"""
+Open disc images whatever their container
+
+Containers are recognized by their magic word when reading, and chosen by file extension when creating an image.
+Anything else is a plain ISO, opened as a regular file
+"""
+from collections.abc import Callable
+from pathlib import Path
+from typing import BinaryIO
+
+from wiithon.disc.backends.ciso import CISO_MAGIC, CisoStream
+from wiithon.disc.backends.gcz import GCZ_MAGIC, GczStream, GczWriter
+from wiithon.disc.backends.wbfs import WBFS_MAGIC, WbfsStream
+from wiithon.disc.backends.wci import WCI_MAGIC, WciStream, WciWriter
+
+_READERS: dict[bytes, Callable[..., BinaryIO]] = {
+    WBFS_MAGIC: WbfsStream.open,
+    CISO_MAGIC: CisoStream.open,
+    GCZ_MAGIC: GczStream.open,
+    WCI_MAGIC: WciStream.open,
+}
+
+_WRITERS: dict[str, Callable[[BinaryIO], BinaryIO]] = {
+    ".wbfs": WbfsStream.create,
+    ".ciso": CisoStream.create,
+    ".gcz": GczWriter.create,
+    ".wci": WciWriter.create,
+}
+
+
+def open_disc(path: str | Path, *, writable: bool = False) -> BinaryIO:
+    """
+    Open a disc image as a seekable stream of the plain ISO
+
+    :param path: ISO or container file
+    :param writable: Open it for reading and writing
+    """
+    file = Path(path).open("r+b" if writable else "rb")  # noqa: SIM115
+    try:
+        magic = file.read(4)
+        file.seek(0)
+        opener = _READERS.get(magic)
+        return file if opener is None else opener(file, writable=writable)
+    except BaseException:
+        file.close()
+        raise
+
+
+def create_disc(path: str | Path) -> BinaryIO:
+    """
+    Create an empty disc image, open for reading and writing. The container is chosen by extension
+    (`.wbfs`, `.ciso`, `.gcz`, `.wci`), anything else creates a plain ISO
+
+    :param path: Image to create, replaced if it exists
+    """
+    path = Path(path)
+    file = path.open("w+b")  # noqa: SIM115
+    creator = _WRITERS.get(path.suffix.lower())
+    try:
+        return file if creator is None else creator(file)
+    except BaseException:
+        file.close()
+        raise
@@ -0,0 +1,185 @@
+"""
+WBFS container, see https://wiibrew.org/wiki/WBFS
+
+A WBFS partition is cut in WBFS sectors (2MB by default). Sector 0 holds the partition header, one disc info
+per disc slot and the free sectors bitmap. A disc info starts with a copy of the disc header, followed by the
+WLBA table: for each WBFS-sector-sized block of the disc, the sector storing it (0 if the block is unused)
+
+`WbfsStream` exposes one disc of a WBFS file as a virtual ISO. It can also create single-disc WBFS files:
+blocks get a sector when first written with something else than zeros.
+WBFS does not store the size of the image: a reopened image ends with its last stored block
+"""
+import struct
+from typing import BinaryIO
+
+from wiithon.binary.align import align
+from wiithon.disc.backends.block_stream import BlockMappedStream
+from wiithon.exceptions import InvalidDiscError
+
+WBFS_MAGIC: bytes = b"WBFS"
+
+HD_SECTOR_SHIFT: int = 9
+WBFS_SECTOR_SHIFT: int = 21
+WII_SECTOR_SHIFT: int = 15
+# Dual layer disc, in 0x8000-byte Wii sectors
+WII_SECTORS_PER_DISC: int = 143432 * 2
+
+DISC_HEADER_COPY_SIZE: int = 0x100
+DISC_TABLE_OFFSET: int = 0xC
+
+_HEADER = struct.Struct(">4sIBBBB")
+
+
+class WbfsStream(BlockMappedStream):
+    def __init__(self, file: BinaryIO, hd_sector_shift: int, wbfs_sector_shift: int,
+                 wlba_table: list[int], disc_slot: int = 0, *, writable: bool = False) -> None:
+        """
+        Prefer `WbfsStream.open` and `WbfsStream.create`
+
+        :param file: WBFS file, owned by the stream from now on
+        :param hd_sector_shift: log2 of the HD sector size
+        :param wbfs_sector_shift: log2 of the WBFS sector size, which is the block size
+        :param wlba_table: WBFS sector of each block of the disc, 0 if not stored
+        :param disc_slot: Slot of the disc in the partition
+        :param writable: Whether the disc can be modified
+        """
+        used = [block for block, sector in enumerate(wlba_table) if sector]
+        size = (max(used) + 1) << wbfs_sector_shift if used else 0
+        super().__init__(file, 1 << wbfs_sector_shift, size, writable=writable)
+
+        self.hd_sector_shift = hd_sector_shift
+        self.wbfs_sector_shift = wbfs_sector_shift
+        self.wlba_table = wlba_table
+        self.disc_slot = disc_slot
+
+    @classmethod
+    def open(cls, file: BinaryIO, *, writable: bool = False, disc_slot: int | None = None) -> "WbfsStream":
+        """
+        Open a disc of a WBFS file
+
+        :param file: WBFS file
+        :param writable: Allow modifying the disc. Only single-disc files can be modified
+        :param disc_slot: Slot of the disc, the first used one by default
+        """
+        file.seek(0)
+        magic, _, hd_shift, wbfs_shift, _, _ = _HEADER.unpack(file.read(_HEADER.size))
+        if magic != WBFS_MAGIC:
+            raise InvalidDiscError(f"Not a WBFS file, magic word is {magic!r}")
+        if not hd_shift < wbfs_shift <= 31 or wbfs_shift < WII_SECTOR_SHIFT:
+            raise InvalidDiscError(f"Invalid WBFS sector sizes: 2^{hd_shift} and 2^{wbfs_shift}")
+
+        disc_table = file.read((1 << hd_shift) - DISC_TABLE_OFFSET)
+        used_slots = [slot for slot, used in enumerate(disc_table) if used]
+        if disc_slot is None:
+            if not used_slots:
+                raise InvalidDiscError("WBFS file holds no disc")
+            disc_slot = used_slots[0]
+        elif disc_slot not in used_slots:
+            raise InvalidDiscError(f"WBFS disc slot {disc_slot} is empty")
+        if writable and used_slots != [disc_slot]:
+            raise ValueError("Only single-disc WBFS files can be modified")
+
+        blocks = _blocks_per_disc(wbfs_shift)
+        file.seek(_disc_info_offset(hd_shift, wbfs_shift, disc_slot) + DISC_HEADER_COPY_SIZE)
+        table = file.read(blocks * 2)
+        if len(table) != blocks * 2:
+            raise InvalidDiscError("WBFS disc info is truncated")
+
+        return cls(file, hd_shift, wbfs_shift, list(struct.unpack(f">{blocks}H", table)), disc_slot,
+                   writable=writable)
+
+    @classmethod
+    def create(cls, file: BinaryIO, wbfs_sector_shift: int = WBFS_SECTOR_SHIFT) -> "WbfsStream":
+        """
+        Start a new single-disc WBFS file
+
+        :param file: Empty file, open for reading and writing
+        :param wbfs_sector_shift: log2 of the WBFS sector size
+        """
+        stream = cls(file, HD_SECTOR_SHIFT, wbfs_sector_shift, [0] * _blocks_per_disc(wbfs_sector_shift),
+                     writable=True)
+        # So an interrupted build still leaves a WBFS file behind
+        stream._write_metadata()
+        return stream
+
+    def _locate(self, block: int) -> int | None:
+        if block >= len(self.wlba_table) or not self.wlba_table[block]:
+            return None
+        return self.wlba_table[block] << self.wbfs_sector_shift
+
+    def _allocate(self, block: int) -> int:
+        if block >= len(self.wlba_table):
+            raise ValueError(f"Offset {block << self.wbfs_sector_shift:#x} is past the end of a WBFS disc")
+
+        # Sector 0 holds the headers
+        used = set(self.wlba_table)
+        sector = next(s for s in range(1, len(used) + 2) if s not in used)
+        location = sector << self.wbfs_sector_shift
+
+        # A sector freed by a truncation still holds its old data
+        self._file.seek(0, 2)
+        if location < self._file.tell():
+            self._file.seek(location)
+            self._file.write(self._zeros)
+
+        self.wlba_table[block] = sector
+        return location
+
+    def _release(self, block: int) -> None:
+        self.wlba_table[block] = 0
+
+    def _stored_blocks(self) -> list[int]:
+        return [block for block, sector in enumerate(self.wlba_table) if sector]
+
+    def _write_metadata(self) -> None:
+        hd_sector_size = 1 << self.hd_sector_shift
+        wbfs_sector_size = 1 << self.wbfs_sector_shift
+        sector_count = max(self.wlba_table) + 1
+
+        header = bytearray(hd_sector_size)
+        _HEADER.pack_into(header, 0, WBFS_MAGIC, sector_count << (self.wbfs_sector_shift - self.hd_sector_shift),
+                          self.hd_sector_shift, self.wbfs_sector_shift, 0, 0)
+        header[DISC_TABLE_OFFSET + self.disc_slot] = 1
+
+        position = self._position
+        self.seek(0)
+        disc_header = self.read(DISC_HEADER_COPY_SIZE)
+        self._position = position
+
+        blocks = len(self.wlba_table)
+        disc_info = bytearray(align(DISC_HEADER_COPY_SIZE + blocks * 2, hd_sector_size))
+        disc_info[:len(disc_header)] = disc_header
+        struct.pack_into(f">{blocks}H", disc_info, DISC_HEADER_COPY_SIZE, *self.wlba_table)
+
+        # Bit n of the big-endian words is set when sector n + 1 is free
+        used = set(self.wlba_table)
+        bitmap_bytes = sector_count // 8
+        words = [0] * (align(bitmap_bytes, hd_sector_size) // 4)
+        for sector in range(1, min(sector_count, bitmap_bytes * 8 + 1)):
+            if sector not in used:
+                words[(sector - 1) // 32] |= 1 << ((sector - 1) % 32)
+
+        self._file.seek(0)
+        self._file.write(header)
+        self._file.seek(_disc_info_offset(self.hd_sector_shift, self.wbfs_sector_shift, self.disc_slot))
+        self._file.write(disc_info)
+        if words:
+            bitmap_lba = (wbfs_sector_size - bitmap_bytes) >> self.hd_sector_shift
+            self._file.seek(bitmap_lba << self.hd_sector_shift)
+            self._file.write(struct.pack(f">{len(words)}I", *words))
+
+        # The partition size is given in the header, the file must match it
+        self._resize_container(sector_count * wbfs_sector_size)
+
+    def __repr__(self) -> str:
+        return f"WbfsStream(slot: {self.disc_slot}, blocks: {len(self._stored_blocks())}/{len(self.wlba_table)})"
+
+
+def _blocks_per_disc(wbfs_sector_shift: int) -> int:
+    return WII_SECTORS_PER_DISC >> (wbfs_sector_shift - WII_SECTOR_SHIFT)
+
+
+def _disc_info_offset(hd_sector_shift: int, wbfs_sector_shift: int, disc_slot: int) -> int:
+    hd_sector_size = 1 << hd_sector_shift
+    disc_info_size = align(DISC_HEADER_COPY_SIZE + _blocks_per_disc(wbfs_sector_shift) * 2, hd_sector_size)
+    return hd_sector_size + disc_slot * disc_info_size
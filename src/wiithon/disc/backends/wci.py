@@ -0,0 +1,435 @@
+"""
+WCI container: compressed Wii image storing partition data decrypted
+
+Encrypted data does not compress, so like WIA, the partition data is stored decrypted and without its hash headers.
+The encryption and the H0/H1/H2 hashes are regenerated with `encrypt_group` when the image is read.
+
+The image is cut in regions covering it end to end: partition data regions and raw regions (everything else).
+Each region is cut in chunks of one group (2MB of image), compressed independently:
+- a raw chunk stores the image bytes
+- a partition chunk stores the 0x1F0000 bytes of user data of the group. A group that `encrypt_group` does not give
+  back exactly (non-standard hash headers...) is stored encrypted instead, and a group of zeros is not stored
+
+Layout (little-endian): header, region table, chunk table, chunk data
+
+`WciStream.open_plain_partition` gives `WiiIsoReader` the decrypted partition data without any AES
+"""
+import bz2
+import io
+import lzma
+import struct
+import tempfile
+import zlib
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO
+
+from wiithon.crypto.blocks import decrypt_group, encrypt_group
+from wiithon.crypto.layout import BLOCK_DATA_SIZE, BLOCK_HEADER_SIZE, BLOCK_PER_GROUP, BLOCK_SIZE, GROUP_SIZE
+from wiithon.crypto.part_reader import CryptPartReader
+from wiithon.disc.layout import DISABLE_CRYPTO_OFFSET
+from wiithon.disc.structs.partition_entry import read_parts
+from wiithon.disc.structs.partition_header import WiiPartitionHeader
+from wiithon.exceptions import CorruptedDataError, InvalidDiscError
+
+WCI_MAGIC: bytes = b"WCI\x00"
+WCI_VERSION: int = 1
+
+# Compression method: (id, compress, decompress)
+COMPRESSIONS: dict[str, tuple[int, Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    "none": (0, bytes, bytes),
+    "bz2": (1, bz2.compress, bz2.decompress),
+    "lzma": (2, lzma.compress, lzma.decompress),
+}
+
+REGION_RAW: int = 0
+REGION_PARTITION: int = 1
+
+CHUNK_ZERO: int = 0
+CHUNK_DATA: int = 1
+CHUNK_ENCRYPTED: int = 2
+
+_HEADER = struct.Struct("<4sIIQII")
+_REGION = struct.Struct("<QQI16sI")
+_CHUNK = struct.Struct("<QII")
+
+
+class WciRegion:
+    """
+    Attributes:
+        offset      : Offset of the region in the image
+        size        : Size of the region in the image
+        kind        : REGION_RAW or REGION_PARTITION
+        title_key   : 16-byte decrypted title key of a partition region
+        first_chunk : Index of the first chunk of the region
+    """
+    def __init__(self, offset: int, size: int, kind: int, title_key: bytes = bytes(16), first_chunk: int = 0) -> None:
+        self.offset = offset
+        self.size = size
+        self.kind = kind
+        self.title_key = title_key
+        self.first_chunk = first_chunk
+
+    @property
+    def chunk_count(self) -> int:
+        return -(-self.size // GROUP_SIZE)
+
+    def __repr__(self) -> str:
+        kind = "partition" if self.kind == REGION_PARTITION else "raw"
+        return f"WciRegion({kind}, offset: {self.offset:#x}, size: {self.size:#x})"
+
+
+def _plain_to_group(plain: bytes) -> bytearray:
+    """Lay 0x1F0000 bytes of user data out as a group, with blank hash headers"""
+    group = bytearray(GROUP_SIZE)
+    for i in range(BLOCK_PER_GROUP):
+        start = i * BLOCK_SIZE + BLOCK_HEADER_SIZE
+        group[start:start + BLOCK_DATA_SIZE] = plain[i * BLOCK_DATA_SIZE:(i + 1) * BLOCK_DATA_SIZE]
+    return group
+
+
+def _encode_chunk(data: bytes, region: WciRegion, compress: Callable[[bytes], bytes]) -> tuple[int, bytes]:
+    """Return the kind and the stored bytes of a chunk"""
+    if data.count(0) == len(data):
+        return CHUNK_ZERO, b""
+
+    if region.kind == REGION_PARTITION and len(data) == GROUP_SIZE:
+        plain = bytes(decrypt_group(data, region.title_key))
+        if encrypt_group(_plain_to_group(plain), region.title_key) == data:
+            return CHUNK_DATA, compress(plain)
+        return CHUNK_ENCRYPTED, compress(data)
+
+    return CHUNK_DATA, compress(data)
+
+
+def _image_regions(source: BinaryIO, image_size: int) -> list[WciRegion]:
+    """Cut an image in partition data regions and raw regions"""
+    # Development images store their partition data in plaintext already
+    source.seek(DISABLE_CRYPTO_OFFSET)
+    encrypted = source.read(1) in (b"", b"\x00")
+
+    partitions: list[WciRegion] = []
+    for entry in read_parts(source) if encrypted else []:
+        source.seek(entry.offset)
+        header = WiiPartitionHeader.read(source)
+        start = entry.offset + header.data_offset
+        # Whole groups only, a group cut by the end of the image stays raw
+        size = min(-(-header.data_size // GROUP_SIZE), (image_size - start) // GROUP_SIZE) * GROUP_SIZE
+        if size > 0:
+            partitions.append(WciRegion(start, size, REGION_PARTITION, header.ticket.title_key))
+
+    regions: list[WciRegion] = []
+    position = 0
+    for partition in sorted(partitions, key=lambda r: r.offset):
+        if partition.offset > position:
+            regions.append(WciRegion(position, partition.offset - position, REGION_RAW))
+        regions.append(partition)
+        position = partition.offset + partition.size
+    if image_size > position:
+        regions.append(WciRegion(position, image_size - position, REGION_RAW))
+
+    first_chunk = 0
+    for region in regions:
+        region.first_chunk = first_chunk
+        first_chunk += region.chunk_count
+    return regions
+
+
+def write_wci(source: BinaryIO, dest: BinaryIO, compression: str = "lzma", *, workers: int = 4) -> None:
+    """
+    Store a disc image as WCI
+
+    :param source: Plain image stream (like ISO, or a stream from `open_disc`)
+    :param dest: Output file
+    :param compression: "lzma", "bz2" or "none"
+    :param workers: Chunks decrypted, checked and compressed in parallel. lzma, bz2, AES and SHA-1 release the GIL
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression {compression}, expected one of {', '.join(COMPRESSIONS)}")
+    method, compress, _ = COMPRESSIONS[compression]
+
+    image_size = source.seek(0, io.SEEK_END)
+    regions = _image_regions(source, image_size)
+    chunk_count = sum(region.chunk_count for region in regions)
+
+    dest.seek(0)
+    dest.write(_HEADER.pack(WCI_MAGIC, WCI_VERSION, method, image_size, len(regions), chunk_count))
+    for region in regions:
+        dest.write(_REGION.pack(region.offset, region.size, region.kind, region.title_key, region.first_chunk))
+    table_offset = dest.tell()
+    data_offset = table_offset + chunk_count * _CHUNK.size
+    dest.seek(data_offset)
+
+    chunks: list[tuple[int, int, int]] = []
+
+    def store(future: Future[tuple[int, bytes]]) -> None:
+        kind, stored = future.result()
+        chunks.append((dest.tell(), len(stored), kind))
+        dest.write(stored)
+
+    with ThreadPoolExecutor(workers, thread_name_prefix="wiithon-wci") as pool:
+        pending: deque[Future[tuple[int, bytes]]] = deque()
+        for region in regions:
+            for i in range(region.chunk_count):
+                source.seek(region.offset + i * GROUP_SIZE)
+                data = source.read(min(GROUP_SIZE, region.size - i * GROUP_SIZE))
+                pending.append(pool.submit(_encode_chunk, data, region, compress))
+                if len(pending) > 2 * workers:
+                    store(pending.popleft())
+        while pending:
+            store(pending.popleft())
+
+    end = dest.tell()
+    dest.seek(table_offset)
+    dest.write(b"".join(_CHUNK.pack(*chunk) for chunk in chunks))
+    dest.truncate(end)
+
+
+class WciStream(io.RawIOBase):
+    """Read-only stream of the image stored in a WCI file"""
+    def __init__(self, file: BinaryIO, image_size: int, regions: list[WciRegion],
+                 chunks: list[tuple[int, int, int]], decompress: Callable[[bytes], bytes],
+                 cached_chunks: int = 8) -> None:
+        """
+        Prefer `WciStream.open`
+
+        :param file: WCI file, owned by the stream from now on
+        :param image_size: Size of the image
+        :param regions: Regions of the image, in order
+        :param chunks: (offset in the file, stored size, kind) of every chunk
+        :param decompress: Decompression function of the chunks
+        :param cached_chunks: Number of decompressed chunks kept
+        """
+        super().__init__()
+        self.regions = regions
+        self.cached_chunks = cached_chunks
+        self._file = file
+        self._size = image_size
+        self._chunks = chunks
+        self._decompress = decompress
+        self._position: int = 0
+        self._region_offsets = [region.offset for region in regions]
+        # (chunk index, decrypted) -> bytes
+        self._cache: OrderedDict[tuple[int, bool], bytes] = OrderedDict()
+
+    @classmethod
+    def open(cls, file: BinaryIO, *, writable: bool = False) -> "WciStream":
+        """
+        Open a WCI file
+
+        :param file: WCI file
+        :param writable: WCI images cannot be modified, must be False
+        """
+        if writable:
+            raise ValueError("WCI images cannot be modified in place")
+
+        file.seek(0)
+        header = file.read(_HEADER.size)
+        if len(header) != _HEADER.size or header[:4] != WCI_MAGIC:
+            raise InvalidDiscError(f"Not a WCI file, magic word is {header[:4]!r}")
+
+        _, version, method, image_size, region_count, chunk_count = _HEADER.unpack(header)
+        if version != WCI_VERSION:
+            raise InvalidDiscError(f"Unsupported WCI version {version}")
+        decompress = next((d for m, _, d in COMPRESSIONS.values() if m == method), None)
+        if decompress is None:
+            raise InvalidDiscError(f"Unknown WCI compression method {method}")
+
+        tables = file.read(region_count * _REGION.size + chunk_count * _CHUNK.size)
+        if len(tables) != region_count * _REGION.size + chunk_count * _CHUNK.size:
+            raise InvalidDiscError("WCI tables are truncated")
+
+        regions = [WciRegion(*_REGION.unpack_from(tables, i * _REGION.size)) for i in range(region_count)]
+        chunks_start = region_count * _REGION.size
+        chunks = [_CHUNK.unpack_from(tables, chunks_start + i * _CHUNK.size) for i in range(chunk_count)]
+        return cls(file, image_size, regions, chunks, decompress)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self._size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}")
+        self._position = position
+        return position
+
+    def open_plain_partition(self, data_offset: int) -> CryptPartReader | None:
+        """
+        Reader of the decrypted data of a partition, served from the stored plaintext
+
+        :param data_offset: Absolute offset of the partition data in the image
+        :return: The reader, None if the partition data is not stored decrypted
+        """
+        index = bisect_right(self._region_offsets, data_offset) - 1
+        if index < 0 or self.regions[index].offset != data_offset or self.regions[index].kind != REGION_PARTITION:
+            return None
+        return WciPartReader(self, self.regions[index])
+
+    def _stored(self, chunk: int) -> bytes:
+        offset, size, _ = self._chunks[chunk]
+        self._file.seek(offset)
+        stored = self._file.read(size)
+        try:
+            return self._decompress(stored)
+        except (lzma.LZMAError, OSError, ValueError, zlib.error) as e:
+            raise CorruptedDataError(f"WCI chunk {chunk} cannot be decompressed: {e}") from e
+
+    def _chunk(self, region: WciRegion, index: int, *, decrypted: bool) -> bytes:
+        """
+        Content of a chunk of a region
+
+        :param region: Region of the chunk
+        :param index: Index of the chunk in the region
+        :param decrypted: For a partition region, the user data of the group instead of the encrypted group
+        """
+        chunk = region.first_chunk + index
+        key = (chunk, decrypted)
+        data = self._cache.get(key)
+        if data is not None:
+            self._cache.move_to_end(key)
+            return data
+
+        size = min(GROUP_SIZE, region.size - index * GROUP_SIZE)
+        kind = self._chunks[chunk][2]
+        data = bytes(size) if kind == CHUNK_ZERO else self._stored(chunk)
+
+        if region.kind == REGION_PARTITION:
+            if kind == CHUNK_DATA and not decrypted:
+                data = encrypt_group(_plain_to_group(data), region.title_key)
+            elif kind != CHUNK_DATA and decrypted:
+                data = bytes(decrypt_group(data, region.title_key))
+
+        self._cache[key] = data
+        if len(self._cache) > self.cached_chunks:
+            self._cache.popitem(last=False)
+        return data
+
+    def readinto(self, buffer: bytearray | memoryview) -> int:
+        view = memoryview(buffer).cast("B")
+        size = min(len(view), max(0, self._size - self._position))
+
+        done = 0
+        while done < size:
+            region = self.regions[bisect_right(self._region_offsets, self._position) - 1]
+            index, offset = divmod(self._position - region.offset, GROUP_SIZE)
+            chunk = min(size - done, GROUP_SIZE - offset, region.offset + region.size - self._position)
+
+            view[done:done + chunk] = self._chunk(region, index, decrypted=False)[offset:offset + chunk]
+            done += chunk
+            self._position += chunk
+
+        return done
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            super().close()
+        finally:
+            self._file.close()
+
+
+class WciPartReader(CryptPartReader):
+    """`CryptPartReader` reading the decrypted user data stored in a WCI file, without any AES"""
+    def __init__(self, image: WciStream, region: WciRegion) -> None:
+        super().__init__(image, region.offset, region.title_key)
+        self.image = image
+        self.region = region
+
+    def _ensure_group(self, group_index: int) -> None:
+        if group_index == self._cached_group_index:
+            return
+
+        # Groups past the declared data size were stored as raw image data
+        if group_index >= self.region.chunk_count:
+            super()._ensure_group(group_index)
+            return
+
+        self._cached_data = self.image._chunk(self.region, group_index, decrypted=True)  # noqa: SLF001
+        self._cached_group_index = group_index
+
+
+class WciWriter(io.RawIOBase):
+    """
+    Writable stream producing a WCI file
+
+    The image is written uncompressed to a temporary file next to the output, and converted by `write_wci` when
+    the writer is closed. Chunks cannot be compressed as they are written: which of them hold partition data, and
+    the title key decrypting them, are only known from the partition table and headers, which the builder writes
+    last. Writing a WCI image takes as much temporary space as the image, and a second pass over it
+    """
+    def __init__(self, file: BinaryIO, compression: str = "lzma") -> None:
+        """
+        :param file: Empty seekable file, owned by the writer from now on. The chunk table is written after the
+            chunks
+        :param compression: "lzma", "bz2" or "none"
+        """
+        super().__init__()
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression {compression}, expected one of {', '.join(COMPRESSIONS)}")
+        if not file.seekable():
+            raise ValueError("WCI images can only be written to a seekable file")
+        self.compression = compression
+        self._file = file
+        name = getattr(file, "name", None)
+        self._image = tempfile.TemporaryFile(dir=Path(name).parent if isinstance(name, str) else None)  # noqa: SIM115
+
+    @classmethod
+    def create(cls, file: BinaryIO) -> "WciWriter":
+        return cls(file)
+
+    def readable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._image.tell()
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._image.seek(offset, whence)
+
+    def readinto(self, buffer: bytearray | memoryview) -> int:
+        return self._image.readinto(buffer)
+
+    def write(self, data: bytes | bytearray | memoryview) -> int:
+        return self._image.write(data)
+
+    def truncate(self, size: int | None = None) -> int:
+        return self._image.truncate(size)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            write_wci(self._image, self._file, self.compression)
+        finally:
+            self._image.close()
+            self._file.close()
+            super().close()
@@ -0,0 +1,456 @@
+"""
+Parallel extraction of the files of a disc image
+
+Files are extracted in the physical order of their data: each partition reads the groups holding file data once,
+in order, and a thread pool decrypts them (AES releases the GIL). The decrypted groups are cut into the files they
+hold, and a second thread pool writes them. The data read but not written yet is bounded, so memory stays flat
+whatever the size of the files. Partitions are extracted in parallel, each one reading through its own handle.
+
+An incremental extraction records the extracted files in a manifest of the output directory. A later extraction
+into it keeps the files whose offset, length and group digest did not change (see `wiithon.disc.group_digests`),
+as long as the extracted file still holds the recorded content: only the changed files are read and written
+
+A deep extraction unpacks the files that are containers or archives (see `wiithon.formats.archive`) as they are
+extracted: their data is gathered in memory and a process pool decompresses them and writes the files of the
+archives, recursively, without writing the packed files
+"""
+import hashlib
+import json
+import threading
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from wiithon.crypto.layout import GROUP_DATA_SIZE
+from wiithon.crypto.part_reader import CryptPartReader
+from wiithon.disc.group_digests import group_digest, read_h3_table
+from wiithon.disc.reader import WiiIsoReader
+from wiithon.disc.structs.partition_entry import WiiPartitionEntry
+from wiithon.exceptions import InvalidFormatError
+from wiithon.formats.archive import is_packed, unpack_to
+from wiithon.fst.node import FSTFile
+from wiithon.fst.operations import file_nodes
+
+DEFAULT_PENDING_BYTES: int = 64 * 1024 * 1024
+EXTRACT_MANIFEST_NAME: str = ".wiithon-extract.json"
+EXTRACT_MANIFEST_VERSION: int = 1
+EMPTY_SHA1: str = hashlib.sha1().hexdigest()
+
+
+class ByteBudget:
+    """Bytes that may be held at once. A single request larger than the budget is let through alone"""
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.used = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, size: int) -> None:
+        with self._condition:
+            while self.used and self.used + size > self.limit:
+                self._condition.wait()
+            self.used += size
+
+    def release(self, size: int) -> None:
+        with self._condition:
+            self.used -= size
+            self._condition.notify_all()
+
+
+class _OutputFile:
+    """
+    A file being extracted. Its parts may be written by any thread, in any order.
+    It is only open from its first write to its last, so queued small files do not hold file handles
+    """
+    def __init__(self, path: Path, length: int) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.file: BinaryIO | None = None
+        self.remaining = length
+        self.lock = threading.Lock()
+        if length == 0:
+            path.write_bytes(b"")
+
+    def write(self, position: int, data: bytes | memoryview) -> None:
+        with self.lock:
+            if self.file is None:
+                self.file = self.path.open("wb")
+            self.file.seek(position)
+            self.file.write(data)
+            self.remaining -= len(data)
+            if self.remaining == 0:
+                self.close()
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def _read_stored_group(stream: BinaryIO, crypto: CryptPartReader, group: int) -> bytes:
+    stored_size = crypto.stored_group_size
+    stream.seek(crypto.data_offset + group * stored_size)
+    data = stream.read(stored_size)
+    # The last group may be cut by the end of the image
+    return data + bytes(stored_size - len(data))
+
+
+class ExtractedFile:
+    """
+    One file of an extraction manifest
+
+    Attributes:
+        offset   : Offset of the file in the user data of its partition
+        length   : Size of the file
+        sha1     : SHA-1 of its content
+        groups   : Digest of the H3 hashes of the groups it spans, None if the partition has no usable hashes
+        mtime_ns : Modification time of the extracted file
+    """
+    def __init__(self, offset: int, length: int, sha1: str, groups: bytes | None, mtime_ns: int = 0) -> None:
+        self.offset = offset
+        self.length = length
+        self.sha1 = sha1
+        self.groups = groups
+        self.mtime_ns = mtime_ns
+
+    def to_dict(self) -> dict:
+        return {"offset": self.offset, "length": self.length, "sha1": self.sha1,
+                "groups": self.groups.hex() if self.groups is not None else None, "mtime_ns": self.mtime_ns}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ExtractedFile":
+        groups = data["groups"]
+        return cls(data["offset"], data["length"], data["sha1"],
+                   bytes.fromhex(groups) if groups is not None else None, data["mtime_ns"])
+
+
+class ExtractionManifest:
+    """
+    Files extracted into a directory, saved in it as JSON
+
+    Attributes:
+        disc_id : Game ID of the extracted disc
+        files   : Extracted files, by path relative to the directory (`<partition type>/<path>`)
+    """
+    def __init__(self, disc_id: str) -> None:
+        self.disc_id = disc_id
+        self.files: dict[str, ExtractedFile] = {}
+
+    @staticmethod
+    def path_for(dest: str | Path) -> Path:
+        return Path(dest) / EXTRACT_MANIFEST_NAME
+
+    @classmethod
+    def load(cls, dest: str | Path) -> "ExtractionManifest | None":
+        """Manifest of an output directory, None if it has none"""
+        path = cls.path_for(dest)
+        if not path.is_file():
+            return None
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if data.get("version") != EXTRACT_MANIFEST_VERSION:
+                raise InvalidFormatError(f"Unsupported extraction manifest version: {data.get('version')}")
+            obj = cls(data["disc_id"])
+            obj.files = {name: ExtractedFile.from_dict(f) for name, f in data["files"].items()}
+        except (json.JSONDecodeError, KeyError, ValueError) as e:
+            raise InvalidFormatError(f"Invalid extraction manifest {path}: {e}") from e
+        return obj
+
+    def save(self, dest: str | Path) -> None:
+        path = self.path_for(dest)
+        tmp = path.with_name(path.name + ".tmp")
+        data = {"version": EXTRACT_MANIFEST_VERSION, "disc_id": self.disc_id,
+                "files": {name: f.to_dict() for name, f in sorted(self.files.items())}}
+        tmp.write_text(json.dumps(data), encoding="utf-8")
+        tmp.replace(path)
+
+
+class ExtractionResult:
+    """
+    Attributes:
+        extracted : Files written, by partition type
+        skipped   : Files already up to date in the output directory
+        removed   : Files of a previous extraction no longer on the disc, removed
+        unpacked  : Containers and archives unpacked by a deep extraction, counted in `extracted`
+        unpacked_files : Files written by unpacking them
+    """
+    def __init__(self) -> None:
+        self.extracted: dict[str, int] = {}
+        self.skipped = 0
+        self.removed = 0
+        self.unpacked = 0
+        self.unpacked_files = 0
+
+
+def _file_sha1(path: Path) -> str:
+    digest = hashlib.sha1()
+    with path.open("rb") as f:
+        while chunk := f.read(GROUP_DATA_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _PartitionExtraction:
+    """Extraction of the files of one partition, through its own reader"""
+    def __init__(self, reader: WiiIsoReader, entry: WiiPartitionEntry, dest: Path, label: str,
+                 decoders: ThreadPoolExecutor, writers: ThreadPoolExecutor, budget: ByteBudget,
+                 progress_cb: Callable[[int], None] | None,
+                 previous: dict[str, ExtractedFile] | None = None, *, quick_check: bool = True,
+                 unpackers: Executor | None = None) -> None:
+        """
+        :param dest: Output directory of the disc, files are written to `dest/label/<path>`
+        :param label: Name of the partition in the output directory
+        :param previous: Files of the previous extraction into `dest`. Without it, every file is extracted
+        :param quick_check: Trust an extracted file with the size and modification time recorded in `previous`,
+            instead of digesting it
+        :param unpackers: Pool unpacking the containers and archives, which are written as they are without it
+        """
+        self.reader = reader
+        self.partition = reader.open_partition(entry)
+        self.dest = dest
+        self.label = label
+        self.decoders = decoders
+        self.writers = writers
+        self.budget = budget
+        self.progress_cb = progress_cb
+        self.previous = previous
+        self.quick_check = quick_check
+        self.unpackers = unpackers
+        self.files = sorted(file_nodes(self.partition.fst.entries), key=lambda file: file[1].offset)
+        self.records: dict[str, ExtractedFile] = {}
+        self.skipped = 0
+        self.unpacked = 0
+        self.unpacked_files = 0
+        self._writes: deque[Future[None]] = deque()
+        self._unpacks: deque[Future[int]] = deque()
+
+    def _write(self, output: _OutputFile, position: int, data: memoryview) -> None:
+        try:
+            output.write(position, data)
+        finally:
+            self.budget.release(len(data))
+        if self.progress_cb:
+            self.progress_cb(len(data))
+
+    def _submit_write(self, output: _OutputFile, position: int, data: memoryview) -> None:
+        self.budget.acquire(len(data))
+        self._writes.append(self.writers.submit(self._write, output, position, data))
+        while self._writes and self._writes[0].done():
+            self._writes.popleft().result()
+
+    def _submit_unpack(self, path: str, data: bytes, limit: int) -> None:
+        """Unpack a file in the pool. Its data is held until then, so at most `limit` files are queued"""
+        self._unpacks.append(self.unpackers.submit(unpack_to, data, self.dest / self.label / path))
+        self.unpacked += 1
+        while self._unpacks and (len(self._unpacks) > limit or self._unpacks[0].done()):
+            self.unpacked_files += self._unpacks.popleft().result()
+
+    def _is_packed(self, node: FSTFile, data: memoryview, start: int) -> bool:
+        """Whether a file is a container or an archive, from the data of the group where it starts"""
+        head = data[node.offset - start:node.offset - start + 4]
+        if len(head) < min(4, node.length):
+            # Its magic word runs into the next group
+            head = self.partition.crypto.read_at(node.offset, 4)
+        return is_packed(bytes(head))
+
+    def _up_to_date(self, name: str, node: FSTFile, groups: bytes | None) -> bool:
+        """Whether the extracted file holds the content of the file, and can be kept. Refreshes its record"""
+        old = self.previous.get(name) if self.previous is not None else None
+        if old is None or groups is None or (old.offset, old.length, old.groups) != (node.offset, node.length, groups):
+            return False
+        try:
+            stat = (self.dest / name).stat()
+        except OSError:
+            return False
+        if stat.st_size != old.length:
+            return False
+        if not (self.quick_check and stat.st_mtime_ns == old.mtime_ns) and _file_sha1(self.dest / name) != old.sha1:
+            return False
+        self.records[name] = ExtractedFile(old.offset, old.length, old.sha1, groups, stat.st_mtime_ns)
+        return True
+
+    def run(self, queue_size: int) -> int:
+        """
+        :param queue_size: Groups being decoded at once
+        :return: Number of files extracted
+        """
+        crypto = self.partition.crypto
+        h3_table = read_h3_table(self.reader, self.partition) if self.previous is not None else None
+
+        todo: list[tuple[str, FSTFile, bytes | None]] = []
+        for path, node in self.files:
+            groups = group_digest(h3_table, node.offset, node.length) if h3_table is not None else None
+            if self._up_to_date(f"{self.label}/{path}", node, groups):
+                self.skipped += 1
+                if self.progress_cb:
+                    self.progress_cb(node.length)
+            else:
+                todo.append((path, node, groups))
+
+        groups_read = sorted({
+            group for _, node, _ in todo if node.length
+            for group in range(node.offset // GROUP_DATA_SIZE, (node.offset + node.length - 1) // GROUP_DATA_SIZE + 1)
+        })
+
+        files = deque(todo)
+        active: list[tuple[str, FSTFile, bytes | None, _OutputFile, Any, bytearray | None]] = []
+        pending: deque[tuple[int, Future[bytes]]] = deque()
+
+        def start_file(path: str, node: FSTFile, groups: bytes | None, data: memoryview, start: int) -> None:
+            output = _OutputFile(self.dest / self.label / path, node.length)
+            if node.length:
+                # A file to unpack is gathered instead of being written
+                packed = bytearray() if self.unpackers is not None and self._is_packed(node, data, start) else None
+                active.append((path, node, groups, output, hashlib.sha1(), packed))
+            else:
+                self.records[f"{self.label}/{path}"] = ExtractedFile(node.offset, 0, EMPTY_SHA1, groups)
+
+        def cut_next() -> None:
+            group, future = pending.popleft()
+            data = memoryview(future.result())
+            start, end = group * GROUP_DATA_SIZE, (group + 1) * GROUP_DATA_SIZE
+            while files and files[0][1].offset < end:
+                start_file(*files.popleft(), data, start)
+            for file in list(active):
+                path, node, groups, output, digest, packed = file
+                first, last = max(node.offset, start), min(node.offset + node.length, end)
+                part = data[first - start:last - start]
+                if packed is not None:
+                    packed += part
+                    if self.progress_cb:
+                        self.progress_cb(len(part))
+                    if node.offset + node.length <= end:
+                        active.remove(file)
+                        self._submit_unpack(path, bytes(packed), queue_size)
+                    continue
+                # Groups are cut in order, so the parts of a file are digested in order
+                digest.update(part)
+                self._submit_write(output, first - node.offset, part)
+                if node.offset + node.length <= end:
+                    active.remove(file)
+                    self.records[f"{self.label}/{path}"] = ExtractedFile(node.offset, node.length, digest.hexdigest(),
+                                                                         groups)
+
+        try:
+            for group in groups_read:
+                raw = _read_stored_group(self.reader.file, crypto, group)
+                self.budget.acquire(GROUP_DATA_SIZE)
+                future = self.decoders.submit(crypto.decode_group, raw)
+                future.add_done_callback(lambda _: self.budget.release(GROUP_DATA_SIZE))
+                pending.append((group, future))
+                if len(pending) >= queue_size:
+                    cut_next()
+            while pending:
+                cut_next()
+            # Empty files placed after the last group holding data
+            while files:
+                start_file(*files.popleft(), memoryview(b""), 0)
+            while self._writes:
+                self._writes.popleft().result()
+            while self._unpacks:
+                self.unpacked_files += self._unpacks.popleft().result()
+        finally:
+            for future in (*self._writes, *self._unpacks):
+                future.cancel()
+            for file in active:
+                file[3].close()
+
+        for path, _, _ in todo:
+            name = f"{self.label}/{path}"
+            if name in self.records:
+                self.records[name].mtime_ns = (self.dest / name).stat().st_mtime_ns
+        return len(todo)
+
+
+def extract_disc(path: str | Path, dest: str | Path, entries: list[WiiPartitionEntry] | None = None,
+                 progress_cb: Callable[[int], None] | None = None,
+                 *, jobs: int = 4, max_pending_bytes: int = DEFAULT_PENDING_BYTES,
+                 incremental: bool = False, quick_check: bool = True, deep: bool = False) -> ExtractionResult:
+    """
+    Extract the files of partitions of an image, to `dest/<partition type>/<path>`
+
+    :param path: Image, in any container
+    :param dest: Output directory
+    :param entries: Partitions to extract, matched by offset. All of them if None
+    :param progress_cb: Called with the size of each part of a file written, from any thread
+    :param jobs: Threads decrypting groups, and threads writing files
+    :param max_pending_bytes: Bytes read from the image but not written yet, across every partition
+    :param incremental: Keep the files already extracted from the same data, as recorded by the manifest of the
+        output directory, and record the extracted files in it. Files of the extracted partitions that are no
+        longer on the disc are removed
+    :param quick_check: With `incremental`, trust the extracted files with their recorded size and modification
+        time. Otherwise, or if they changed, the extracted files are digested
+    :param deep: Unpack the containers and archives in a pool of `jobs` processes, recursively: a compressed file
+        is written decompressed, and an archive `<path>` as the directory `<path>.d` holding its files
+    """
+    if deep and incremental:
+        raise ValueError("A deep extraction cannot be incremental")
+
+    dest = Path(dest)
+    with WiiIsoReader(str(path)) as reader:
+        offsets = [entry.offset for entry in (reader.partitions if entries is None else entries)]
+        disc_id = reader.disc_header.game_id.decode("ascii", "replace").strip("\x00")
+    budget = ByteBudget(max_pending_bytes)
+
+    manifest = ExtractionManifest(disc_id)
+    previous = ExtractionManifest.load(dest) if incremental else None
+    # Nothing is kept from another disc
+    files = previous.files if previous is not None and previous.disc_id == disc_id else {}
+
+    def extract_partition(offset: int) -> _PartitionExtraction:
+        # Each partition reads through its own handle on the image
+        with WiiIsoReader(str(path)) as reader:
+            entry = next(entry for entry in reader.partitions if entry.offset == offset)
+            extraction = _PartitionExtraction(
+                reader, entry, dest, entry.get_readable_part_type(), decoders, writers, budget, progress_cb,
+                files if incremental else None, quick_check=quick_check, unpackers=unpackers,
+            )
+            extraction.run(2 * jobs)
+            return extraction
+
+    result = ExtractionResult()
+    # Decompressing is pure Python: processes, so it runs in parallel
+    unpackers = ProcessPoolExecutor(jobs) if deep else None
+    try:
+        with ThreadPoolExecutor(jobs, thread_name_prefix="wiithon-decrypt") as decoders, \
+                ThreadPoolExecutor(jobs, thread_name_prefix="wiithon-write") as writers, \
+                ThreadPoolExecutor(max(1, len(offsets)), thread_name_prefix="wiithon-extract") as partitions:
+            for extraction in partitions.map(extract_partition, offsets):
+                extracted = len(extraction.files) - extraction.skipped
+                result.extracted[extraction.label] = result.extracted.get(extraction.label, 0) + extracted
+                result.skipped += extraction.skipped
+                result.unpacked += extraction.unpacked
+                result.unpacked_files += extraction.unpacked_files
+                manifest.files.update(extraction.records)
+    finally:
+        if unpackers is not None:
+            unpackers.shutdown(cancel_futures=True)
+
+    if not incremental:
+        return result
+
+    if previous is not None:
+        for name, record in previous.files.items():
+            if name in manifest.files:
+                continue
+            if name.split("/", 1)[0] not in result.extracted:
+                # Partition not extracted this time: its files stay as they are
+                if previous.disc_id == disc_id:
+                    manifest.files[name] = record
+                continue
+            (dest / name).unlink(missing_ok=True)
+            result.removed += 1
+    manifest.save(dest)
+    return result
+
+
+def extracted_size(path: str | Path, entries: list[WiiPartitionEntry] | None = None) -> int:
+    """Total size of the files `extract_disc` writes, for progress reporting"""
+    with WiiIsoReader(str(path)) as reader:
+        wanted = {entry.offset for entry in (reader.partitions if entries is None else entries)}
+        return sum(
+            node.length
+            for entry in reader.partitions if entry.offset in wanted
+            for _, node in file_nodes(reader.open_partition(entry).fst.entries)
+        )
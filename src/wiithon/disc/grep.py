@@ -0,0 +1,192 @@
+"""
+Search of a byte pattern in the files of a disc image
+
+The files of each partition are cut into batches, in the physical order of their data, and a process pool searches
+them: each worker decrypts the files of its batches through its own handle on the image, so only the matches cross
+process boundaries. A literal pattern is searched one group at a time, a regular expression in whole files.
+A deep search looks into the Yaz0/LZ77/RARC/U8 files (see `wiithon.formats.archive`) instead of their bytes
+"""
+import re
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+
+from wiithon.crypto.layout import GROUP_DATA_SIZE
+from wiithon.disc.partition import WiiPartitionInfo
+from wiithon.disc.reader import WiiIsoReader
+from wiithon.disc.structs.partition_entry import WiiPartitionEntry
+from wiithon.formats.archive import is_packed, open_packed
+from wiithon.fst.node import FSTFile
+from wiithon.fst.operations import file_nodes
+
+BATCH_SIZE: int = 32 * 1024 * 1024
+
+# Images and partitions opened by a worker process, by (image, partition offset)
+_worker_partitions: dict[tuple[str, int], tuple[WiiIsoReader, WiiPartitionInfo]] = {}
+
+
+class GrepMatch:
+    """
+    Attributes:
+        partition : Type of the partition holding the file
+        path      : Path of the file in its partition
+        member    : Path of the file inside the packed file with a deep search (`layout/banner.szs/icon.bin`),
+                    None for the file itself
+        offset    : Offset of the match in the file, or in its decompressed content with a deep search
+        data      : Bytes matched
+    """
+    def __init__(self, partition: str, path: str, member: str | None, offset: int, data: bytes) -> None:
+        self.partition = partition
+        self.path = path
+        self.member = member
+        self.offset = offset
+        self.data = data
+
+    def to_dict(self) -> dict:
+        return {"partition": self.partition, "path": self.path, "member": self.member, "offset": self.offset,
+                "data": self.data.hex()}
+
+
+def compile_pattern(pattern: str | bytes, *, regex: bool = False, ignore_case: bool = False) -> re.Pattern[bytes]:
+    """
+    :param pattern: Bytes to find. A str is encoded as UTF-8
+    :param regex: Whether the pattern is a regular expression, rather than literal bytes
+    :param ignore_case: Match ASCII letters of any case
+    """
+    if isinstance(pattern, str):
+        pattern = pattern.encode("utf-8")
+    return re.compile(pattern if regex else re.escape(pattern), re.IGNORECASE if ignore_case else 0)
+
+
+def _literal_length(pattern: re.Pattern[bytes]) -> int | None:
+    """Length of every match of a literal pattern, None for a regular expression"""
+    literal = re.sub(rb"\\(.)", rb"\1", pattern.pattern, flags=re.DOTALL)
+    return len(literal) if re.escape(literal) == pattern.pattern else None
+
+
+def _search(pattern: re.Pattern[bytes], data: bytes, partition: str, path: str,
+            member: str | None, base: int = 0) -> list[GrepMatch]:
+    return [GrepMatch(partition, path, member, base + m.start(), m.group()) for m in pattern.finditer(data)]
+
+
+def _search_packed(pattern: re.Pattern[bytes], data: bytes, partition: str, path: str,
+                   prefix: str = "") -> list[GrepMatch]:
+    """Search the decompressed content of a packed file, or the files of the archive it is, recursively"""
+    content, members = open_packed(data)
+    if members is None:
+        return _search(pattern, content, partition, path, prefix.rstrip("/") or None)
+
+    matches = []
+    for member, member_data in members:
+        if is_packed(member_data):
+            matches.extend(_search_packed(pattern, member_data, partition, path, f"{prefix}{member}/"))
+        else:
+            matches.extend(_search(pattern, member_data, partition, path, f"{prefix}{member}"))
+    return matches
+
+
+def _grep_file(partition: WiiPartitionInfo, label: str, path: str, offset: int, length: int,
+               pattern: re.Pattern[bytes], *, deep: bool) -> list[GrepMatch]:
+    read = partition.crypto.read_at
+    if deep and length >= 4 and is_packed(read(offset, 4)):
+        return _search_packed(pattern, read(offset, length), label, path)
+
+    window = _literal_length(pattern)
+    if not window:
+        return _search(pattern, read(offset, length), label, path, None)
+
+    # One group at a time: the end of the previous one is kept, for the matches across both
+    matches = []
+    tail = b""
+    position, end = offset, offset + length
+    while position < end:
+        size = min(end, (position // GROUP_DATA_SIZE + 1) * GROUP_DATA_SIZE) - position
+        data = tail + read(position, size)
+        matches.extend(_search(pattern, data, label, path, None, position - offset - len(tail)))
+        tail = data[-(window - 1):] if window > 1 else b""
+        position += size
+    return matches
+
+
+def _grep_batch(image: str, partition_offset: int, label: str, files: list[tuple[str, int, int]],
+                pattern: re.Pattern[bytes], *, deep: bool) -> list[GrepMatch]:
+    """Search files of a partition, in a worker process. Its partitions stay open for the next batches"""
+    opened = _worker_partitions.get((image, partition_offset))
+    if opened is None:
+        reader = WiiIsoReader(image)
+        entry = next(entry for entry in reader.partitions if entry.offset == partition_offset)
+        opened = _worker_partitions[(image, partition_offset)] = (reader, reader.open_partition(entry))
+    partition = opened[1]
+
+    matches = []
+    for path, offset, length in files:
+        matches.extend(_grep_file(partition, label, path, offset, length, pattern, deep=deep))
+    return matches
+
+
+def _batches(files: list[tuple[str, FSTFile]], batch_size: int) -> Iterator[list[tuple[str, int, int]]]:
+    """Files cut in batches of about `batch_size` bytes, in the physical order of their data"""
+    batch, size = [], 0
+    for path, node in sorted(files, key=lambda file: file[1].offset):
+        batch.append((path, node.offset, node.length))
+        size += node.length
+        if size >= batch_size:
+            yield batch
+            batch, size = [], 0
+    if batch:
+        yield batch
+
+
+def grep_disc(path: str | Path, pattern: re.Pattern[bytes], entries: list[WiiPartitionEntry] | None = None,
+              progress_cb: Callable[[int], None] | None = None,
+              *, deep: bool = False, jobs: int = 4, batch_size: int = BATCH_SIZE) -> Iterator[GrepMatch]:
+    """
+    Search a pattern in the files of partitions of an image
+
+    :param path: Image, in any container
+    :param pattern: Pattern to find, see `compile_pattern`
+    :param entries: Partitions to search, matched by offset. All of them if None
+    :param progress_cb: Called with the size of each batch of files searched
+    :param deep: Search the decompressed content of the Yaz0/LZ77 files, and the files of the RARC/U8 archives,
+        recursively, instead of their bytes
+    :param jobs: Worker processes. The search runs in this process with 1
+    :param batch_size: Bytes of files searched by a worker at once
+    :return: Matches, in the order of the files on the disc
+    """
+    image = str(Path(path).resolve())
+    tasks: list[tuple[int, str, list[tuple[str, int, int]], int]] = []
+    with WiiIsoReader(image) as reader:
+        wanted = {entry.offset for entry in (reader.partitions if entries is None else entries)}
+        for entry in reader.partitions:
+            if entry.offset not in wanted:
+                continue
+            files = list(file_nodes(reader.open_partition(entry).fst.entries))
+            label = entry.get_readable_part_type()
+            tasks.extend((entry.offset, label, batch, sum(length for _, _, length in batch))
+                         for batch in _batches(files, batch_size))
+
+    if jobs == 1:
+        try:
+            for offset, label, batch, size in tasks:
+                yield from _grep_batch(image, offset, label, batch, pattern, deep=deep)
+                if progress_cb:
+                    progress_cb(size)
+        finally:
+            for reader, _ in _worker_partitions.values():
+                reader.close()
+            _worker_partitions.clear()
+        return
+
+    with ProcessPoolExecutor(jobs) as pool:
+        futures: list[tuple[Future[list[GrepMatch]], int]] = [
+            (pool.submit(_grep_batch, image, offset, label, batch, pattern, deep=deep), size)
+            for offset, label, batch, size in tasks
+        ]
+        try:
+            for future, size in futures:
+                yield from future.result()
+                if progress_cb:
+                    progress_cb(size)
+        finally:
+            for future, _ in futures:
+                future.cancel()
@@ -0,0 +1,36 @@
+"""
+Digests of the content of a range of partition data, computed without reading it
+
+The H3 table of a partition holds one hash per group, covering every byte of the group. Two ranges at the same
+offset, with the same length, and spanning groups with the same H3 hashes have the same content
+"""
+import hashlib
+
+from wiithon.crypto.layout import GROUP_DATA_SIZE, SHA1_SIZE
+from wiithon.disc.layout import H3_TABLE_SIZE
+from wiithon.disc.partition import WiiPartitionInfo
+from wiithon.disc.reader import WiiIsoReader
+
+
+def read_h3_table(reader: WiiIsoReader, partition: WiiPartitionInfo) -> bytes | None:
+    """
+    H3 table of a partition, None if it says nothing of the content: without hashes, or with hashes the console
+    does not check
+    """
+    if not partition.crypto.hashed or reader.disc_header.disable_hash_verification:
+        return None
+    reader.file.seek(partition.partition_offset + partition.header.global_hash_table_offset)
+    return reader.file.read(H3_TABLE_SIZE)
+
+
+def group_digest(h3_table: bytes, offset: int, length: int) -> bytes:
+    """
+    SHA-1 of the H3 hashes of the groups spanned by a range of the partition data
+
+    :param h3_table: H3 table of the partition
+    :param offset: Offset of the range in the user data
+    :param length: Length of the range
+    """
+    first = offset // GROUP_DATA_SIZE
+    last = (offset + max(length, 1) - 1) // GROUP_DATA_SIZE
+    return hashlib.sha1(h3_table[first * SHA1_SIZE:(last + 1) * SHA1_SIZE]).digest()
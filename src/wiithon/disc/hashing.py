@@ -0,0 +1,297 @@
+"""
+Single-pass digests of a disc image, for dump verification against DAT files
+
+The image is read once, in large aligned chunks. Every chunk feeds the CRC32, MD5 and SHA-1 of the image, each one
+updated by its own thread: zlib and hashlib release the GIL, so the three digests are computed in parallel.
+The groups of partition data found in the chunks are decoded (decrypted) by a thread pool, and feed the digests
+of the decrypted content of their partition and of the files they hold
+"""
+import hashlib
+import queue
+import threading
+import zlib
+from collections import deque
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Protocol
+
+from wiithon.crypto.layout import GROUP_DATA_SIZE, GROUP_SIZE
+from wiithon.crypto.part_reader import CryptPartReader
+from wiithon.disc.reader import WiiIsoReader
+from wiithon.fst.node import FSTFile
+from wiithon.fst.operations import file_nodes
+
+ALGORITHMS: tuple[str, ...] = ("crc32", "md5", "sha1")
+DEFAULT_CHUNK_SIZE: int = 4 * GROUP_SIZE
+
+
+class Digest(Protocol):
+    def update(self, data: bytes | bytearray | memoryview, /) -> None: ...
+
+    def hexdigest(self) -> str: ...
+
+
+class Crc32:
+    """CRC32 with the interface of a hashlib object"""
+    name: str = "crc32"
+
+    def __init__(self) -> None:
+        self._value: int = 0
+
+    def update(self, data: bytes | bytearray | memoryview) -> None:
+        self._value = zlib.crc32(data, self._value)
+
+    def hexdigest(self) -> str:
+        return f"{self._value:08x}"
+
+
+class MultiDigest:
+    """CRC32, MD5 and SHA-1 of one stream, updated together"""
+    def __init__(self) -> None:
+        self._digests: list[Digest] = [Crc32() if name == "crc32" else hashlib.new(name) for name in ALGORITHMS]
+
+    def update(self, data: bytes | bytearray | memoryview) -> None:
+        for digest in self._digests:
+            digest.update(data)
+
+    def hexdigests(self) -> dict[str, str]:
+        return {name: digest.hexdigest() for name, digest in zip(ALGORITHMS, self._digests, strict=True)}
+
+
+class ThreadedMultiDigest(MultiDigest):
+    """`MultiDigest` updating each digest in its own thread. The data given to `update` must not change afterwards"""
+    def __init__(self, queue_size: int = 4) -> None:
+        """
+        :param queue_size: Buffers a digest thread may lag behind
+        """
+        super().__init__()
+        self._queues: list[queue.Queue[bytes | None]] = [queue.Queue(queue_size) for _ in self._digests]
+        self._threads = [
+            threading.Thread(target=self._run, args=(digest, q), name=f"wiithon-{name}", daemon=True)
+            for name, digest, q in zip(ALGORITHMS, self._digests, self._queues, strict=True)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @staticmethod
+    def _run(digest: Digest, buffers: "queue.Queue[bytes | None]") -> None:
+        while (data := buffers.get()) is not None:
+            digest.update(data)
+
+    def update(self, data: bytes | bytearray | memoryview) -> None:
+        for buffers in self._queues:
+            buffers.put(data)
+
+    def close(self) -> None:
+        """Wait for the threads to digest everything given so far, and stop them"""
+        if not self._threads:
+            return
+        for buffers in self._queues:
+            buffers.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def hexdigests(self) -> dict[str, str]:
+        self.close()
+        return super().hexdigests()
+
+
+class PartitionDigests:
+    """
+    Digests of the decrypted content of a partition
+
+    Attributes:
+        partition_type : Readable partition type
+        offset         : Absolute offset of the partition
+        digests        : Digests of the partition data, `data_size` bytes as given by the partition header
+        files          : Digests of each file, by path
+    """
+    def __init__(self, partition_type: str, offset: int) -> None:
+        self.partition_type = partition_type
+        self.offset = offset
+        self.digests: dict[str, str] = {}
+        self.files: dict[str, dict[str, str]] = {}
+
+    def to_dict(self) -> dict:
+        return {"partition": self.partition_type, "offset": self.offset, **self.digests, "files": self.files}
+
+
+class DiscDigests:
+    """
+    Attributes:
+        image      : Digests of the whole image (of the plain ISO, whatever the container)
+        partitions : Digests of each partition, in partition table order. Empty if not asked for
+    """
+    def __init__(self) -> None:
+        self.image: dict[str, str] = {}
+        self.partitions: list[PartitionDigests] = []
+
+    def to_dict(self) -> dict:
+        return {**self.image, "partitions": [partition.to_dict() for partition in self.partitions]}
+
+
+class _PartitionSweep:
+    """Gathers the groups of a partition from the chunks of the image, and digests them once decoded"""
+    def __init__(self, result: PartitionDigests, crypto: CryptPartReader, data_size: int, group_limit: int,
+                 files: list[tuple[str, FSTFile]]) -> None:
+        """
+        :param result: Filled when the sweep is over
+        :param crypto: Reader of the partition, decodes its groups
+        :param data_size: Bytes of decrypted data digested for the partition
+        :param group_limit: Number of groups the image holds for the partition
+        :param files: Files whose digests are computed
+        """
+        self.result = result
+        self.crypto = crypto
+        self.data_size = data_size
+        self.group_size = crypto.stored_group_size
+        self.start = crypto.data_offset
+        self.group_count = min(-(-data_size // GROUP_DATA_SIZE), group_limit)
+        self.end = self.start + self.group_count * self.group_size
+        self.digest = ThreadedMultiDigest()
+
+        self._pending = bytearray()
+        self._next_group = 0
+        self._files = sorted(
+            ((node.offset, node.offset + node.length, path) for path, node in files), key=lambda f: f[0]
+        )
+        self._next_file = 0
+        self._open_files: dict[str, tuple[int, int, MultiDigest]] = {}
+
+    def gather(self, position: int, chunk: bytes) -> Iterator[tuple[int, bytes]]:
+        """
+        Take the part of a chunk of the image inside the partition data
+
+        :param position: Offset of the chunk in the image
+        :param chunk: Data of the image
+        :return: The (group index, stored group) completed by the chunk
+        """
+        start = max(position, self.start + self._next_group * self.group_size + len(self._pending))
+        end = min(position + len(chunk), self.end)
+        while start < end:
+            take = min(end - start, self.group_size - len(self._pending))
+            self._pending += chunk[start - position:start - position + take]
+            start += take
+            if len(self._pending) == self.group_size:
+                yield self._next_group, bytes(self._pending)
+                self._pending.clear()
+                self._next_group += 1
+
+    def finish_gathering(self) -> Iterator[tuple[int, bytes]]:
+        """The last group, cut by the end of the image, reads as zeros past it"""
+        if self._pending and self._next_group < self.group_count:
+            self._pending += bytes(self.group_size - len(self._pending))
+            yield self._next_group, bytes(self._pending)
+            self._pending.clear()
+
+    def digest_group(self, group: int, data: bytes) -> None:
+        """
+        Feed a decoded group to the partition and to its files. Groups must come in order
+
+        :param group: Group index
+        :param data: User data of the group
+        """
+        group_start = group * GROUP_DATA_SIZE
+        group_end = group_start + len(data)
+        self.digest.update(data[:max(0, self.data_size - group_start)])
+
+        while self._next_file < len(self._files) and self._files[self._next_file][0] < group_end:
+            offset, end, path = self._files[self._next_file]
+            self._open_files[path] = (offset, end, MultiDigest())
+            self._next_file += 1
+
+        view = memoryview(data)
+        for path, (offset, end, digest) in list(self._open_files.items()):
+            digest.update(view[max(offset, group_start) - group_start:min(end, group_end) - group_start])
+            if end <= group_end:
+                self.result.files[path] = digest.hexdigests()
+                del self._open_files[path]
+
+    def finish(self) -> None:
+        # Files cut by the end of the partition data only get the part the image holds
+        while self._next_file < len(self._files):
+            offset, end, path = self._files[self._next_file]
+            self._open_files[path] = (offset, end, MultiDigest())
+            self._next_file += 1
+        for path, (_, _, digest) in self._open_files.items():
+            self.result.files[path] = digest.hexdigests()
+        self._open_files.clear()
+        self.result.digests = self.digest.hexdigests()
+
+
+def hash_disc(path: str | Path, progress_cb: Callable[[int], None] | None = None,
+              *, partitions: bool = True, files: bool = True,
+              chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 4) -> DiscDigests:
+    """
+    Compute the CRC32, MD5 and SHA-1 of an image, of each partition and of each file, reading the image once
+
+    :param path: Image, in any container
+    :param progress_cb: Called with the percentage of the image read
+    :param partitions: Also digest the decrypted content of each partition
+    :param files: Also digest each file of the partitions
+    :param chunk_size: Size of the reads, a multiple of the group size
+    :param workers: Threads decoding the groups of partition data
+    """
+    if chunk_size <= 0 or chunk_size % GROUP_SIZE:
+        raise ValueError(f"Chunk size must be a multiple of {GROUP_SIZE:#x}, got {chunk_size:#x}")
+
+    result = DiscDigests()
+    with WiiIsoReader(str(path)) as reader:
+        image = reader.file
+        image_size = image.seek(0, 2)
+
+        sweeps: list[_PartitionSweep] = []
+        if partitions:
+            starts = sorted(entry.offset for entry in reader.partitions) + [image_size]
+            for entry in reader.partitions:
+                info = reader.open_partition(entry)
+                limit = min(start for start in starts if start > entry.offset)
+                crypto = info.crypto
+                partition_digests = PartitionDigests(entry.get_readable_part_type(), entry.offset)
+                result.partitions.append(partition_digests)
+                sweeps.append(_PartitionSweep(
+                    partition_digests, crypto, info.header.data_size,
+                    max(0, -(-(limit - crypto.data_offset) // crypto.stored_group_size)),
+                    list(file_nodes(info.fst.entries)) if files else [],
+                ))
+
+        image_digest = ThreadedMultiDigest()
+        pending: deque[tuple[_PartitionSweep, int, Future[bytes]]] = deque()
+
+        def digest_next() -> None:
+            sweep, group, future = pending.popleft()
+            sweep.digest_group(group, future.result())
+
+        with ThreadPoolExecutor(workers, thread_name_prefix="wiithon-hash") as pool:
+            try:
+                image.seek(0)
+                position = 0
+                while chunk := image.read(chunk_size):
+                    image_digest.update(chunk)
+                    for sweep in sweeps:
+                        for group, raw_group in sweep.gather(position, chunk):
+                            pending.append((sweep, group, pool.submit(sweep.crypto.decode_group, raw_group)))
+                            if len(pending) > 2 * workers:
+                                digest_next()
+
+                    position += len(chunk)
+                    if progress_cb and image_size:
+                        progress_cb(int(position / image_size * 100))
+
+                for sweep in sweeps:
+                    for group, raw_group in sweep.finish_gathering():
+                        pending.append((sweep, group, pool.submit(sweep.crypto.decode_group, raw_group)))
+                while pending:
+                    digest_next()
+            finally:
+                for sweep in sweeps:
+                    sweep.digest.close()
+                image_digest.close()
+
+        for sweep in sweeps:
+            sweep.finish()
+        result.image = image_digest.hexdigests()
+
+    return result
@@ -7,6 +7,8 @@ REGION_OFFSET:            int = 0x4E000
 REGION_SIZE:              int = 0x20
 MAGIC_WORD_OFFSET:        int = 0x18
 WII_MAGIC_WORD:           int = 0x5D1C9EA3
+DISABLE_HASHES_OFFSET:    int = 0x60
+DISABLE_CRYPTO_OFFSET:    int = 0x61
 FIRST_PARTITION_OFFSET:   int = 0x50000
 
 SYSTEM_MAGIC_WORD:        int = 0xC3F81A8E
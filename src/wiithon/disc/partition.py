@@ -1,6 +1,7 @@
-from collections.abc import Callable
+from collections.abc import Callable, Iterator
 from io import BytesIO
 
+from wiithon.crypto.layout import GROUP_DATA_SIZE
 from wiithon.crypto.part_reader import CryptPartReader
 from wiithon.disc.layout import APPLOADER_HEADER_SIZE, APPLOADER_OFFSET, BI2_OFFSET, BI2_SIZE
 from wiithon.disc.structs.apploader_header import ApploaderHeader
@@ -28,7 +29,7 @@ class WiiPartitionInfo:
         self.crypto = crypto
         self.partition_offset = partition_offset
 
-    def read_file(self, path: str) -> bytes:
+    def _file_node(self, path: str) -> FSTFile:
         node = self.fst.find_node(path)
 
         if node is None:
@@ -37,20 +38,43 @@ class WiiPartitionInfo:
         if not isinstance(node, FSTFile):
             raise FstIsADirectoryError(f"Path is a directory: {path}")
 
-        return self.crypto.read_at(node.offset, node.length)
+        return node
 
+    def read_file(self, path: str) -> bytes:
+        node = self._file_node(path)
+        return self.crypto.read_at(node.offset, node.length)
 
-    def read_apploader(self) -> bytes:
-        apploader_offset = APPLOADER_OFFSET
-        header_data = self.crypto.read_at(apploader_offset, APPLOADER_HEADER_SIZE)
+    def iter_file(self, path: str, offset: int = 0, length: int | None = None) -> Iterator[bytes]:
+        """
+        Read a file, or a range of it, one group of the partition data at a time. Only the groups of the range
+        are decrypted, as they are consumed
+
+        :param path: Path of the file
+        :param offset: Start of the range in the file
+        :param length: Length of the range, up to the end of the file if None. Cut at the end of the file
+        """
+        if offset < 0 or (length is not None and length < 0):
+            raise ValueError(f"Invalid range: offset {offset}, length {length}")
+
+        node = self._file_node(path)
+        position = node.offset + min(offset, node.length)
+        end = node.offset + node.length if length is None else min(node.offset + node.length, position + length)
+        while position < end:
+            size = min(end, (position // GROUP_DATA_SIZE + 1) * GROUP_DATA_SIZE) - position
+            yield self.crypto.read_at(position, size)
+            position += size
+
+
+    def apploader_size(self) -> int:
+        header_data = self.crypto.read_at(APPLOADER_OFFSET, APPLOADER_HEADER_SIZE)
         apploader_header = ApploaderHeader.read(BytesIO(header_data))
-        total_size = APPLOADER_HEADER_SIZE + apploader_header.size1 + apploader_header.size2
+        return APPLOADER_HEADER_SIZE + apploader_header.size1 + apploader_header.size2
 
-        return self.crypto.read_at(apploader_offset, total_size)
+    def read_apploader(self) -> bytes:
+        return self.crypto.read_at(APPLOADER_OFFSET, self.apploader_size())
 
-    def read_dol(self) -> DOL:
-        dol_offset = self.internal_header.DOL_offset
-        header_data = self.crypto.read_at(dol_offset, DOL_HEADER_SIZE)
+    def dol_size(self) -> int:
+        header_data = self.crypto.read_at(self.internal_header.DOL_offset, DOL_HEADER_SIZE)
         header = DOLHeader.read(BytesIO(header_data))
 
         dol_size = DOL_HEADER_SIZE
@@ -60,7 +84,10 @@ class WiiPartitionInfo:
         for i in range(DOL_DATA_SECTIONS):
             dol_size = max(dol_size, header.data_offset[i] + header.data_length[i])
 
-        dol_data = self.crypto.read_at(dol_offset, dol_size)
+        return dol_size
+
+    def read_dol(self) -> DOL:
+        dol_data = self.crypto.read_at(self.internal_header.DOL_offset, self.dol_size())
         return DOL.read(BytesIO(dol_data))
 
     def read_bi2(self) -> bytes:
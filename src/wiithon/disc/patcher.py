@@ -1,13 +1,23 @@
+import copy
+import hashlib
+import json
 from collections.abc import Callable, Iterator
-from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
 from io import BytesIO
 from pathlib import Path
 from typing import Concatenate, ParamSpec, TypeVar
 
 from wiithon.builder.copy_source import CopyPartitionSource
 from wiithon.builder.disc_builder import WiiDiscBuilder
+from wiithon.builder.journal import BuildJournal
+from wiithon.builder.manifest import BuildManifest, IncrementalBuild
+from wiithon.crypto.group_cache import EncryptedGroupCache, SharedGroupCache
+from wiithon.crypto.part_reader import CryptPartReader, SharedCryptPartReader
+from wiithon.disc.backends.registry import create_disc, open_disc
 from wiithon.disc.enums import WiiPartType
 from wiithon.disc.reader import WiiIsoReader
+from wiithon.disc.structs.partition_entry import WiiPartitionEntry
 from wiithon.exceptions import NoDataPartitionError
 from wiithon.formats.archive import Archive, Container, flush_archive_cache, resolve_read, resolve_write
 from wiithon.formats.bnr import BNR
@@ -34,6 +44,9 @@ class WiiIsoPatcher:
 
         self.cached_archive: tuple[str, Archive, list[Container]] | None = None
 
+        # name -> (output path, overrides)
+        self.variants: dict[str, tuple[str, dict[str, bytes | None]]] = {}
+
     def __enter__(self) -> "WiiIsoPatcher":
         self.reader = WiiIsoReader(self.src_path)
         try:
@@ -126,29 +139,207 @@ class WiiIsoPatcher:
         self.reader.disc_header.game_id = b
         self.data_partition.header.ticket.title_id = b'\x00\x01\x00\x00' + b[:4]
 
-    def build(self, output_path: str, progress_cb: Callable | None = None) -> None:
+    def build(self, output_path: str, progress_cb: Callable | None = None,
+              *, encrypted_cache: EncryptedGroupCache | None = None,
+              write_manifest: bool = False, incremental_from: str | None = None,
+              resumable: bool = False, encrypted: bool = True, hashed: bool = True) -> None:
+        """
+        Build the patched image
+
+        :param output_path: Path of the new image
+        :param progress_cb: Called with the progress percentage of the current partition
+        :param encrypted_cache: Optional cache of encrypted groups
+        :param write_manifest: Save the build manifest next to the output (`<output>.manifest.json`)
+        :param incremental_from: A previous output built with a manifest. Its unchanged groups are copied
+                                 instead of encrypted again. If it is output_path, the image is updated in place
+        :param resumable: Keep a journal next to the output (`<output>.journal`) while building. If an interrupted
+                          build left one, the build resumes from it instead of starting over.
+                          The journal is deleted once the build completes
+        :param encrypted: Encrypt the partition data. False builds a development image for Dolphin,
+                          flagged in its disc header, which skips AES when built and read
+        :param hashed: Fill the hash headers of the partition data, only possible without encryption.
+                       False also skips hashing, the partition data is written linearly
+        """
         flush_archive_cache(self)
-        builder = WiiDiscBuilder(self.reader.disc_header, self.reader.region)
-
         output_path = Path(output_path)
-        with output_path.open("w+b") as dest:
+
+        with ExitStack() as stack:
+            incremental = None
+            updating = False
+            if incremental_from is not None:
+                previous_path = Path(incremental_from)
+                manifest_path = BuildManifest.path_for(previous_path)
+                manifest = BuildManifest.load(manifest_path)
+                if output_path.exists() and previous_path.samefile(output_path):
+                    # The old manifest no longer describes the image once the build starts
+                    manifest_path.unlink()
+                    updating = True
+                    incremental = IncrementalBuild(manifest)
+                else:
+                    incremental = IncrementalBuild(manifest, stack.enter_context(open_disc(previous_path)))
+
+            journal = None
+            if resumable:
+                journal_path = BuildJournal.path_for(output_path)
+                if output_path.exists() and journal_path.exists():
+                    updating = True
+                else:
+                    journal_path.unlink(missing_ok=True)
+                fingerprint = self._build_fingerprint(encrypted=encrypted, hashed=hashed)
+                journal = stack.enter_context(BuildJournal(journal_path, fingerprint=fingerprint))
+
+            builder = WiiDiscBuilder(self.reader.disc_header, self.reader.region,
+                                     encrypted_cache=encrypted_cache, incremental=incremental,
+                                     record_manifest=write_manifest, journal=journal,
+                                     encrypted=encrypted, hashed=hashed)
+
+            dest = open_disc(output_path, writable=True) if updating else create_disc(output_path)
+            stack.enter_context(dest)
+            if journal is not None and updating and (incremental is None or not incremental.in_place):
+                # Drop what the interrupted run wrote after its last committed group
+                dest.truncate(journal.committed_size())
             for entry in self.reader.partitions:
-                is_data = entry.part_type == WiiPartType.DATA
-                copy_builder = CopyPartitionSource(
-                    self.reader,
-                    entry,
-                    fst_modifier=self._build_fst_modifier() if is_data else None,
-                    dol_modifiers=self.dol_modifiers if is_data else None,
-                    file_overrides=self.file_replacements if is_data else None,
-                )
-                builder.add_partition(dest, copy_builder, progress_cb)
+                builder.add_partition(dest, self._copy_source(entry), progress_cb)
 
             builder.finish(dest)
+            if updating:
+                dest.truncate(builder.current_data_offset)
+
+        if journal is not None:
+            journal.discard()
+
+        if builder.manifest is not None:
+            builder.manifest.save(BuildManifest.path_for(output_path))
+
+    def add_variant(self, name: str, output_path: str, overrides: dict[str, bytes | None] | None = None) -> None:
+        """
+        Register a variant of the patched image, built by `build_variants`
+
+        :param name: Name of the variant, given to the progress callback
+        :param output_path: Path of the variant image
+        :param overrides: File data by path, applied over the patcher modifications.
+                          A path missing from the disc adds the file, None removes it
+        """
+        if name in self.variants:
+            raise ValueError(f"Variant {name} already exists")
+
+        overrides = {path.strip("/"): data for path, data in (overrides or {}).items()}
+        self.variants[name] = (output_path, overrides)
+
+    def build_variants(self, progress_cb: Callable[[str, int], None] | None = None,
+                       *, encrypted_cache: EncryptedGroupCache | None = None,
+                       cached_groups: int = 64) -> None:
+        """
+        Build every variant registered with `add_variant` in a single pass over the source image
+
+        The variants are built side by side, each in its own thread. Every source group is read and decrypted once
+        for all of them, and an output group identical in several variants is hashed and encrypted once
+
+        :param progress_cb: Called with the variant name and the progress percentage of its current partition
+        :param encrypted_cache: Optional on-disk cache of encrypted groups, behind the shared in-memory one
+        :param cached_groups: Number of decrypted source groups and of encrypted groups kept in memory.
+                              Variants drifting further apart than that read or encrypt some groups again
+        """
+        if not self.variants:
+            raise ValueError("No variant to build, see add_variant")
 
-    def _build_fst_modifier(self) -> Callable[[FST], None] | None:
-        user_modification = self.fst_modifier
+        flush_archive_cache(self)
+
+        # Everything touching the source stream is read now: while the variants build, only the shared readers use it
+        shared_crypto: dict[int, SharedCryptPartReader] = {}
+        for entry in self.reader.partitions:
+            crypto = self.reader.open_partition(copy.copy(entry)).crypto
+            shared_crypto[entry.offset] = SharedCryptPartReader(
+                self.reader.file, crypto.data_offset, crypto.title_key, max_groups=cached_groups,
+                encrypted=crypto.encrypted, hashed=crypto.hashed
+            )
+
+        variant_sources = {
+            name: [self._copy_source(entry, overrides, shared_crypto[entry.offset]) for entry in self.reader.partitions]
+            for name, (_, overrides) in self.variants.items()
+        }
+        shared_cache = SharedGroupCache(cached_groups, backing=encrypted_cache)
+
+        def build_variant(name: str) -> None:
+            variant_cb = (lambda percent: progress_cb(name, percent)) if progress_cb else None
+            builder = WiiDiscBuilder(self.reader.disc_header, self.reader.region, encrypted_cache=shared_cache)
+            with create_disc(self.variants[name][0]) as dest:
+                for source in variant_sources[name]:
+                    builder.add_partition(dest, source, variant_cb)
+                builder.finish(dest)
+
+        with ThreadPoolExecutor(max_workers=len(self.variants), thread_name_prefix="wiithon-variant") as pool:
+            futures = [pool.submit(build_variant, name) for name in self.variants]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                # Wake up the variants waiting on a group the failed one will never encrypt
+                shared_cache.close()
+                raise
+
+    def _build_fingerprint(self, *, encrypted: bool, hashed: bool) -> str:
+        """
+        Digest of the inputs of a build, recorded in its journal: an interrupted build only resumes with the same
+        source image, modifications and options. FST and DOL modifiers are only counted, the layout check of the
+        resumed files covers what they change
+        """
+        source = Path(self.src_path).resolve()
+        stat = source.stat()
+        header = self.reader.disc_header
+        inputs = {
+            "source": [str(source), stat.st_size, stat.st_mtime_ns],
+            "disc": [header.game_id.hex(), header.game_title, self.data_partition.header.ticket.title_id.hex()],
+            "replaced": {path: [len(data), hashlib.sha256(data).hexdigest()]
+                         for path, data in self.file_replacements.items()},
+            "added": sorted(self.files_to_add),
+            "removed": self.files_to_remove,
+            "modifiers": [self.fst_modifier is not None, len(self.dol_modifiers)],
+            "encrypted": encrypted,
+            "hashed": hashed,
+        }
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+    def _copy_source(self, entry: WiiPartitionEntry, overrides: dict[str, bytes | None] | None = None,
+                     crypto: CryptPartReader | None = None) -> CopyPartitionSource:
+        """Source copying a partition of the image with the patcher modifications, plus the variant overrides"""
+        if entry.part_type != WiiPartType.DATA:
+            return CopyPartitionSource(self.reader, entry, crypto=crypto)
+
+        file_replacements = dict(self.file_replacements)
         files_to_add = dict(self.files_to_add)
         files_to_remove = list(self.files_to_remove)
+        for path, data in (overrides or {}).items():
+            if data is None:
+                file_replacements.pop(path, None)
+                if files_to_add.pop(path, None) is None:
+                    files_to_remove.append(path)
+                continue
+
+            file_replacements[path] = data
+            if path in files_to_remove:
+                files_to_remove.remove(path)
+            elif path in files_to_add or not self._is_file(path):
+                files_to_add[path] = data
+
+        return CopyPartitionSource(
+            self.reader,
+            entry,
+            fst_modifier=self._build_fst_modifier(files_to_add, files_to_remove),
+            dol_modifiers=self.dol_modifiers,
+            file_overrides=file_replacements,
+            crypto=crypto,
+        )
+
+    def _is_file(self, path: str) -> bool:
+        node = self.data_partition.fst.find_node(path)
+        return isinstance(node, FSTFile)
+
+    def _build_fst_modifier(self, files_to_add: dict[str, bytes] | None = None,
+                            files_to_remove: list[str] | None = None) -> Callable[[FST], None] | None:
+        user_modification = self.fst_modifier
+        files_to_add = dict(self.files_to_add if files_to_add is None else files_to_add)
+        files_to_remove = list(self.files_to_remove if files_to_remove is None else files_to_remove)
 
         if not user_modification and not files_to_add and not files_to_remove:
             return None
@@ -159,8 +350,8 @@ class WiiIsoPatcher:
             for path, data in files_to_add.items():
                 parts = path.split("/")
                 node = FSTFile(name=parts[-1], offset=0, length=len(data))
-                add_node(fst.entries, parts[:-1], node)
+                add_node(fst, parts[:-1], node)
             for path in files_to_remove:
-                remove_node(fst.entries, path.split("/"))
+                remove_node(fst, path.split("/"))
 
         return modifier
\ No newline at end of file
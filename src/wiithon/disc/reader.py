@@ -4,6 +4,7 @@ from typing import BinaryIO
 
 from wiithon.binary.reader import BinaryReader
 from wiithon.crypto.part_reader import CryptPartReader
+from wiithon.disc.backends.registry import open_disc
 from wiithon.disc.enums import WiiPartType
 from wiithon.disc.layout import DISC_HEADER_SIZE, MAGIC_WORD_OFFSET, REGION_OFFSET, REGION_SIZE, WII_MAGIC_WORD
 from wiithon.disc.partition import WiiPartitionInfo
@@ -19,7 +20,7 @@ from wiithon.fst.tree import FST
 class WiiIsoReader:
     def __init__(self, path: str) -> None:
         self._path = Path(path)
-        self.file: BinaryIO = self._path.open("rb") # noqa: SIM115
+        self.file: BinaryIO = open_disc(self._path)
         try:
             self.disc_header: DiscHeader = DiscHeader.read(self.file)
             self.partitions: list[WiiPartitionEntry] = read_parts(self.file)
@@ -50,7 +51,11 @@ class WiiIsoReader:
         return reader.u32()
 
 
-    def open_partition(self, entry: WiiPartitionEntry) -> WiiPartitionInfo:
+    def open_partition(self, entry: WiiPartitionEntry, *, lazy_fst: bool = False) -> WiiPartitionInfo:
+        """
+        :param entry: Partition to open
+        :param lazy_fst: Build the directories of the FST on first access, for callers that only look up a few files
+        """
         offset = entry.offset
 
         # Reading partition header
@@ -68,7 +73,13 @@ class WiiIsoReader:
         # Crypto header for decrypted data
         data_offset = offset + header.data_offset
         title_key = header.ticket.title_key
-        crypto = CryptPartReader(self.file, data_offset, title_key)
+        encrypted = not self.disc_header.disable_disc_encryption
+        hashed = encrypted or not self.disc_header.disable_hash_verification
+        # Some containers store the partition data decrypted already
+        open_plain = getattr(self.file, "open_plain_partition", None) if encrypted else None
+        crypto = open_plain(data_offset) if open_plain is not None else None
+        if crypto is None:
+            crypto = CryptPartReader(self.file, data_offset, title_key, encrypted=encrypted, hashed=hashed)
 
         # Disc Header
         boot_data = crypto.read_at(0, DISC_HEADER_SIZE)
@@ -76,7 +87,7 @@ class WiiIsoReader:
 
         # FST
         fst_data = crypto.read_at(internal_header.FST_offset, internal_header.FST_size)
-        dst = FST.read(BytesIO(fst_data), offset = 0)
+        dst = FST.from_bytes(fst_data, lazy=lazy_fst)
 
         return WiiPartitionInfo(
             header=header, tmd=tmd, certificates=certificates,
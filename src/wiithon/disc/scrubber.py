@@ -0,0 +1,57 @@
+"""
+Replace the unused parts of a disc image with zeros
+
+The junk of a partition is encrypted and does not compress at all. Once scrubbed, it compresses to almost nothing,
+and block-mapped containers (WBFS, CISO) do not even store it. See `wiithon.disc.usage` for what is kept
+"""
+from collections.abc import Callable
+from pathlib import Path
+
+from wiithon.disc.backends.registry import create_disc
+from wiithon.disc.reader import WiiIsoReader
+from wiithon.disc.usage import DiscUsage, disc_usage
+
+COPY_CHUNK_SIZE: int = 4 * 1024 * 1024
+
+
+def scrub_disc(source: str | Path, output: str | Path, progress_cb: Callable[[int], None] | None = None,
+               *, whole_groups: bool = False) -> DiscUsage:
+    """
+    Write a scrubbed copy of a disc image
+
+    :param source: Image to scrub, in any container
+    :param output: Scrubbed image. Its container is chosen by extension, see `create_disc`
+    :param progress_cb: Called with the percentage of the used bytes copied
+    :param whole_groups: Only zero groups without any used block, so every block of the groups kept verifies.
+                         Otherwise only the zeroed blocks fail verification
+    :return: The usage of the image
+    """
+    source, output = Path(source), Path(output)
+    if output.exists() and output.samefile(source):
+        raise ValueError("A disc cannot be scrubbed into itself")
+
+    with WiiIsoReader(str(source)) as reader:
+        usage = disc_usage(reader)
+        ranges = usage.used_ranges(whole_groups=whole_groups)
+        total = sum(end - start for start, end in ranges)
+        copied = 0
+
+        with create_disc(output) as dest:
+            for start, end in ranges:
+                reader.file.seek(start)
+                dest.seek(start)
+                position = start
+                while position < end:
+                    data = reader.file.read(min(COPY_CHUNK_SIZE, end - position))
+                    if not data:
+                        break
+                    dest.write(data)
+                    position += len(data)
+                    copied += len(data)
+                    if progress_cb and total:
+                        progress_cb(int(copied / total * 100))
+
+            # What is left past the last used range reads as zeros
+            dest.truncate(usage.image_size)
+
+    return usage
@@ -0,0 +1,167 @@
+"""
+Which parts of a disc image are actually used
+
+A partition only reads the blocks holding its system files (boot header, BI2, apploader, DOL, FST)
+and the data of the files of its FST. Everything else in the partition data is junk left by the mastering process.
+Outside the partitions, only the disc headers and the partition headers (ticket, TMD, certificates, H3 table) are used
+"""
+from collections.abc import Iterator
+
+from wiithon.crypto.layout import BLOCK_DATA_SIZE, BLOCK_PER_GROUP, BLOCK_SIZE
+from wiithon.disc.layout import APPLOADER_OFFSET, BI2_OFFSET, BI2_SIZE, DISC_HEADER_SIZE, FIRST_PARTITION_OFFSET
+from wiithon.disc.partition import WiiPartitionInfo
+from wiithon.disc.reader import WiiIsoReader
+from wiithon.fst.node import FSTDirectory, FSTFile, FSTNode
+
+
+class PartitionUsage:
+    """
+    Used blocks of the data of a partition
+
+    Attributes:
+        partition_offset : Absolute offset of the partition
+        data_offset      : Absolute offset of the partition data
+        hashed           : Whether the blocks have their hash headers. Without them, a block is 0x7C00 bytes
+        blocks           : One byte per block of user data (0x7C00 bytes), set when the block is used
+    """
+    def __init__(self, partition_offset: int, data_offset: int, *, hashed: bool = True) -> None:
+        self.partition_offset = partition_offset
+        self.data_offset = data_offset
+        self.hashed = hashed
+        self.blocks = bytearray()
+
+    def mark(self, offset: int, size: int) -> None:
+        """
+        Mark a range of the user data as used
+
+        :param offset: Offset in the user data of the partition
+        :param size: Size of the range
+        """
+        if size <= 0:
+            return
+
+        first = offset // BLOCK_DATA_SIZE
+        last = (offset + size - 1) // BLOCK_DATA_SIZE
+        if last >= len(self.blocks):
+            self.blocks.extend(bytes(last + 1 - len(self.blocks)))
+        self.blocks[first:last + 1] = b"\x01" * (last + 1 - first)
+
+    @property
+    def block_size(self) -> int:
+        """Size of a block in the image"""
+        return BLOCK_SIZE if self.hashed else BLOCK_DATA_SIZE
+
+    def used_blocks(self) -> int:
+        return self.blocks.count(1)
+
+    def used_groups(self) -> list[int]:
+        """Indexes of the groups with at least one used block"""
+        return [
+            group for group in range(-(-len(self.blocks) // BLOCK_PER_GROUP))
+            if 1 in self.blocks[group * BLOCK_PER_GROUP:(group + 1) * BLOCK_PER_GROUP]
+        ]
+
+    def image_ranges(self, *, whole_groups: bool = False) -> list[tuple[int, int]]:
+        """
+        Used ranges of the partition data in the image
+
+        :param whole_groups: Keep every block of a group with a used block, so every block of the group verifies
+        :return: Sorted (start, end) absolute offsets, merged
+        """
+        blocks = self.blocks
+        if whole_groups:
+            blocks = bytearray(len(blocks))
+            for group in self.used_groups():
+                blocks[group * BLOCK_PER_GROUP:(group + 1) * BLOCK_PER_GROUP] = b"\x01" * BLOCK_PER_GROUP
+
+        ranges: list[tuple[int, int]] = []
+        block = blocks.find(1)
+        while block != -1:
+            end = blocks.find(0, block)
+            end = len(blocks) if end == -1 else end
+            ranges.append((self.data_offset + block * self.block_size, self.data_offset + end * self.block_size))
+            block = blocks.find(1, end)
+        return ranges
+
+    def __repr__(self) -> str:
+        return f"PartitionUsage(offset: {self.partition_offset:#x}, blocks: {self.used_blocks()}/{len(self.blocks)})"
+
+
+class DiscUsage:
+    """
+    Used ranges of a whole disc image
+
+    Attributes:
+        image_size : Size of the image
+        partitions : Usage of each partition, in partition table order
+    """
+    def __init__(self, image_size: int, partitions: list[PartitionUsage]) -> None:
+        self.image_size = image_size
+        self.partitions = partitions
+
+    def used_ranges(self, *, whole_groups: bool = False) -> list[tuple[int, int]]:
+        """
+        Used ranges of the image: disc headers, partition headers and used partition data
+
+        :param whole_groups: Keep whole groups of partition data, see `PartitionUsage.image_ranges`
+        :return: Sorted (start, end) offsets, merged and clipped to the image
+        """
+        ranges = [(0, FIRST_PARTITION_OFFSET)]
+        for partition in self.partitions:
+            ranges.append((partition.partition_offset, partition.data_offset))
+            ranges.extend(partition.image_ranges(whole_groups=whole_groups))
+
+        merged: list[tuple[int, int]] = []
+        for start, end in sorted(ranges):
+            end = min(end, self.image_size)
+            if start >= end:
+                continue
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    def used_bytes(self, *, whole_groups: bool = False) -> int:
+        return sum(end - start for start, end in self.used_ranges(whole_groups=whole_groups))
+
+
+def _files(entries: list[FSTNode]) -> Iterator[FSTFile]:
+    for entry in entries:
+        if isinstance(entry, FSTDirectory):
+            yield from _files(entry.children)
+        elif isinstance(entry, FSTFile):
+            yield entry
+
+
+def partition_usage(partition: WiiPartitionInfo) -> PartitionUsage:
+    """
+    Compute the used blocks of a partition from its system files and its FST
+
+    :param partition: Opened partition
+    """
+    data_offset = partition.partition_offset + partition.header.data_offset
+    usage = PartitionUsage(partition.partition_offset, data_offset, hashed=partition.crypto.hashed)
+
+    header = partition.internal_header
+    usage.mark(0, DISC_HEADER_SIZE)
+    usage.mark(BI2_OFFSET, BI2_SIZE)
+    usage.mark(APPLOADER_OFFSET, partition.apploader_size())
+    usage.mark(header.DOL_offset, partition.dol_size())
+    usage.mark(header.FST_offset, header.FST_size)
+
+    for node in _files(partition.fst.entries):
+        usage.mark(node.offset, node.length)
+
+    return usage
+
+
+def disc_usage(reader: WiiIsoReader) -> DiscUsage:
+    """
+    Compute the used ranges of a disc image
+
+    :param reader: Opened image
+    """
+    image_size = reader.file.seek(0, 2)
+    partitions = [partition_usage(reader.open_partition(entry)) for entry in reader.partitions]
+    return DiscUsage(image_size, partitions)
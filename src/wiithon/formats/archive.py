@@ -1,10 +1,12 @@
 from __future__ import annotations
 
-from collections.abc import Callable
+import struct
+from collections.abc import Callable, Iterator
 from io import BytesIO
+from pathlib import Path
 from typing import TYPE_CHECKING, BinaryIO, Protocol, runtime_checkable
 
-from wiithon.exceptions import FstFileNotFoundError, InvalidFormatError
+from wiithon.exceptions import FstFileNotFoundError, InvalidFormatError, WiithonError
 from wiithon.formats.lz77 import Lz77
 from wiithon.formats.rarc import RARC_MAGIC_WORD, Rarc, RarcFileEntry
 from wiithon.formats.u8 import U8, U8_MAGIC_WORD
@@ -26,6 +28,9 @@ class Archive(Protocol):
     def get_bytes(self) -> bytes:
         pass
 
+    def iter_files(self) -> Iterator[tuple[str, bytes]]:
+        pass
+
 @runtime_checkable
 class Container(Protocol):
     data: bytes
@@ -50,6 +55,81 @@ _ARCHIVES: dict[bytes, type] = {
     U8_MAGIC_WORD: U8,
 }
 
+UNPACKED_SUFFIX: str = ".d"
+
+# What a damaged or mistaken container or archive raises while being read
+_UNPACK_ERRORS = (WiithonError, ValueError, IndexError, struct.error)
+
+
+def is_packed(head: bytes) -> bool:
+    """Whether data starting with `head` (at least its first 4 bytes) is a known container or archive"""
+    return head[:4] in _CONTAINERS or head[:4] in _ARCHIVES
+
+
+def _decompress(data: bytes) -> bytes:
+    while (container_cls := _CONTAINERS.get(data[:4])) is not None:
+        data = container_cls.read(BytesIO(data)).data
+    return data
+
+
+def open_packed(data: bytes) -> tuple[bytes, list[tuple[str, bytes]] | None]:
+    """
+    Decompress a file and read the archive it is, if it is one
+
+    :param data: Content of the file
+    :return: Decompressed content, and the path and data of each file of the archive, None if it is not an archive.
+        Data that cannot be read as its magic word tells is returned as it is
+    """
+    try:
+        content = _decompress(data)
+        archive_cls = _ARCHIVES.get(content[:4])
+        return content, list(archive_cls.read(BytesIO(content)).iter_files()) if archive_cls is not None else None
+    except _UNPACK_ERRORS:
+        return data, None
+
+
+def walk_members(data: bytes, prefix: str = "") -> Iterator[tuple[str, bytes]]:
+    """
+    Path and data of every file inside a packed file, recursively: the files of an archive inside an archive follow
+    it, under its path (`layout/banner.szs/icon.bin`)
+
+    :param data: Content of the file
+    :param prefix: Prepended to the paths
+    """
+    _, members = open_packed(data)
+    for member, member_data in members or ():
+        yield f"{prefix}{member}", member_data
+        if is_packed(member_data):
+            yield from walk_members(member_data, f"{prefix}{member}/")
+
+
+def unpack_to(data: bytes, path: str | Path) -> int:
+    """
+    Write a file with its containers decompressed. An archive is written as the directory `<path>.d` instead,
+    holding its files unpacked the same way, recursively. Everything is unpacked in memory: nothing is written
+    but the final files. Data that cannot be read as its magic word tells is written as it is
+
+    :param data: Content of the file
+    :param path: Where to write it
+    :return: Number of files written
+    """
+    path = Path(path)
+    content, members = open_packed(data)
+    if members is None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        return 1
+
+    directory = path.with_name(path.name + UNPACKED_SUFFIX)
+    directory.mkdir(parents=True, exist_ok=True)
+    written = 0
+    for member, member_data in members:
+        # Names come from the archive: never let them point out of its directory
+        if any(part in ("", ".", "..") for part in member.split("/")):
+            continue
+        written += unpack_to(member_data, directory / member)
+    return written
+
 
 def _split_path(fst: FST, path: str) -> tuple[str, list[str]]:
     parts = [p for p in path.split("/") if p]
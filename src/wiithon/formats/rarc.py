@@ -1,3 +1,4 @@
+from collections.abc import Iterator
 from enum import IntFlag
 from io import BytesIO
 from pathlib import Path
@@ -193,6 +194,21 @@ class Rarc:
         
         self._extract_node(self.nodes[0], output_dir)
 
+    def iter_files(self) -> Iterator[tuple[str, bytes]]:
+        """Path and data of each file of the archive, directories first walked in order"""
+        if self.nodes:
+            yield from self._iter_node(self.nodes[0], "")
+
+    def _iter_node(self, node: RarcNode, prefix: str) -> Iterator[tuple[str, bytes]]:
+        for entry in self.entries[node.first_entry_index:node.first_entry_index + node.entry_count]:
+            if entry.name in (".", ".."):
+                continue
+
+            if entry.file_id == 0xFFFF or entry.attributes & NodeAttribute.DIRECTORY:
+                yield from self._iter_node(self.nodes[entry.data_offset_or_idx], f"{prefix}{entry.name}/")
+            else:
+                yield f"{prefix}{entry.name}", entry.data
+
     def _extract_node(self, node: RarcNode, current_dir: str) -> None:
         target_dir = Path(current_dir)
 
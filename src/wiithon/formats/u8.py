@@ -1,4 +1,5 @@
 import struct
+from collections.abc import Iterator
 from io import BytesIO
 from pathlib import Path
 from typing import BinaryIO
@@ -192,6 +193,22 @@ class U8:
 
         self._extract(1, self.nodes[0].size, output_dir)
 
+    def iter_files(self) -> Iterator[tuple[str, bytes]]:
+        """Path and data of each file of the archive, in node order"""
+        if self.nodes:
+            yield from self._iter_files(1, self.nodes[0].size, "")
+
+    def _iter_files(self, start: int, end: int, prefix: str) -> Iterator[tuple[str, bytes]]:
+        i = start
+        while i < end:
+            node = self.nodes[i]
+            if node.is_dir:
+                yield from self._iter_files(i + 1, node.size, f"{prefix}{node.name}/")
+                i = node.size
+            else:
+                yield f"{prefix}{node.name}", node.data
+                i += 1
+
     def _extract(self, start: int, end: int, current_dir: str) -> None:
         target_dir = Path(current_dir)
         target_dir.mkdir(parents=True, exist_ok=True)
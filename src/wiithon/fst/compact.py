@@ -0,0 +1,304 @@
+"""
+FST held in parallel arrays rather than in one object per node
+
+The nodes keep their on-disc order, the root first: a directory is followed by its whole subtree and its length is
+the index after it, as in the node table. Each column is an `array('I')`, and the names stay in the string table,
+decoded when they are read. Nodes are reached through views (`CompactFile`, `CompactDirectory`) made on demand,
+which only hold the FST and an index: a large tree takes a few dozen bytes per node, and the node table is written
+back as one buffer
+"""
+import struct
+import sys
+from array import array
+from collections.abc import Iterator
+from typing import BinaryIO
+
+from wiithon.fst.node import FSTDirectory, FSTFile, FSTNode
+from wiithon.fst.path_index import split_path
+from wiithon.fst.raw_node import RawFSTNode
+from wiithon.fst.tree import FST, read_fst_bytes
+
+_DIRECTORY = 1 << 24
+_NAME_MASK = 0xFFFFFF
+
+
+def _words(data: bytes | memoryview) -> array:
+    """Big-endian u32 words as an array"""
+    words = array("I")
+    words.frombytes(data)
+    if sys.byteorder == "little":
+        words.byteswap()
+    return words
+
+
+class CompactFST:
+    """
+    Attributes:
+        name_offsets : Offset of the name of each node in `strings`, its type in the high byte (1 for a directory),
+                       as on disc
+        offsets      : Offset of the data of each file, in words as on disc. Index of the parent of each directory
+        lengths      : Size of each file. Index after the last node of each directory
+        parents      : Index of the directory holding each node
+        strings      : String table, Shift-JIS names ended by a null byte
+    """
+    def __init__(self, name_offsets: array, offsets: array, lengths: array, strings: bytes) -> None:
+        self.name_offsets = name_offsets
+        self.offsets = offsets
+        self.lengths = lengths
+        self.strings = strings
+        self.parents = array("I", bytes(4 * len(name_offsets)))
+
+        # Directories still open at each node, to find its parent
+        open_directories = [0]
+        for i in range(1, len(name_offsets)):
+            while len(open_directories) > 1 and i >= lengths[open_directories[-1]]:
+                open_directories.pop()
+            self.parents[i] = open_directories[-1]
+            if name_offsets[i] & _DIRECTORY:
+                open_directories.append(i)
+
+        # Position of the children of the directories by name, built on their first lookup
+        self._child_maps: dict[tuple[int, bool], dict[str, int]] = {}
+
+    @classmethod
+    def from_bytes(cls, data: bytes, offset: int = 0) -> "CompactFST":
+        """
+        :param data: Buffer holding the FST, node table then string table
+        :param offset: Offset of the FST in the buffer
+        """
+        data = memoryview(data)[offset:]
+        count = struct.unpack_from(">III", data)[2] if len(data) >= RawFSTNode.SIZE else 1
+        table_size = min(count, len(data) // RawFSTNode.SIZE) * RawFSTNode.SIZE
+        table = _words(data[:table_size]) if table_size else array("I", [_DIRECTORY, 0, 1])
+        return cls(table[0::3], table[1::3], table[2::3], bytes(data[table_size:]))
+
+    @classmethod
+    def read(cls, stream: BinaryIO, offset: int) -> "CompactFST":
+        """
+        :param stream: Binary stream holding the FST
+        :param offset: Offset of the FST in the stream
+        """
+        return cls.from_bytes(read_fst_bytes(stream, offset))
+
+    @classmethod
+    def from_tree(cls, entries: list[FSTNode] | FST) -> "CompactFST":
+        """
+        :param entries: Top-level entries of an FST, or the FST
+        """
+        if isinstance(entries, FST):
+            entries = entries.entries
+        name_offsets, offsets, lengths = array("I", [_DIRECTORY]), array("I", [0]), array("I", [0])
+        strings = bytearray(b"\x00")
+        names: dict[str, int] = {}
+
+        def add(children: list[FSTNode], parent: int) -> None:
+            for child in children:
+                name_offset = names.get(child.name)
+                if name_offset is None:
+                    name_offset = names[child.name] = len(strings)
+                    strings.extend(child.name.encode("shift_jis"))
+                    strings.append(0)
+
+                if isinstance(child, FSTDirectory):
+                    index = len(name_offsets)
+                    name_offsets.append(name_offset | _DIRECTORY)
+                    offsets.append(parent)
+                    lengths.append(0)
+                    add(child.children, index)
+                    lengths[index] = len(name_offsets)
+                elif isinstance(child, FSTFile):
+                    name_offsets.append(name_offset)
+                    offsets.append(child.offset >> 2)
+                    lengths.append(child.length)
+                else:
+                    raise NotImplementedError(f"Unknown FST node type: {type(child)}")
+
+        add(entries, 0)
+        lengths[0] = len(name_offsets)
+        return cls(name_offsets, offsets, lengths, bytes(strings))
+
+    def to_tree(self) -> FST:
+        """Object tree of this FST"""
+        return FST.from_bytes(self.to_bytes())
+
+    def to_bytes(self) -> bytes:
+        """Node table then string table, as on disc"""
+        table = array("I", bytes(len(self) * RawFSTNode.SIZE))
+        table[0::3] = self.name_offsets
+        table[1::3] = self.offsets
+        table[2::3] = self.lengths
+        if sys.byteorder == "little":
+            table.byteswap()
+        return table.tobytes() + self.strings
+
+    def write(self, stream: BinaryIO) -> None:
+        stream.write(self.to_bytes())
+
+    def __len__(self) -> int:
+        """Number of nodes, the root included"""
+        return len(self.name_offsets)
+
+    @property
+    def root(self) -> "CompactDirectory":
+        return CompactDirectory(self, 0)
+
+    @property
+    def entries(self) -> list["CompactNode"]:
+        return self.root.children
+
+    def node(self, index: int) -> "CompactNode":
+        """View of the node at an index of the node table"""
+        if self.name_offsets[index] & _DIRECTORY:
+            return CompactDirectory(self, index)
+        return CompactFile(self, index)
+
+    def name(self, index: int) -> str:
+        start = self.name_offsets[index] & _NAME_MASK
+        end = self.strings.find(0, start)
+        return self.strings[start:end if end >= 0 else len(self.strings)].decode("shift_jis")
+
+    def children(self, index: int) -> Iterator[int]:
+        """Indexes of the children of a directory"""
+        i, end = index + 1, self.lengths[index]
+        while i < end:
+            yield i
+            i = max(self.lengths[i], i + 1) if self.name_offsets[i] & _DIRECTORY else i + 1
+
+    def child(self, index: int, name: str, *, case_sensitive: bool = True) -> int | None:
+        """Index of the child of a directory named `name`, None if it has none"""
+        names = self._child_maps.get((index, case_sensitive))
+        if names is None:
+            names = self._child_maps[(index, case_sensitive)] = {}
+            for i in self.children(index):
+                names.setdefault(self.name(i) if case_sensitive else self.name(i).lower(), i)
+        return names.get(name if case_sensitive else name.lower())
+
+    def path(self, index: int) -> str:
+        parts = []
+        while index:
+            parts.append(self.name(index))
+            index = self.parents[index]
+        return "/".join(reversed(parts))
+
+    def find_node(self, path: str | list[str], *, case_sensitive: bool = True) -> "CompactNode | None":
+        """
+        Finds a node by its path (string or list of strings), see `FST.find_node`
+        """
+        parts = split_path(path)
+        return self.root.find(parts, case_sensitive=case_sensitive) if parts else None
+
+    def count_files(self) -> int:
+        return self.root.count_files()
+
+    def walk(self, prefix: str = "") -> list[tuple[str, "CompactNode"]]:
+        """
+        Path and node of every node under a directory, see `FST.walk`
+        """
+        directory = self.find_node(prefix) if split_path(prefix) else self.root
+        if not isinstance(directory, CompactDirectory):
+            return []
+        base = self.path(directory.index)
+        return list(self._walk(directory.index, f"{base}/" if base else ""))
+
+    def _walk(self, index: int, prefix: str) -> Iterator[tuple[str, "CompactNode"]]:
+        for i in self.children(index):
+            path = f"{prefix}{self.name(i)}"
+            yield path, self.node(i)
+            if self.name_offsets[i] & _DIRECTORY:
+                yield from self._walk(i, f"{path}/")
+
+
+class CompactNode:
+    """
+    View of a node of a `CompactFST`
+
+    Attributes:
+        fst   : FST holding the node
+        index : Index of the node in the node table
+    """
+    __slots__ = ("fst", "index")
+
+    def __init__(self, fst: CompactFST, index: int) -> None:
+        self.fst = fst
+        self.index = index
+
+    @property
+    def name(self) -> str:
+        return self.fst.name(self.index)
+
+    @property
+    def is_directory(self) -> bool:
+        return isinstance(self, CompactDirectory)
+
+    @property
+    def is_file(self) -> bool:
+        return isinstance(self, CompactFile)
+
+    @property
+    def parent(self) -> "CompactDirectory":
+        return CompactDirectory(self.fst, self.fst.parents[self.index])
+
+    @property
+    def path(self) -> str:
+        return self.fst.path(self.index)
+
+    def count_files(self) -> int:
+        return 1
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, CompactNode) and other.fst is self.fst and other.index == self.index
+
+    def __hash__(self) -> int:
+        return hash((id(self.fst), self.index))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.path!r})"
+
+
+class CompactFile(CompactNode):
+    __slots__ = ()
+
+    @property
+    def offset(self) -> int:
+        return self.fst.offsets[self.index] << 2
+
+    @offset.setter
+    def offset(self, value: int) -> None:
+        self.fst.offsets[self.index] = value >> 2
+
+    @property
+    def length(self) -> int:
+        return self.fst.lengths[self.index]
+
+    @length.setter
+    def length(self, value: int) -> None:
+        self.fst.lengths[self.index] = value
+
+
+class CompactDirectory(CompactNode):
+    __slots__ = ()
+
+    @property
+    def children(self) -> list[CompactNode]:
+        return [self.fst.node(i) for i in self.fst.children(self.index)]
+
+    def find(self, path: str | list[str], *, case_sensitive: bool = True) -> CompactNode | None:
+        """
+        Find a node by the relative path, one dictionary lookup per component
+        :param path: Path relative to this directory
+        :param case_sensitive: Whether the case of the names matters
+        :return: The node, None if there is none
+        """
+        index = self.index
+        for part in split_path(path):
+            if not self.fst.name_offsets[index] & _DIRECTORY:
+                return None
+            index = self.fst.child(index, part, case_sensitive=case_sensitive)
+            if index is None:
+                return None
+        return self.fst.node(index)
+
+    def count_files(self) -> int:
+        name_offsets = self.fst.name_offsets
+        return sum(1 for i in range(self.index + 1, self.fst.lengths[self.index])
+                   if not name_offsets[i] & _DIRECTORY)
@@ -0,0 +1,97 @@
+"""
+FST whose directories are built when their children are first accessed
+
+The node and string tables stay in memory as they were read. Only the entries of the root are built up front: each
+directory builds its children from the tables the first time they are accessed, skipping the subtrees of its
+subdirectories with their end index. Finding one file builds the directories of its path and nothing else
+"""
+import struct
+
+from wiithon.fst.node import FSTDirectory, FSTFile, FSTNode
+from wiithon.fst.raw_node import RawFSTNode
+
+
+class NodeTable:
+    """
+    Tables of an FST, kept to build its directories on demand
+
+    Attributes:
+        table   : Node table, root included
+        strings : String table
+    """
+    __slots__ = ("strings", "table")
+
+    def __init__(self, table: bytes, strings: bytes) -> None:
+        self.table = table
+        self.strings = strings
+
+    def __len__(self) -> int:
+        return len(self.table) // RawFSTNode.SIZE
+
+    def name(self, name_offset: int) -> str:
+        end = self.strings.find(0, name_offset)
+        return self.strings[name_offset:end if end >= 0 else len(self.strings)].decode("shift_jis")
+
+    def children(self, index: int, end: int) -> list[FSTNode]:
+        """
+        Build the nodes of a directory
+        :param index: Index of the directory in the node table, 0 for the root
+        :param end: Index after its last node
+        """
+        result: list[FSTNode] = []
+        i = index + 1
+        end = min(end, len(self))
+        while i < end:
+            kind_name, data_offset, length = struct.unpack_from(">III", self.table, i * RawFSTNode.SIZE)
+            name = self.name(kind_name & 0xFFFFFF)
+            if kind_name >> 24:
+                result.append(LazyFSTDirectory(name, self, i, length))
+                i = max(length, i + 1)
+            else:
+                result.append(FSTFile(name, offset=data_offset << 2, length=length))
+                i += 1
+        return result
+
+    def count_files(self, index: int, end: int) -> int:
+        """Number of files in a directory and its subdirectories, without building them"""
+        return sum(1 for i in range(index + 1, min(end, len(self)))
+                   if not self.table[i * RawFSTNode.SIZE])
+
+
+class LazyFSTDirectory(FSTDirectory):
+    """
+    Directory whose children are built from the node table on first access. Once built, or assigned, they are a
+    plain list, as for any directory
+    """
+    def __init__(self, name: str, table: NodeTable, index: int, end: int) -> None:
+        """
+        :param name: Name of the directory
+        :param table: Tables of the FST
+        :param index: Index of the directory in the node table
+        :param end: Index after its last node
+        """
+        super().__init__(name)
+        self._table = table
+        self._index = index
+        self._end = end
+        self._children: list[FSTNode] | None = None
+
+    @property
+    def children(self) -> list[FSTNode]:
+        if self._children is None:
+            self._children = self._table.children(self._index, self._end)
+        return self._children
+
+    @children.setter
+    def children(self, children: list[FSTNode]) -> None:
+        self._children = children
+
+    @property
+    def is_loaded(self) -> bool:
+        """Whether the children were built"""
+        return self._children is not None
+
+    def count_files(self) -> int:
+        if self._children is None:
+            return self._table.count_files(self._index, self._end)
+        return super().count_files()
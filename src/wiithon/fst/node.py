@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod
 
+from wiithon.fst.path_index import ChildIndex, resolve, split_path
+
 
 class FSTNode(ABC):
     """Abstract base class for a FST entries (composite pattern)"""
@@ -48,30 +50,20 @@ class FSTDirectory(FSTNode):
     def __init__(self, name: str = "") -> None:
         super().__init__(name)
         self.children: list[FSTNode] = []
+        # Map of the children by name, see `wiithon.fst.path_index`
+        self.child_index: ChildIndex | None = None
 
-    def find(self, path: str) -> FSTNode | None:
+    def find(self, path: str, *, case_sensitive: bool = True) -> FSTNode | None:
         """
         Find a node by the relative path
-        :param path:
-        :return:
+        :param path: Path relative to this directory
+        :param case_sensitive: Whether the case of the names matters
+        :return: The node, None if there is none
         """
-        parts = path.strip("/").split("/")
-        current: FSTNode = self
-        for part in parts:
-            if not isinstance(current, FSTDirectory):
-                return None
-
-            found = None
-            for child in current.children:
-                if child.name == part:
-                    found = child
-                    break
-
-            if found is None:
-                return None
-            current = found
-
-        return current
+        parts = split_path(path)
+        if not parts:
+            return None
+        return resolve(self, self.children, parts, case_sensitive=case_sensitive)
 
     def count_files(self) -> int:
         return sum(child.count_files() for child in self.children)
\ No newline at end of file
@@ -1,44 +1,55 @@
+"""
+Edits of an FST tree by path
+
+The functions take the FST, or only its root entries. They drop the name maps of the directories whose children they
+change (see `wiithon.fst.path_index`), the map of the root entries only when given the FST
+"""
 import bisect
+from collections.abc import Iterator
 
 from wiithon.exceptions import FstError
-from wiithon.fst.node import FSTDirectory, FSTNode
-
-
-def find_node(entries: list[FSTNode], path_parts: list[str]) -> FSTNode | None:
-    current: None | FSTDirectory = None
-    for part in path_parts:
-        found = None
-        search_list = entries if current is None else current.children
-        for node in search_list:
-            if node.name == part:
-                found = node
-                break
-
-        if found is None:
-            return None
-
-        current = found
-
-    return current
-
-def remove_node(entries: list[FSTNode], path_parts: list[str]) -> FSTNode | None:
+from wiithon.fst.node import FSTDirectory, FSTFile, FSTNode
+from wiithon.fst.path_index import ChildIndex, resolve
+from wiithon.fst.tree import FST
+
+
+def find_node(entries: list[FSTNode] | FST, path_parts: list[str]) -> FSTNode | None:
+    if not path_parts:
+        return None
+    if isinstance(entries, FST):
+        return resolve(entries, entries.entries, list(path_parts))
+
+    # Root entries without their FST have nowhere to keep their map
+    first = ChildIndex(entries).get(path_parts[0])
+    if first is None or len(path_parts) == 1:
+        return first
+    if not isinstance(first, FSTDirectory):
+        return None
+    return resolve(first, first.children, list(path_parts[1:]))
+
+def remove_node(entries: list[FSTNode] | FST, path_parts: list[str]) -> FSTNode | None:
     parts = list(path_parts)
-    parent_list = entries
+    owner: FSTDirectory | FST | None = entries if isinstance(entries, FST) else None
+    parent_list = entries.entries if isinstance(entries, FST) else entries
     for part in parts[:-1]:
         parent = next((n for n in parent_list if n.name == part), None)
         if parent is None or not isinstance(parent, FSTDirectory):
             return None
 
+        owner = parent
         parent_list = parent.children
 
     for i, n in enumerate(parent_list):
         if n.name == parts[-1]:
+            if owner is not None:
+                owner.child_index = None
             return parent_list.pop(i)
 
     return None
 
-def add_node(entries: list[FSTNode], path_parts: list[str], new_node: FSTNode) -> FSTNode | None:
-    current_list = entries
+def add_node(entries: list[FSTNode] | FST, path_parts: list[str], new_node: FSTNode) -> FSTNode | None:
+    owner: FSTDirectory | FST | None = entries if isinstance(entries, FST) else None
+    current_list = entries.entries if isinstance(entries, FST) else entries
     for part in path_parts:
         found = None
         for _, node in enumerate(current_list):
@@ -51,12 +62,17 @@ def add_node(entries: list[FSTNode], path_parts: list[str], new_node: FSTNode) -
             index = bisect.bisect_left([n.name.lower() for n in current_list], part.lower())
             current_list.insert(index, new_directory)
             found = current_list[index]
+            if owner is not None:
+                owner.child_index = None
 
-        if not found.is_directory:
+        if not isinstance(found, FSTDirectory):
             raise FstError("Creating through a file")
 
+        owner = found
         current_list = found.children
 
+    if owner is not None:
+        owner.child_index = None
     idx = bisect.bisect_left([n.name.lower() for n in current_list], new_node.name.lower())
     if idx < len(current_list) and current_list[idx].name.lower() == new_node.name.lower():
         old = current_list[idx]
@@ -64,4 +80,13 @@ def add_node(entries: list[FSTNode], path_parts: list[str], new_node: FSTNode) -
         return old
 
     current_list.insert(idx, new_node)
-    return None
\ No newline at end of file
+    return None
+
+
+def file_nodes(entries: list[FSTNode], prefix: str = "") -> Iterator[tuple[str, FSTFile]]:
+    """Path and node of every file under `entries`, in tree order"""
+    for entry in entries:
+        if isinstance(entry, FSTDirectory):
+            yield from file_nodes(entry.children, f"{prefix}{entry.name}/")
+        elif isinstance(entry, FSTFile):
+            yield f"{prefix}{entry.name}", entry
@@ -0,0 +1,161 @@
+"""
+Name lookups in the children of FST directories
+
+Each directory keeps a map from the names of its children to their position, built on its first lookup. The
+functions of `wiithon.fst.operations` drop the maps of the directories whose children they change, and a map is
+checked on every lookup against the list of children it was built from: a list replaced, or of another length, is
+indexed again, and a hit is checked against the name of the child found, so a child replaced in place or renamed is
+never returned by its old name. A miss in a map still valid returns None at once: resolving a path takes one
+dictionary lookup per component, whether the node exists or not. Children swapped directly in their list without
+changing its length, or renamed to a new name, are only found once the maps are dropped: see `invalidate`
+"""
+from __future__ import annotations
+
+from collections.abc import Iterator
+from fnmatch import fnmatchcase
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from wiithon.fst.node import FSTDirectory, FSTNode
+    from wiithon.fst.tree import FST
+
+_WILDCARDS = frozenset("*?[")
+
+
+class ChildIndex:
+    """
+    Position of the children of a directory, by name
+
+    Attributes:
+        children : List of children the map was built from
+        length   : Number of children when it was built
+        names    : Position of each child, by name. The first child wins when names repeat
+        folded   : Same by lowercase name, built on the first case-insensitive lookup
+    """
+    __slots__ = ("children", "folded", "length", "names")
+
+    def __init__(self, children: list[FSTNode]) -> None:
+        self.children = children
+        self.length = len(children)
+        self.names: dict[str, int] = {}
+        for i, child in enumerate(children):
+            self.names.setdefault(child.name, i)
+        self.folded: dict[str, int] | None = None
+
+    def is_valid(self, children: list[FSTNode]) -> bool:
+        return self.children is children and self.length == len(children)
+
+    def get(self, name: str, *, case_sensitive: bool = True) -> FSTNode | None:
+        """Child named `name`, None if it has none. Raises `LookupError` if the map is out of date"""
+        if case_sensitive:
+            i = self.names.get(name)
+        else:
+            folded = self.folded
+            if folded is None:
+                # Filled before it is shared, another thread may be looking up through this map
+                folded = {}
+                for j, child in enumerate(self.children):
+                    folded.setdefault(child.name.lower(), j)
+                self.folded = folded
+            name = name.lower()
+            i = folded.get(name)
+
+        if i is None:
+            return None
+        child = self.children[i]
+        if (child.name if case_sensitive else child.name.lower()) != name:
+            raise LookupError(name)
+        return child
+
+
+def split_path(path: str | list[str]) -> list[str]:
+    """Components of a path, `/` or `\\` separated"""
+    if isinstance(path, str):
+        return [part for part in path.replace("\\", "/").split("/") if part]
+    return list(path)
+
+
+def child_of(owner: FSTDirectory | FST, children: list[FSTNode], name: str,
+             *, case_sensitive: bool = True) -> FSTNode | None:
+    """
+    Child of a directory by name, through the map cached on `owner`
+
+    :param owner: Object holding the map of `children`, in its `child_index` attribute: the directory, or the FST
+        for its root entries
+    :param children: Children of the directory
+    :param name: Name of the child
+    :param case_sensitive: Whether the case of the name matters
+    """
+    index = owner.child_index
+    if index is None or not index.is_valid(children):
+        index = owner.child_index = ChildIndex(children)
+    try:
+        return index.get(name, case_sensitive=case_sensitive)
+    except LookupError:
+        index = owner.child_index = ChildIndex(children)
+        return index.get(name, case_sensitive=case_sensitive)
+
+
+def resolve(owner: FSTDirectory | FST, children: list[FSTNode], parts: list[str],
+            *, case_sensitive: bool = True) -> FSTNode | None:
+    """Node at a path relative to a directory, None if there is none"""
+    node: FSTNode | None = None
+    for part in parts:
+        if node is not None:
+            if not node.is_directory:
+                # Only the last component may be a file
+                return None
+            owner, children = node, node.children
+        node = child_of(owner, children, part, case_sensitive=case_sensitive)
+        if node is None:
+            return None
+    return node
+
+
+def walk(entries: list[FSTNode], prefix: str = "") -> Iterator[tuple[str, FSTNode]]:
+    """Path and node of every node under `entries`, directories before their children"""
+    for entry in entries:
+        path = f"{prefix}{entry.name}"
+        yield path, entry
+        if entry.is_directory:
+            yield from walk(entry.children, f"{path}/")
+
+
+def glob(owner: FSTDirectory | FST, children: list[FSTNode], parts: list[str], prefix: str = "",
+         *, case_sensitive: bool = True) -> Iterator[tuple[str, FSTNode]]:
+    """
+    Nodes matching a pattern, `fnmatch` style component by component. `**` matches any number of directories.
+    Components without wildcards are looked up in the maps rather than matched against every child
+    """
+    if not parts:
+        return
+    part, rest = parts[0], parts[1:]
+
+    if part == "**":
+        yield from glob(owner, children, rest, prefix, case_sensitive=case_sensitive)
+        for child in children:
+            if child.is_directory:
+                yield from glob(child, child.children, parts, f"{prefix}{child.name}/", case_sensitive=case_sensitive)
+        return
+
+    if _WILDCARDS.isdisjoint(part):
+        child = child_of(owner, children, part, case_sensitive=case_sensitive)
+        matched = [child] if child is not None else []
+    else:
+        pattern = part if case_sensitive else part.lower()
+        matched = [child for child in children
+                   if fnmatchcase(child.name if case_sensitive else child.name.lower(), pattern)]
+
+    for child in matched:
+        path = f"{prefix}{child.name}"
+        if not rest:
+            yield path, child
+        elif child.is_directory:
+            yield from glob(child, child.children, rest, f"{path}/", case_sensitive=case_sensitive)
+
+
+def invalidate(entries: list[FSTNode]) -> None:
+    """Drop the maps of every directory under `entries`"""
+    for _, node in walk(entries):
+        if node.is_directory:
+            node.child_index = None
@@ -1,30 +1,50 @@
+import struct
 from typing import BinaryIO
 
-from wiithon.binary.reader import BinaryReader
 from wiithon.binary.writer import BinaryWriter
+from wiithon.fst.lazy import NodeTable
 from wiithon.fst.node import FSTDirectory, FSTFile, FSTNode
+from wiithon.fst.path_index import ChildIndex, glob, invalidate, resolve, split_path, walk
 from wiithon.fst.raw_node import RawFSTNode
 
 
 class FST:
     def __init__(self) -> None:
         self.entries: list[FSTNode] = []
+        # Map of the root entries by name, see `wiithon.fst.path_index`
+        self.child_index: ChildIndex | None = None
 
     @classmethod
-    def read(cls, stream: BinaryIO, offset: int) -> "FST":
-        obj = cls()
-        reader = BinaryReader(stream)
-        reader.seek(offset)
-
-        root = RawFSTNode.read(stream)
-        total_nodes = root.length
-        nodes: list[RawFSTNode] = [root]
-        nodes.extend(RawFSTNode.read(stream) for _ in range(total_nodes - 1))
-
-        string_offset = reader.tell()
-        obj.entries, _ = _build_tree(reader, string_offset, nodes,
-                                     start=1, end=total_nodes)
+    def read(cls, stream: BinaryIO, offset: int, *, lazy: bool = False) -> "FST":
+        """
+        Read an FST from a stream, see `read_fst_bytes`
+        :param stream: Binary stream holding the FST
+        :param offset: Offset of the FST in the stream
+        :param lazy: Build the children of the directories on first access, see `wiithon.fst.lazy`
+        """
+        return cls.from_bytes(read_fst_bytes(stream, offset), lazy=lazy)
 
+    @classmethod
+    def from_bytes(cls, data: bytes, offset: int = 0, *, lazy: bool = False) -> "FST":
+        """
+        Parse an FST held in memory: the nodes are decoded at once, the names sliced from the string table
+        :param data: Buffer holding the FST, node table then string table
+        :param offset: Offset of the FST in the buffer
+        :param lazy: Only build the root entries, and the children of each directory on first access
+            (see `wiithon.fst.lazy`): finding one node then costs the size of the directories on its path
+        """
+        obj = cls()
+        data = memoryview(data)[offset:]
+        if len(data) < RawFSTNode.SIZE:
+            return obj
+
+        count = struct.unpack_from(">III", data)[2]
+        table_size = min(count * RawFSTNode.SIZE, len(data) // RawFSTNode.SIZE * RawFSTNode.SIZE)
+        strings = bytes(data[count * RawFSTNode.SIZE:])
+        if lazy:
+            obj.entries = NodeTable(bytes(data[:table_size]), strings).children(0, count)
+        else:
+            obj.entries = _parse_tree(data[:table_size], strings)
         return obj
 
     def write(self, stream: BinaryIO) -> None:
@@ -54,65 +74,105 @@ class FST:
     def count_files(self) -> int:
         return sum(e.count_files() for e in self.entries)
 
-    def find_node(self, path: str | list[str]) -> FSTNode | None:
-        """Finds a node by its path (string or list of strings)"""
-        if isinstance(path, str):
-            path = [p for p in path.strip('/').replace('\\', '/').split('/') if p]
-            
-        if not path:
+    def find_node(self, path: str | list[str], *, case_sensitive: bool = True) -> FSTNode | None:
+        """
+        Finds a node by its path (string or list of strings), with one dictionary lookup per component
+        :param path: Path of the node, `/` or `\\` separated
+        :param case_sensitive: Whether the case of the names matters
+        :return: The node, None if there is none
+        """
+        parts = split_path(path)
+        if not parts:
             return None
-            
-        current_entries = self.entries
-        target = None
-        
-        for part in path:
-            found = False
-            for entry in current_entries:
-                if entry.name == part:
-                    target = entry
-                    if hasattr(entry, 'children'):
-                        current_entries = entry.children
-                    found = True
-                    break
-            if not found:
-                return None
-                
-        return target
-
-
-def _build_tree(reader: BinaryReader, string_offset: int,
-                nodes: list[RawFSTNode],
-                start: int, end: int) -> tuple[list[FSTNode], int]:
-    """Recursively convert flat raw nodes into a tree.
-
-    :param stream: Binary stream (for reading names from string table).
-    :param string_offset: Offset of the string table in the stream.
-    :param nodes: Flat list of all raw nodes.
-    :param start: First index to process.
-    :param end: Stop before this index.
-
-    :return: list of FSTNodes, next index to process.
+        return resolve(self, self.entries, parts, case_sensitive=case_sensitive)
+
+    def glob(self, pattern: str, *, case_sensitive: bool = True) -> list[tuple[str, FSTNode]]:
+        """
+        Nodes whose path matches a pattern: `*`, `?` and `[...]` within a component, `**` for any number of
+        directories (`Stage/**/*.arc`)
+        :return: Path and node of each match, in tree order
+        """
+        return list(glob(self, self.entries, split_path(pattern), case_sensitive=case_sensitive))
+
+    def walk(self, prefix: str = "") -> list[tuple[str, FSTNode]]:
+        """
+        Path and node of every node under a directory, directories before their children
+        :param prefix: Path of the directory, the root if empty
+        :return: Nodes with their full path, none if `prefix` is not a directory
+        """
+        if not split_path(prefix):
+            return list(walk(self.entries))
+        directory = self.find_node(prefix)
+        if not isinstance(directory, FSTDirectory):
+            return []
+        return list(walk(directory.children, "/".join(split_path(prefix)) + "/"))
+
+    def invalidate_index(self) -> None:
+        """Drop the maps of the directories, after renaming nodes in place or changing children outside `operations`"""
+        self.child_index = None
+        invalidate(self.entries)
+
+
+def read_fst_bytes(stream: BinaryIO, offset: int) -> bytes:
+    """
+    Read the node table of an FST in one read, then its string table
+    :param stream: Binary stream holding the FST
+    :param offset: Offset of the FST in the stream
+    :return: Node table then string table
     """
-    result: list[FSTNode] = []
-    i = start
+    stream.seek(offset)
+    head = stream.read(RawFSTNode.SIZE)
+    count = struct.unpack_from(">III", head)[2] if len(head) == RawFSTNode.SIZE else 0
+    table = head + stream.read(max(count - 1, 0) * RawFSTNode.SIZE)
 
-    while i < end:
-        raw = nodes[i]
-        reader.seek(string_offset + raw.name_offset)
-        name = reader.string_until_null(encoding="shift_jis")
+    # The string table has no size of its own: it is read up to the end of its last name
+    last_name = max((kind_name & 0xFFFFFF for kind_name, _, _ in struct.iter_unpack(">III", table)), default=0)
+    strings = bytearray(stream.read(last_name + 1))
+    while strings.find(0, last_name) < 0:
+        chunk = stream.read(0x100)
+        if not chunk:
+            break
+        strings += chunk
+
+    return table + strings
+
+
+def _parse_tree(table: bytes | memoryview, strings: bytes) -> list[FSTNode]:
+    """
+    Convert the flat node table into a tree, in one pass
+
+    :param table: Node table, root included
+    :param strings: String table
+    :return: Children of the root
+    """
+    # Most string tables are plain ASCII: decoded once, names are sliced from the text, with the same offsets
+    text = strings.decode("ascii") if strings.isascii() else None
+    entries: list[FSTNode] = []
+    # Children of the directories being filled, with the index ending each of them
+    open_directories: list[tuple[list[FSTNode], int]] = [(entries, len(table) // RawFSTNode.SIZE)]
+
+    for i, (kind_name, data_offset, length) in enumerate(struct.iter_unpack(">III", table)):
+        if i == 0:
+            continue
+        while len(open_directories) > 1 and i >= open_directories[-1][1]:
+            open_directories.pop()
+
+        name_offset = kind_name & 0xFFFFFF
+        if text is not None:
+            name_end = text.find("\0", name_offset)
+            name = text[name_offset:name_end] if name_end >= 0 else text[name_offset:]
+        else:
+            name_end = strings.find(0, name_offset)
+            name = strings[name_offset:name_end if name_end >= 0 else len(strings)].decode("shift_jis")
 
-        if raw.is_directory:
-            children, _ = _build_tree(reader, string_offset, nodes,
-                                      start=i + 1, end=raw.length)
+        if kind_name >> 24:
             directory = FSTDirectory(name)
-            directory.children = children
-            result.append(directory)
-            i = raw.length
+            open_directories[-1][0].append(directory)
+            open_directories.append((directory.children, length))
         else:
-            result.append(FSTFile(name, offset=raw.data_offset << 2, length=raw.length))
-            i += 1
+            open_directories[-1][0].append(FSTFile(name, offset=data_offset << 2, length=length))
 
-    return result, i
+    return entries
 
 
 def _add_string(strings: bytearray, name: str) -> int:
@@ -0,0 +1,183 @@
+"""
+Index of the files inside the archives of the indexed discs
+
+Every Yaz0/LZ77/RARC/U8 file of a disc is opened once, and the files it holds (recursively, for archives inside
+archives) are recorded with their size and SHA-1, under the SHA-1 of the packed file. The files of every disc are
+known by the content index (see `wiithon.library.content_index`), so an archive already opened on this disc or on
+another one is never read again, nor is a file already known not to be packed: once a disc is indexed, finding
+which archives hold a file decompresses nothing
+"""
+import hashlib
+from collections.abc import Callable
+from pathlib import Path
+
+from wiithon.disc.reader import WiiIsoReader
+from wiithon.formats.archive import is_packed, walk_members
+from wiithon.fst.operations import file_nodes
+from wiithon.library.content_index import ContentIndex, partition_names
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS packed_scans (
+    sha1    TEXT PRIMARY KEY,
+    packed  INTEGER NOT NULL,
+    members INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS archive_members (
+    archive_sha1 TEXT NOT NULL REFERENCES packed_scans(sha1) ON DELETE CASCADE,
+    path         TEXT NOT NULL,
+    name         TEXT NOT NULL,
+    size         INTEGER NOT NULL,
+    sha1         TEXT NOT NULL,
+    PRIMARY KEY (archive_sha1, path)
+);
+CREATE INDEX IF NOT EXISTS archive_members_name ON archive_members(name);
+CREATE INDEX IF NOT EXISTS archive_members_sha1 ON archive_members(sha1);
+"""
+
+
+class ArchiveIndexResult:
+    """
+    Attributes:
+        path   : Indexed image
+        opened : Packed files read and opened
+        cached : Files whose content was already scanned, on this disc or on another one
+        plain  : Files read and found not to be packed
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.opened = 0
+        self.cached = 0
+        self.plain = 0
+
+    def to_dict(self) -> dict:
+        return {"path": self.path, "opened": self.opened, "cached": self.cached, "plain": self.plain}
+
+
+class MemberMatch:
+    """
+    A file found inside an archive of an indexed disc
+
+    Attributes:
+        disc      : Path of the disc
+        partition : Partition holding the archive
+        archive   : Path of the archive in its partition
+        member    : Path of the file in the archive
+        size      : Size of the file, as stored in the archive
+        sha1      : SHA-1 of the file, as stored in the archive
+    """
+    def __init__(self, disc: str, partition: str, archive: str, member: str, size: int, sha1: str) -> None:
+        self.disc = disc
+        self.partition = partition
+        self.archive = archive
+        self.member = member
+        self.size = size
+        self.sha1 = sha1
+
+    def to_dict(self) -> dict:
+        return {"disc": self.disc, "partition": self.partition, "archive": self.archive, "member": self.member,
+                "size": self.size, "sha1": self.sha1}
+
+
+class ArchiveIndex(ContentIndex):
+    """Content index that also records the files inside the archives"""
+    def __init__(self, path: str | Path) -> None:
+        """
+        :param path: Index database, created if needed. It can be the database of a `LibraryCatalog`
+        """
+        super().__init__(path)
+        with self.connection:
+            self.connection.executescript(_SCHEMA)
+
+    def __enter__(self) -> "ArchiveIndex":
+        return self
+
+    def _scanned(self) -> set[str]:
+        return {row[0] for row in self.connection.execute("SELECT sha1 FROM packed_scans")}
+
+    def index_archives(self, path: str | Path, progress_cb: Callable[[str], None] | None = None,
+                       *, force: bool = False) -> ArchiveIndexResult:
+        """
+        Index the content of a disc if needed, then the files inside its archives not indexed yet
+
+        :param path: Image, in any container
+        :param progress_cb: Called with the path of each packed file as it is opened
+        :param force: Read the image even if it did not change since its content was indexed
+        """
+        self.index_disc(path, force=force)
+        path = str(Path(path).resolve())
+        result = ArchiveIndexResult(path)
+        digests = self.files(path)
+        scanned = self._scanned()
+
+        if all(sha1 in scanned for sha1 in digests.values()):
+            result.cached = len(digests)
+            return result
+
+        with WiiIsoReader(path) as reader:
+            for name, entry in zip(partition_names(reader), reader.partitions, strict=True):
+                files = [(file_path, sha1) for (part, file_path), sha1 in sorted(digests.items()) if part == name]
+                todo = [(file_path, sha1) for file_path, sha1 in files if sha1 not in scanned]
+                result.cached += len(files) - len(todo)
+                if not todo:
+                    continue
+
+                partition = reader.open_partition(entry)
+                nodes = dict(file_nodes(partition.fst.entries))
+                scans, members = [], []
+                for file_path, sha1 in todo:
+                    if sha1 in scanned:
+                        # Same content earlier on this disc
+                        result.cached += 1
+                        continue
+                    scanned.add(sha1)
+
+                    node = nodes[file_path]
+                    read = partition.crypto.read_at
+                    # Only the magic word of a file that is not packed is read
+                    if node.length < 4 or not is_packed(read(node.offset, 4)):
+                        result.plain += 1
+                        scans.append((sha1, 0, 0))
+                        continue
+
+                    rows = [
+                        (sha1, member, member.rsplit("/", 1)[-1], len(data), hashlib.sha1(data).hexdigest())
+                        for member, data in walk_members(read(node.offset, node.length))
+                    ]
+                    result.opened += 1
+                    scans.append((sha1, 1, len(rows)))
+                    members.extend(rows)
+                    if progress_cb:
+                        progress_cb(file_path)
+
+                with self.connection:
+                    self.connection.executemany("INSERT OR REPLACE INTO packed_scans VALUES (?, ?, ?)", scans)
+                    self.connection.executemany("INSERT OR REPLACE INTO archive_members VALUES (?, ?, ?, ?, ?)",
+                                                members)
+        return result
+
+    def members(self, sha1: str) -> list[tuple[str, int, str]]:
+        """
+        Files inside a packed file
+
+        :param sha1: Hex SHA-1 of the packed file
+        :return: Path, size and SHA-1 of each file, nested ones following their archive
+        """
+        return [tuple(row) for row in self.connection.execute(
+            "SELECT path, size, sha1 FROM archive_members WHERE archive_sha1 = ? ORDER BY path", (sha1.lower(),)
+        )]
+
+    def find_member(self, name: str) -> list[MemberMatch]:
+        """
+        Files inside the archives of the indexed discs, by name or by path in their archive
+
+        :param name: File name (`ObjNameTable.bcsv`), or path in the archive (`jmp/ObjNameTable.bcsv`)
+        """
+        name = name.strip("/")
+        column = "path" if "/" in name else "name"
+        rows = self.connection.execute(
+            "SELECT f.disc_path, f.partition, f.path, m.path, m.size, m.sha1 "
+            "FROM archive_members m JOIN file_digests f ON f.sha1 = m.archive_sha1 "
+            f"WHERE m.{column} = ? ORDER BY f.disc_path, f.partition, f.path, m.path",
+            (name,),
+        )
+        return [MemberMatch(*row) for row in rows]
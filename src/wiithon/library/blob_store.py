@@ -0,0 +1,253 @@
+"""
+Content-addressed store of extracted files, shared by every disc extracted into it
+
+Each file content is stored once, as a blob named by its SHA-1, and each extracted disc gets a manifest mapping its
+files to their blobs. Extracting another revision of a game only writes the files whose content is new: the files
+spanning groups with the same H3 hashes as a file of a manifest of the same game are not even read.
+A manifest is materialized as a directory tree by hardlinking (or copying) the blobs
+"""
+import hashlib
+import json
+import shutil
+import tempfile
+from collections.abc import Callable
+from pathlib import Path
+
+from wiithon.crypto.layout import GROUP_DATA_SIZE
+from wiithon.disc.group_digests import group_digest, read_h3_table
+from wiithon.disc.reader import WiiIsoReader
+from wiithon.disc.structs.partition_entry import WiiPartitionEntry
+from wiithon.exceptions import InvalidFormatError
+from wiithon.fst.node import FSTFile
+from wiithon.fst.operations import file_nodes
+from wiithon.library.content_index import partition_names
+
+STORE_MANIFEST_VERSION: int = 1
+
+
+class StoredFile:
+    """
+    One file of an extracted disc
+
+    Attributes:
+        path         : Path in its partition
+        offset       : Offset in the user data of its partition
+        length       : Size of the file
+        sha1         : Name of its blob
+        group_digest : Digest of the H3 hashes of the groups it spans, None if the partition has no usable hashes
+    """
+    def __init__(self, path: str, offset: int, length: int, sha1: str, group_digest: bytes | None = None) -> None:
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self.sha1 = sha1
+        self.group_digest = group_digest
+
+    def to_dict(self) -> dict:
+        return {
+            "path": self.path, "offset": self.offset, "length": self.length, "sha1": self.sha1,
+            "groups": self.group_digest.hex() if self.group_digest is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "StoredFile":
+        groups = data.get("groups")
+        return cls(data["path"], data["offset"], data["length"], data["sha1"],
+                   bytes.fromhex(groups) if groups is not None else None)
+
+
+class DiscManifest:
+    """
+    Files of an extracted disc, by partition name
+
+    Attributes:
+        name         : Name of the manifest in its store
+        game_id      : Game ID of the disc
+        disc_version : Version of the disc
+        partitions   : Files of each extracted partition, by partition name
+    """
+    def __init__(self, name: str, game_id: str, disc_version: int) -> None:
+        self.name = name
+        self.game_id = game_id
+        self.disc_version = disc_version
+        self.partitions: dict[str, list[StoredFile]] = {}
+
+    def to_dict(self) -> dict:
+        return {
+            "version": STORE_MANIFEST_VERSION,
+            "game_id": self.game_id,
+            "disc_version": self.disc_version,
+            "partitions": {name: [f.to_dict() for f in files] for name, files in self.partitions.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, name: str, data: dict) -> "DiscManifest":
+        if data.get("version") != STORE_MANIFEST_VERSION:
+            raise InvalidFormatError(f"Unsupported store manifest version: {data.get('version')}")
+        obj = cls(name, data["game_id"], data["disc_version"])
+        obj.partitions = {
+            partition: [StoredFile.from_dict(f) for f in files] for partition, files in data["partitions"].items()
+        }
+        return obj
+
+
+class StoreResult:
+    """
+    Attributes:
+        manifest      : Manifest of the extracted disc
+        written       : Blobs added to the store
+        existing      : Files read whose blob was already stored
+        reused        : Files not read, their groups being unchanged since a previous extraction
+        bytes_written : Size of the blobs added
+    """
+    def __init__(self, manifest: DiscManifest) -> None:
+        self.manifest = manifest
+        self.written = 0
+        self.existing = 0
+        self.reused = 0
+        self.bytes_written = 0
+
+
+class BlobStore:
+    def __init__(self, root: str | Path) -> None:
+        """
+        :param root: Directory of the store, created if needed
+        """
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.manifests = self.root / "manifests"
+        self.tmp = self.root / "tmp"
+        for directory in (self.objects, self.manifests, self.tmp):
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def blob_path(self, sha1: str) -> Path:
+        return self.objects / sha1[:2] / sha1[2:]
+
+    def has(self, sha1: str) -> bool:
+        return self.blob_path(sha1).is_file()
+
+    def manifest_names(self) -> list[str]:
+        return sorted(path.stem for path in self.manifests.glob("*.json"))
+
+    def load_manifest(self, name: str) -> DiscManifest:
+        path = self.manifests / f"{name}.json"
+        try:
+            return DiscManifest.from_dict(name, json.loads(path.read_text(encoding="utf-8")))
+        except (json.JSONDecodeError, KeyError) as e:
+            raise InvalidFormatError(f"Invalid store manifest {path}: {e}") from e
+
+    def save_manifest(self, manifest: DiscManifest) -> None:
+        path = self.manifests / f"{manifest.name}.json"
+        tmp = path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(manifest.to_dict()), encoding="utf-8")
+        tmp.replace(path)
+
+    def _known_files(self, game_id: str) -> dict[tuple[str, bytes, int, int], str]:
+        """Blob of each stored file of the manifests of a game, by (partition, group digest, offset, length)"""
+        known = {}
+        for name in self.manifest_names():
+            manifest = self.load_manifest(name)
+            if manifest.game_id != game_id:
+                continue
+            for partition, files in manifest.partitions.items():
+                for f in files:
+                    if f.group_digest is not None and self.has(f.sha1):
+                        known[(partition, f.group_digest, f.offset, f.length)] = f.sha1
+        return known
+
+    def _store_blob(self, read: Callable[[int, int], bytes], node: FSTFile, result: StoreResult) -> str:
+        """Stream a file into a temporary file while hashing it, and keep it if its blob is new"""
+        digest = hashlib.sha1()
+        with tempfile.NamedTemporaryFile(dir=self.tmp, delete=False) as tmp:
+            try:
+                position, end = node.offset, node.offset + node.length
+                while position < end:
+                    size = min(end, (position // GROUP_DATA_SIZE + 1) * GROUP_DATA_SIZE) - position
+                    data = read(position, size)
+                    digest.update(data)
+                    tmp.write(data)
+                    position += size
+            except BaseException:
+                tmp.close()
+                Path(tmp.name).unlink()
+                raise
+
+        sha1 = digest.hexdigest()
+        blob = self.blob_path(sha1)
+        stored = Path(tmp.name)
+        if blob.exists():
+            stored.unlink()
+            result.existing += 1
+        else:
+            blob.parent.mkdir(exist_ok=True)
+            # Blobs may be hardlinked into extracted trees: read-only, so editing a tree does not change the store
+            stored.chmod(0o444)
+            stored.replace(blob)
+            result.written += 1
+            result.bytes_written += node.length
+        return sha1
+
+    def add_disc(self, reader: WiiIsoReader, name: str, entries: list[WiiPartitionEntry] | None = None,
+                 progress_cb: Callable[[str], None] | None = None) -> StoreResult:
+        """
+        Extract the files of a disc into the store and save its manifest
+
+        :param reader: Opened image
+        :param name: Name of the manifest, replaced if it exists
+        :param entries: Partitions to extract, all of them if None
+        :param progress_cb: Called with the path of each file as it is stored
+        """
+        header = reader.disc_header
+        game_id = header.game_id.decode("ascii", "replace").strip("\x00")
+        manifest = DiscManifest(name, game_id, header.disc_version)
+        result = StoreResult(manifest)
+        known = self._known_files(game_id)
+
+        wanted = reader.partitions if entries is None else entries
+        for partition_name, entry in zip(partition_names(reader), reader.partitions, strict=True):
+            if entry not in wanted:
+                continue
+            partition = reader.open_partition(entry)
+            h3_table = read_h3_table(reader, partition)
+
+            files = manifest.partitions.setdefault(partition_name, [])
+            for path, node in sorted(file_nodes(partition.fst.entries), key=lambda file: file[1].offset):
+                groups = group_digest(h3_table, node.offset, node.length) if h3_table is not None else None
+                sha1 = known.get((partition_name, groups, node.offset, node.length)) if groups is not None else None
+                if sha1 is None:
+                    sha1 = self._store_blob(partition.crypto.read_at, node, result)
+                else:
+                    result.reused += 1
+                files.append(StoredFile(path, node.offset, node.length, sha1, groups))
+                if progress_cb:
+                    progress_cb(path)
+
+        self.save_manifest(manifest)
+        return result
+
+    def materialize(self, name: str, dest: str | Path, *, hardlink: bool = True) -> int:
+        """
+        Recreate the tree of an extracted disc: `dest/<partition>/<path>` for each file
+
+        :param name: Name of the manifest
+        :param dest: Output directory
+        :param hardlink: Hardlink the blobs instead of copying them. Falls back to a copy across file systems
+        :return: Number of files written
+        """
+        dest = Path(dest)
+        count = 0
+        for partition, files in self.load_manifest(name).partitions.items():
+            for f in files:
+                out = dest / partition / f.path
+                out.parent.mkdir(parents=True, exist_ok=True)
+                out.unlink(missing_ok=True)
+                blob = self.blob_path(f.sha1)
+                if hardlink:
+                    try:
+                        out.hardlink_to(blob)
+                    except OSError:
+                        shutil.copyfile(blob, out)
+                else:
+                    shutil.copyfile(blob, out)
+                count += 1
+        return count
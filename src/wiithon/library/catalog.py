@@ -0,0 +1,185 @@
+"""
+SQLite catalog of the discs of a library
+
+One row per disc image, keyed by path, with the size and modification time it had when it was scanned:
+a rescan only reads the images that are new or changed since
+"""
+import json
+import sqlite3
+from pathlib import Path
+
+CATALOG_VERSION: int = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS discs (
+    path        TEXT PRIMARY KEY,
+    size        INTEGER NOT NULL,
+    mtime_ns    INTEGER NOT NULL,
+    game_id     TEXT,
+    title       TEXT,
+    disc_number INTEGER,
+    version     INTEGER,
+    region      INTEGER,
+    partitions  TEXT,
+    has_fst     INTEGER NOT NULL DEFAULT 0,
+    file_count  INTEGER,
+    files_size  INTEGER,
+    error       TEXT
+);
+CREATE TABLE IF NOT EXISTS fst_files (
+    disc_path TEXT NOT NULL REFERENCES discs(path) ON DELETE CASCADE,
+    path      TEXT NOT NULL,
+    offset    INTEGER NOT NULL,
+    length    INTEGER NOT NULL,
+    PRIMARY KEY (disc_path, path)
+);
+CREATE INDEX IF NOT EXISTS discs_game_id ON discs(game_id);
+"""
+
+
+class DiscRecord:
+    """
+    What the scanner reads from one disc image
+
+    Attributes:
+        path        : Absolute path of the image
+        size        : Size of the file
+        mtime_ns    : Modification time of the file, in nanoseconds
+        game_id     : Game ID, like RMGE01
+        title       : Game title
+        disc_number : Disc number
+        version     : Disc version
+        region      : Region code
+        partitions  : Readable type of each partition, in partition table order
+        files       : (path, offset, length) of each file of the data partition, None if its FST was not read
+        error       : Why the image could not be read, None if it was
+    """
+    def __init__(self, path: str, size: int, mtime_ns: int, *, game_id: str | None = None,
+                 title: str | None = None, disc_number: int | None = None, version: int | None = None,
+                 region: int | None = None, partitions: list[str] | None = None,
+                 files: list[tuple[str, int, int]] | None = None, error: str | None = None) -> None:
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.game_id = game_id
+        self.title = title
+        self.disc_number = disc_number
+        self.version = version
+        self.region = region
+        self.partitions: list[str] = partitions or []
+        self.files = files
+        self.error = error
+
+    def to_dict(self) -> dict:
+        data = {
+            "path": self.path, "size": self.size, "game_id": self.game_id, "title": self.title,
+            "disc_number": self.disc_number, "version": self.version, "region": self.region,
+            "partitions": self.partitions, "error": self.error,
+        }
+        if self.files is not None:
+            data["file_count"] = len(self.files)
+            data["files_size"] = sum(length for _, _, length in self.files)
+        return data
+
+    def __repr__(self) -> str:
+        return f"DiscRecord({self.path}, {self.game_id}, {self.title!r})"
+
+
+class LibraryCatalog:
+    def __init__(self, path: str | Path) -> None:
+        """
+        :param path: Catalog database, created if needed. ":memory:" for a temporary one
+        """
+        self.path = path
+        self.connection = sqlite3.connect(str(path))
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        with self.connection:
+            self.connection.executescript(_SCHEMA)
+            self.connection.execute(f"PRAGMA user_version = {CATALOG_VERSION}")
+
+    def is_current(self, path: str, size: int, mtime_ns: int, *, with_fst: bool = False) -> bool:
+        """
+        Whether the catalog holds an up-to-date record of an image
+
+        :param path: Absolute path of the image
+        :param size: Current size of the file
+        :param mtime_ns: Current modification time of the file
+        :param with_fst: The record must also hold the files of the data partition
+        """
+        row = self.connection.execute(
+            "SELECT size, mtime_ns, has_fst, error FROM discs WHERE path = ?", (path,)
+        ).fetchone()
+        if row is None or row[0] != size or row[1] != mtime_ns:
+            return False
+        return not with_fst or bool(row[2]) or row[3] is not None
+
+    def put(self, record: DiscRecord) -> None:
+        """Add or replace the record of an image"""
+        with self.connection:
+            self.connection.execute("DELETE FROM discs WHERE path = ?", (record.path,))
+            files = record.files or []
+            self.connection.execute(
+                "INSERT INTO discs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (record.path, record.size, record.mtime_ns, record.game_id, record.title, record.disc_number,
+                 record.version, record.region, json.dumps(record.partitions), int(record.files is not None),
+                 len(files) if record.files is not None else None,
+                 sum(length for _, _, length in files) if record.files is not None else None,
+                 record.error),
+            )
+            self.connection.executemany(
+                "INSERT INTO fst_files VALUES (?, ?, ?, ?)",
+                ((record.path, path, offset, length) for path, offset, length in files),
+            )
+
+    def remove(self, path: str) -> None:
+        with self.connection:
+            self.connection.execute("DELETE FROM discs WHERE path = ?", (path,))
+
+    def paths(self, root: str | Path | None = None) -> list[str]:
+        """
+        Paths of the cataloged images
+
+        :param root: Only the images under this directory
+        """
+        paths = [row[0] for row in self.connection.execute("SELECT path FROM discs ORDER BY path")]
+        if root is None:
+            return paths
+        root = Path(root)
+        return [path for path in paths if Path(path).is_relative_to(root)]
+
+    def get(self, path: str) -> DiscRecord | None:
+        row = self.connection.execute("SELECT * FROM discs WHERE path = ?", (path,)).fetchone()
+        return None if row is None else self._record(row)
+
+    def discs(self, game_id: str | None = None) -> list[DiscRecord]:
+        """
+        Every cataloged image, by path
+
+        :param game_id: Only the images of this game ID
+        """
+        if game_id is None:
+            rows = self.connection.execute("SELECT * FROM discs ORDER BY path")
+        else:
+            rows = self.connection.execute("SELECT * FROM discs WHERE game_id = ? ORDER BY path", (game_id,))
+        return [self._record(row) for row in rows.fetchall()]
+
+    def _record(self, row: tuple) -> DiscRecord:
+        (path, size, mtime_ns, game_id, title, disc_number, version, region, partitions, has_fst,
+         _, _, error) = row
+        files = None
+        if has_fst:
+            files = [tuple(file) for file in self.connection.execute(
+                "SELECT path, offset, length FROM fst_files WHERE disc_path = ? ORDER BY offset", (path,)
+            )]
+        return DiscRecord(path, size, mtime_ns, game_id=game_id, title=title, disc_number=disc_number,
+                          version=version, region=region, partitions=json.loads(partitions or "[]"),
+                          files=files, error=error)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> "LibraryCatalog":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
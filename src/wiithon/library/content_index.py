@@ -0,0 +1,237 @@
+"""
+Cross-disc index of the content of every file
+
+Each file of each partition is stored with the SHA-1 of its content, so the index tells which discs hold a given
+file and what differs between two discs without reading any image again.
+
+Computing the SHA-1 of a file means decrypting it. The H3 table of a partition holds one hash per group, covering
+every byte of the group: a file at the same offset, with the same length and spanning groups with the same H3 hashes
+has the same content as a file already indexed, on this disc or on another one, and is not read
+"""
+import hashlib
+import sqlite3
+from collections.abc import Callable
+from pathlib import Path
+
+from wiithon.crypto.layout import GROUP_DATA_SIZE
+from wiithon.disc.group_digests import group_digest, read_h3_table
+from wiithon.disc.partition import WiiPartitionInfo
+from wiithon.disc.reader import WiiIsoReader
+from wiithon.fst.node import FSTFile
+from wiithon.fst.operations import file_nodes
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS indexed_discs (
+    path     TEXT PRIMARY KEY,
+    size     INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    game_id  TEXT,
+    version  INTEGER
+);
+CREATE TABLE IF NOT EXISTS file_digests (
+    disc_path    TEXT NOT NULL REFERENCES indexed_discs(path) ON DELETE CASCADE,
+    partition    TEXT NOT NULL,
+    path         TEXT NOT NULL,
+    offset       INTEGER NOT NULL,
+    length       INTEGER NOT NULL,
+    group_digest BLOB,
+    sha1         TEXT NOT NULL,
+    PRIMARY KEY (disc_path, partition, path)
+);
+CREATE INDEX IF NOT EXISTS file_digests_sha1 ON file_digests(sha1);
+CREATE INDEX IF NOT EXISTS file_digests_groups ON file_digests(group_digest, offset, length);
+"""
+
+
+class IndexResult:
+    """
+    Attributes:
+        path     : Indexed image
+        skipped  : Whether the image was not read, being unchanged since it was indexed
+        hashed   : Files whose content was read and digested
+        reused   : Files whose digest was taken from the index, their groups being unchanged
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.skipped = False
+        self.hashed = 0
+        self.reused = 0
+
+    def to_dict(self) -> dict:
+        return {"path": self.path, "skipped": self.skipped, "hashed": self.hashed, "reused": self.reused}
+
+
+class DiscDiff:
+    """
+    Files that differ between two indexed discs, as (partition, path)
+
+    Attributes:
+        added   : Only on the second disc
+        removed : Only on the first disc
+        changed : On both discs, with another content
+    """
+    def __init__(self) -> None:
+        self.added: list[tuple[str, str]] = []
+        self.removed: list[tuple[str, str]] = []
+        self.changed: list[tuple[str, str]] = []
+
+    def to_dict(self) -> dict:
+        return {
+            name: [f"{partition}/{path}" for partition, path in entries]
+            for name, entries in (("added", self.added), ("removed", self.removed), ("changed", self.changed))
+        }
+
+
+def partition_names(reader: WiiIsoReader) -> list[str]:
+    """Name of each partition: its type, numbered when the disc has several partitions of that type"""
+    types = [entry.get_readable_part_type() for entry in reader.partitions]
+    names = []
+    for i, part_type in enumerate(types):
+        if types.count(part_type) > 1:
+            part_type = f"{part_type}-{types[:i].count(part_type)}"
+        names.append(part_type)
+    return names
+
+
+def file_sha1(partition: WiiPartitionInfo, node: FSTFile) -> str:
+    """SHA-1 of a file, read one group at a time"""
+    digest = hashlib.sha1()
+    position, end = node.offset, node.offset + node.length
+    while position < end:
+        size = min(end, (position // GROUP_DATA_SIZE + 1) * GROUP_DATA_SIZE) - position
+        digest.update(partition.crypto.read_at(position, size))
+        position += size
+    return digest.hexdigest()
+
+
+class ContentIndex:
+    def __init__(self, path: str | Path) -> None:
+        """
+        :param path: Index database, created if needed. It can be the database of a `LibraryCatalog`
+        """
+        self.path = path
+        self.connection = sqlite3.connect(str(path))
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        with self.connection:
+            self.connection.executescript(_SCHEMA)
+
+    def _known_digest(self, offset: int, length: int, digest: bytes) -> str | None:
+        row = self.connection.execute(
+            "SELECT sha1 FROM file_digests WHERE group_digest = ? AND offset = ? AND length = ? LIMIT 1",
+            (digest, offset, length),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def index_disc(self, path: str | Path, progress_cb: Callable[[str], None] | None = None,
+                   *, force: bool = False) -> IndexResult:
+        """
+        Index the files of every partition of an image
+
+        :param path: Image, in any container
+        :param progress_cb: Called with the path of each file as it is indexed
+        :param force: Read the image even if it did not change since it was indexed
+        """
+        path = str(Path(path).resolve())
+        result = IndexResult(path)
+        stat = Path(path).stat()
+        row = self.connection.execute("SELECT size, mtime_ns FROM indexed_discs WHERE path = ?", (path,)).fetchone()
+        if not force and row == (stat.st_size, stat.st_mtime_ns):
+            result.skipped = True
+            return result
+
+        with WiiIsoReader(path) as reader:
+            rows: list[tuple] = []
+            for name, entry in zip(partition_names(reader), reader.partitions, strict=True):
+                partition = reader.open_partition(entry)
+                h3_table = read_h3_table(reader, partition)
+
+                files = sorted(file_nodes(partition.fst.entries), key=lambda file: file[1].offset)
+                for file_path, node in files:
+                    digest = group_digest(h3_table, node.offset, node.length) if h3_table is not None else None
+                    sha1 = self._known_digest(node.offset, node.length, digest) if digest is not None else None
+                    if sha1 is None:
+                        sha1 = file_sha1(partition, node)
+                        result.hashed += 1
+                    else:
+                        result.reused += 1
+                    rows.append((path, name, file_path, node.offset, node.length, digest, sha1))
+                    if progress_cb:
+                        progress_cb(file_path)
+
+            header = reader.disc_header
+            with self.connection:
+                self.connection.execute("DELETE FROM indexed_discs WHERE path = ?", (path,))
+                self.connection.execute(
+                    "INSERT INTO indexed_discs VALUES (?, ?, ?, ?, ?)",
+                    (path, stat.st_size, stat.st_mtime_ns, header.game_id.decode("ascii", "replace").strip("\x00"),
+                     header.disc_version),
+                )
+                self.connection.executemany("INSERT INTO file_digests VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        return result
+
+    def remove(self, path: str | Path) -> None:
+        with self.connection:
+            self.connection.execute("DELETE FROM indexed_discs WHERE path = ?", (str(Path(path).resolve()),))
+
+    def discs(self) -> list[str]:
+        return [row[0] for row in self.connection.execute("SELECT path FROM indexed_discs ORDER BY path")]
+
+    def files(self, disc: str | Path) -> dict[tuple[str, str], str]:
+        """SHA-1 of every file of a disc, by (partition, path)"""
+        rows = self.connection.execute(
+            "SELECT partition, path, sha1 FROM file_digests WHERE disc_path = ?", (str(Path(disc).resolve()),)
+        )
+        return {(partition, path): sha1 for partition, path, sha1 in rows}
+
+    def find_blob(self, sha1: str) -> list[tuple[str, str, str]]:
+        """
+        Every file with a given content
+
+        :param sha1: Hex SHA-1 of the content
+        :return: (disc path, partition, file path) of each file
+        """
+        return [tuple(row) for row in self.connection.execute(
+            "SELECT disc_path, partition, path FROM file_digests WHERE sha1 = ? ORDER BY disc_path, partition, path",
+            (sha1.lower(),),
+        )]
+
+    def shared_blobs(self, min_discs: int = 2) -> dict[str, list[str]]:
+        """
+        Contents found on several discs
+
+        :param min_discs: Minimum number of discs holding the content
+        :return: Paths of the discs holding each content, by SHA-1
+        """
+        rows = self.connection.execute(
+            "SELECT DISTINCT sha1, disc_path FROM file_digests WHERE sha1 IN ("
+            "SELECT sha1 FROM file_digests GROUP BY sha1 HAVING COUNT(DISTINCT disc_path) >= ?"
+            ") ORDER BY sha1, disc_path",
+            (min_discs,),
+        )
+        blobs: dict[str, list[str]] = {}
+        for sha1, disc in rows:
+            blobs.setdefault(sha1, []).append(disc)
+        return blobs
+
+    def diff(self, first: str | Path, second: str | Path) -> DiscDiff:
+        """
+        Files that differ between two indexed discs, compared by partition name and path
+
+        :param first: Reference disc
+        :param second: Disc compared to it
+        """
+        before, after = self.files(first), self.files(second)
+        result = DiscDiff()
+        result.removed = sorted(key for key in before if key not in after)
+        result.added = sorted(key for key in after if key not in before)
+        result.changed = sorted(key for key, sha1 in before.items() if key in after and after[key] != sha1)
+        return result
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> "ContentIndex":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
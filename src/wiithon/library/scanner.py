@@ -0,0 +1,125 @@
+"""
+Scan a directory of disc images into a `LibraryCatalog`
+
+Only the disc header, the partition table and the region are read from each image, plus the FST of the data
+partition when asked for. The images are scanned by a process pool, and the ones the catalog already holds with the
+same size and modification time are not opened at all
+"""
+import os
+from collections.abc import Callable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from wiithon.disc.reader import WiiIsoReader
+from wiithon.exceptions import WiithonError
+from wiithon.fst.operations import file_nodes
+from wiithon.library.catalog import DiscRecord, LibraryCatalog
+
+DISC_EXTENSIONS: frozenset[str] = frozenset({".iso", ".wbfs", ".ciso", ".gcz", ".wci"})
+
+
+class ScanResult:
+    """
+    Attributes:
+        scanned   : Images read, new or changed since the last scan
+        unchanged : Images skipped, the catalog holding them already
+        removed   : Images gone from the directory, removed from the catalog
+        failed    : Scanned images that could not be read, their error is in the catalog
+    """
+    def __init__(self) -> None:
+        self.scanned: list[str] = []
+        self.unchanged: list[str] = []
+        self.removed: list[str] = []
+        self.failed: list[str] = []
+
+    def to_dict(self) -> dict:
+        return {"scanned": self.scanned, "unchanged": self.unchanged, "removed": self.removed, "failed": self.failed}
+
+
+def scan_disc(path: str, size: int, mtime_ns: int, *, with_fst: bool = False) -> DiscRecord:
+    """
+    Read the metadata of one image. Runs in a worker process
+
+    :param path: Absolute path of the image
+    :param size: Size of the file, stored in the record
+    :param mtime_ns: Modification time of the file, stored in the record
+    :param with_fst: Also read the files of the data partition
+    :return: The record, with `error` set if the image could not be read
+    """
+    try:
+        with WiiIsoReader(path) as reader:
+            header = reader.disc_header
+            record = DiscRecord(
+                path, size, mtime_ns,
+                game_id=header.game_id.decode("ascii", "replace").strip("\x00"),
+                title=header.game_title.strip(),
+                disc_number=header.disc_num,
+                version=header.disc_version,
+                region=int.from_bytes(reader.region[:4], "big"),
+                partitions=[entry.get_readable_part_type() for entry in reader.partitions],
+            )
+            entry = reader.get_data_partition()
+            if with_fst and entry is not None:
+                record.files = [(path, node.offset, node.length)
+                                for path, node in file_nodes(reader.open_partition(entry).fst.entries)]
+            return record
+    except (WiithonError, OSError, ValueError) as e:
+        return DiscRecord(path, size, mtime_ns, error=f"{type(e).__name__}: {e}")
+
+
+def find_discs(root: str | Path) -> Iterator[Path]:
+    """Disc images under a directory, by extension"""
+    for directory, _, names in os.walk(root):
+        for name in sorted(names):
+            if Path(name).suffix.lower() in DISC_EXTENSIONS:
+                yield Path(directory, name)
+
+
+def scan_library(root: str | Path, catalog: LibraryCatalog, progress_cb: Callable[[DiscRecord], None] | None = None,
+                 *, with_fst: bool = False, jobs: int | None = None) -> ScanResult:
+    """
+    Bring the catalog up to date with the images under a directory
+
+    :param root: Directory holding the images, searched recursively
+    :param catalog: Catalog to update
+    :param progress_cb: Called with the record of each scanned image
+    :param with_fst: Also catalog the files of the data partition of each image
+    :param jobs: Worker processes. None for one per CPU, 1 to scan in this process
+    """
+    root = Path(root).resolve()
+    result = ScanResult()
+
+    todo: list[tuple[str, int, int]] = []
+    seen: set[str] = set()
+    for disc in find_discs(root):
+        stat = disc.stat()
+        path = str(disc)
+        seen.add(path)
+        if catalog.is_current(path, stat.st_size, stat.st_mtime_ns, with_fst=with_fst):
+            result.unchanged.append(path)
+        else:
+            todo.append((path, stat.st_size, stat.st_mtime_ns))
+
+    for path in catalog.paths(root):
+        if path not in seen:
+            catalog.remove(path)
+            result.removed.append(path)
+
+    def store(record: DiscRecord) -> None:
+        catalog.put(record)
+        result.scanned.append(record.path)
+        if record.error is not None:
+            result.failed.append(record.path)
+        if progress_cb:
+            progress_cb(record)
+
+    if jobs == 1 or len(todo) <= 1:
+        for path, size, mtime_ns in todo:
+            store(scan_disc(path, size, mtime_ns, with_fst=with_fst))
+        return result
+
+    with ProcessPoolExecutor(jobs) as pool:
+        futures = [pool.submit(scan_disc, path, size, mtime_ns, with_fst=with_fst) for path, size, mtime_ns in todo]
+        for future in futures:
+            store(future.result())
+    return result
@@ -35,6 +35,27 @@ class TestIsoExtract(IsoCliTestCase):
         self.assertEqual(result.exit_code, 0)
         self.assertTrue((dest / "data" / "saint_bernard.jpg").is_file())
 
+    def test_store_shares_blobs_between_extractions(self):
+        root = self.temp_dir()
+        for dest in ("first", "second"):
+            result = self.invoke("iso", "extract", self.iso, str(root / dest), "--store", str(root / "store"))
+            self.assertEqual(result.exit_code, 0)
+
+        first, second = root / "first" / "data" / "saint_bernard.jpg", root / "second" / "data" / "saint_bernard.jpg"
+        self.assertEqual(first.stat().st_ino, second.stat().st_ino)
+        self.assertIn("0 new blob(s)", result.stdout)
+
+    def test_deep_keeps_plain_files(self):
+        dest = self.temp_dir()
+        result = self.invoke("iso", "extract", self.iso, str(dest), "--deep")
+        self.assertEqual(result.exit_code, 0)
+        self.assertTrue((dest / "data" / "saint_bernard.jpg").is_file())
+        self.assertIn("packed file(s) unpacked", result.stdout)
+
+    def test_deep_is_not_incremental(self):
+        result = self.invoke("iso", "extract", self.iso, str(self.temp_dir()), "--deep", "--incremental")
+        self.assertEqual(result.exit_code, 1)
+
 class TestIsoCat(IsoCliTestCase):
 
     def test_cat_writes_raw_bytes_when_piped(self):
@@ -42,6 +63,12 @@ class TestIsoCat(IsoCliTestCase):
         self.assertEqual(result.exit_code, 0)
         self.assertTrue(result.stdout_bytes.startswith(b"\xff\xd8\xff"))
 
+    def test_byte_range(self):
+        whole = self.invoke("iso", "cat", self.iso, "saint_bernard.jpg").stdout_bytes
+        result = self.invoke("iso", "cat", self.iso, "saint_bernard.jpg", "--offset", "2", "--length", "8")
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.stdout_bytes, whole[2:10])
+
     def test_unknown_path_exits_with_1(self):
         result = self.invoke("iso", "cat", self.iso, "nope.bin")
         self.assertEqual(result.exit_code, 1)
@@ -51,6 +78,18 @@ class TestIsoCat(IsoCliTestCase):
         self.assertEqual(result.exit_code, 0)
 
 
+class TestIsoGrep(IsoCliTestCase):
+
+    def test_finds_hex_pattern(self):
+        result = self.invoke("iso", "grep", self.iso, "ffd8ff", "--hex", "--json")
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('"path": "saint_bernard.jpg"', result.stdout)
+
+    def test_no_match_exits_with_1(self):
+        result = self.invoke("iso", "grep", self.iso, "no such bytes on this disc", "-j", "1")
+        self.assertEqual(result.exit_code, 1)
+
+
 class TestIsoExtractFile(IsoCliTestCase):
 
     def test_extracts_a_single_file(self):
@@ -65,5 +104,26 @@ class TestIsoExtractFile(IsoCliTestCase):
         result = self.invoke("iso", "extract", self.iso, str(dest), "--file", "nope.bin")
         self.assertEqual(result.exit_code, 1)
 
+
+class TestIsoScrub(IsoCliTestCase):
+
+    def test_usage_json(self):
+        result = self.invoke("iso", "usage", self.iso, "--json")
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('"used_blocks"', result.stdout)
+
+    def test_scrubbed_image_keeps_files(self):
+        output = self.temp_dir() / "scrubbed.iso"
+        result = self.invoke("iso", "scrub", self.iso, str(output))
+        self.assertEqual(result.exit_code, 0)
+
+        result = self.invoke("iso", "cat", str(output), "saint_bernard.jpg")
+        self.assertEqual(result.exit_code, 0)
+        self.assertTrue(result.stdout_bytes.startswith(b"\xff\xd8\xff"))
+
+    def test_scrub_into_itself_exits_with_1(self):
+        result = self.invoke("iso", "scrub", self.iso, self.iso)
+        self.assertEqual(result.exit_code, 1)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,84 @@
+"""Small partition sources, to build whole images in tests"""
+from pathlib import Path
+
+from wiithon.builder.disc_builder import WiiDiscBuilder
+from wiithon.builder.source import PartitionSource
+from wiithon.disc.enums import WiiPartType
+from wiithon.disc.structs.certificate import Certificate
+from wiithon.disc.structs.disc_header import DiscHeader
+from wiithon.disc.structs.signature import KeyType, SignatureType
+from wiithon.disc.structs.ticket import Ticket
+from wiithon.disc.structs.ticket_time_limit import TicketTimeLimit
+from wiithon.disc.structs.tmd import TMD
+from wiithon.fst.node import FSTFile
+from wiithon.fst.tree import FST
+
+
+def disc_header() -> DiscHeader:
+    header = DiscHeader()
+    header.game_id = b"RTST01"
+    header.game_title = "TEST"
+    header.wii_magic_word = 0x5D1C9EA3
+    return header
+
+
+class FilesSource(PartitionSource):
+    """Data partition holding files at the root"""
+    def __init__(self, files: dict[str, bytes]) -> None:
+        self.files = files
+        self.ticket = Ticket()
+        self.ticket.signature_type = SignatureType.RSA_2048
+        self.ticket.title_id = b"\x00\x01\x00\x00RTST"
+        self.ticket.title_key = bytes(range(16))
+        self.ticket.time_limit = [TicketTimeLimit() for _ in range(8)]
+        self.tmd = TMD()
+        self.tmd.signature_type = SignatureType.RSA_2048
+        self.fst = FST()
+        self.fst.entries = [FSTFile(name, 0, len(data)) for name, data in files.items()]
+
+    def get_partition_type(self) -> int:
+        return WiiPartType.DATA
+
+    def get_tmd(self) -> TMD:
+        return self.tmd
+
+    def get_certificates(self) -> list[Certificate]:
+        certificates = []
+        # A partition holds the chain of 3 certificates
+        for _ in range(3):
+            certificate = Certificate()
+            certificate.signature_type = SignatureType.RSA_2048
+            certificate.signature = b"\x01" * 0x100
+            certificate.key_type = KeyType.RSA_2048
+            certificate.key = b"\x02" * 0x100
+            certificates.append(certificate)
+        return certificates
+
+    def get_encrypted_header(self) -> DiscHeader:
+        return disc_header()
+
+    def get_bi2(self) -> bytes:
+        return bytes(0x2000)
+
+    def get_apploader(self) -> bytes:
+        return bytes(0x20)
+
+    def get_dol(self) -> bytes:
+        return bytes(0x100)
+
+    def get_fst(self) -> FST:
+        return self.fst
+
+    def get_ticket(self) -> Ticket:
+        return self.ticket
+
+    def get_file_data(self, path: list[str]) -> bytes:
+        return self.files["/".join(path)]
+
+
+def build_image(path: str | Path, files: dict[str, bytes]) -> None:
+    """Build an image with one data partition holding `files`"""
+    builder = WiiDiscBuilder(disc_header(), bytes(0x20))
+    with Path(path).open("w+b") as stream:
+        builder.add_partition(stream, FilesSource(files), None)
+        builder.finish(stream)
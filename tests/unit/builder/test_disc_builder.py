@@ -0,0 +1,39 @@
+import os
+import unittest
+from io import BytesIO
+
+from tests.unit.builder._source import FilesSource, disc_header
+
+from wiithon.builder.disc_builder import WiiDiscBuilder
+from wiithon.builder.manifest import IncrementalBuild
+
+
+def _build(stream: BytesIO, files: dict[str, bytes], incremental: IncrementalBuild | None = None) -> WiiDiscBuilder:
+    builder = WiiDiscBuilder(disc_header(), bytes(0x20), incremental=incremental, record_manifest=True)
+    builder.add_partition(stream, FilesSource(files), None)
+    builder.finish(stream)
+    stream.truncate(builder.current_data_offset)
+    return builder
+
+
+class TestInPlaceBuild(unittest.TestCase):
+
+    def test_matches_a_new_build(self):
+        same = os.urandom(5_000_000)
+        previous = BytesIO()
+        first = _build(previous, {"same.bin": same, "big.bin": os.urandom(5_000_000),
+                                  "removed.bin": os.urandom(300_000)})
+
+        # Shorter files and fewer of them: the end of their last group, and the groups past them, were data
+        files = {"same.bin": same, "big.bin": os.urandom(1_000_003)}
+        fresh = BytesIO()
+        _build(fresh, files)
+
+        incremental = IncrementalBuild(first.manifest)
+        _build(previous, files, incremental)
+        self.assertEqual(previous.getvalue(), fresh.getvalue())
+        self.assertGreater(incremental.reused, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
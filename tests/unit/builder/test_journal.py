@@ -0,0 +1,208 @@
+import os
+import tempfile
+import unittest
+from io import BytesIO
+from pathlib import Path
+
+from tests.unit.builder._source import build_image
+
+from wiithon.builder.disc_builder import WiiDiscBuilder
+from wiithon.builder.journal import BuildJournal, PartitionJournal
+from wiithon.crypto.layout import GROUP_DATA_SIZE, GROUP_SIZE
+from wiithon.crypto.part_writer import CryptPartWriter
+from wiithon.disc.patcher import WiiIsoPatcher
+from wiithon.fst.node import FSTFile
+
+TITLE_KEY = bytes(range(16))
+
+
+class _JournalTestCase(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "out.iso.journal"
+
+    def reopen(self, journal: BuildJournal) -> BuildJournal:
+        journal.close()
+        reopened = BuildJournal(self.path)
+        self.addCleanup(reopened.close)
+        return reopened
+
+
+class TestPartitionJournal(unittest.TestCase):
+
+    def test_committed_groups_is_the_leading_run(self):
+        state = PartitionJournal(0)
+        state.groups = {0: (b'', b''), 1: (b'', b''), 3: (b'', b'')}
+        self.assertEqual(state.committed_groups(), 2)
+
+    def test_no_group(self):
+        self.assertEqual(PartitionJournal(0).committed_groups(), 0)
+
+
+class TestBuildJournal(_JournalTestCase):
+
+    def test_path_for(self):
+        self.assertEqual(BuildJournal.path_for("out/game.iso"), Path("out/game.iso.journal"))
+
+    def test_state_survives_reopening(self):
+        journal = BuildJournal(self.path)
+        journal.begin_partition(0, 0x70000)
+        journal.record_file(0, 0, "a.bin", 0x480, 0x10, "ab")
+        journal.commit_group(0, 0, b'\x01' * 20, b'\x02' * 32, BytesIO())
+
+        state = self.reopen(journal).resume_state(0, 0x70000)
+        self.assertEqual(state.files, {0: ("a.bin", 0x480, 0x10, "ab")})
+        self.assertEqual(state.groups, {0: (b'\x01' * 20, b'\x02' * 32)})
+
+    def test_other_data_offset_is_not_resumed(self):
+        journal = BuildJournal(self.path)
+        journal.begin_partition(0, 0x70000)
+        journal.commit_group(0, 0, b'\x01' * 20, b'\x02' * 32, BytesIO())
+        self.assertIsNone(self.reopen(journal).resume_state(0, 0x80000))
+
+    def test_moved_partition_starts_over(self):
+        journal = BuildJournal(self.path)
+        journal.begin_partition(0, 0x70000)
+        journal.commit_group(0, 0, b'\x01' * 20, b'\x02' * 32, BytesIO())
+        journal.begin_partition(0, 0x80000)
+        self.assertEqual(self.reopen(journal).resume_state(0, 0x80000).groups, {})
+
+    def test_cut_last_line_is_ignored(self):
+        journal = BuildJournal(self.path)
+        journal.begin_partition(0, 0x70000)
+        journal.commit_group(0, 0, b'\x01' * 20, b'\x02' * 32, BytesIO())
+        journal.close()
+        with self.path.open("a") as f:
+            f.write('{"type": "group", "partition": 0, "gr')
+
+        self.assertEqual(len(self.reopen(journal).resume_state(0, 0x70000).groups), 1)
+
+    def test_committed_size(self):
+        journal = BuildJournal(self.path)
+        self.addCleanup(journal.close)
+        journal.begin_partition(0, 0x70000)
+        for group in range(3):
+            journal.commit_group(0, group, b'\x00' * 20, b'\x00' * 32, BytesIO())
+        self.assertEqual(journal.committed_size(), 0x70000 + 3 * GROUP_SIZE)
+
+    def test_discard_deletes_the_file(self):
+        journal = BuildJournal(self.path)
+        journal.discard()
+        self.assertFalse(self.path.exists())
+
+
+    def test_other_inputs_start_over(self):
+        journal = BuildJournal(self.path, fingerprint="a")
+        journal.begin_partition(0, 0x70000)
+        journal.commit_group(0, 0, b'\x01' * 20, b'\x02' * 32, BytesIO())
+        journal.close()
+
+        same = BuildJournal(self.path, fingerprint="a")
+        self.assertEqual(len(same.resume_state(0, 0x70000).groups), 1)
+        same.close()
+
+        other = BuildJournal(self.path, fingerprint="b")
+        self.addCleanup(other.close)
+        self.assertIsNone(other.resume_state(0, 0x70000))
+        self.assertEqual(other.committed_size(), 0)
+        self.assertIsNone(self.reopen(other).resume_state(0, 0x70000))
+
+
+class TestResumedBuild(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        self.source = self.root / "source.iso"
+        build_image(self.source, {"big.bin": os.urandom(5_243_003), "last.bin": os.urandom(100_000)})
+
+    def _build(self, output: Path, big: bytes, *, interrupt: bool = False) -> None:
+        def progress(percent: int) -> None:
+            # Once big.bin is written and its groups committed
+            if interrupt and percent == 100:
+                raise KeyboardInterrupt
+
+        with WiiIsoPatcher(str(self.source)) as patcher:
+            patcher.replace_file("big.bin", big)
+            patcher.build(str(output), progress, resumable=True)
+
+    def test_changed_override_is_not_resumed(self):
+        output = self.root / "out.iso"
+        with self.assertRaises(KeyboardInterrupt):
+            self._build(output, os.urandom(5_243_003), interrupt=True)
+        self.assertTrue(BuildJournal.path_for(output).exists())
+
+        self._build(output, b"NEWDATA" * 10)
+        expected = self.root / "expected.iso"
+        self._build(expected, b"NEWDATA" * 10)
+
+        self.assertEqual(output.read_bytes(), expected.read_bytes())
+        with WiiIsoPatcher(str(output)) as patcher:
+            self.assertEqual(patcher.read_file("big.bin"), b"NEWDATA" * 10)
+
+
+class TestWriterJournaling(unittest.TestCase):
+
+    def test_on_flush_called_per_group(self):
+        flushed = []
+        writer = CryptPartWriter(BytesIO(), 0, TITLE_KEY, on_flush=lambda *args: flushed.append(args))
+        writer.write(b'\x01' * (GROUP_DATA_SIZE + 1))
+        writer.close()
+
+        self.assertEqual([group for group, _, _ in flushed], [0, 1])
+        self.assertEqual(flushed[0][1], writer.get_h3_table()[:20])
+
+    def test_restore_groups(self):
+        writer = CryptPartWriter(BytesIO(), 0, TITLE_KEY)
+        writer.restore_groups({1: (b'\x07' * 20, b'\x08' * 32)})
+        self.assertEqual(writer.get_h3_table()[20:40], b'\x07' * 20)
+        self.assertEqual(writer.group_digests[1], b'\x08' * 32)
+
+
+class TestSkipCommittedFiles(unittest.TestCase):
+
+    def _files(self):
+        return [([], FSTFile("a.bin")), (["dir"], FSTFile("b.bin")), ([], FSTFile("c.bin"))]
+
+    def _resume(self, committed_groups: int) -> PartitionJournal:
+        state = PartitionJournal(0)
+        state.files = {
+            0: ("a.bin", 0x100, GROUP_DATA_SIZE, "aa"),
+            1: ("dir/b.bin", 0x100 + GROUP_DATA_SIZE, 0x40, "bb"),
+            2: ("c.bin", 0x140 + GROUP_DATA_SIZE, GROUP_DATA_SIZE, "cc"),
+        }
+        state.groups = dict.fromkeys(range(committed_groups), (b'\x00' * 20, b'\x00' * 32))
+        return state
+
+    def _skip(self, files, resume, position=0x100):
+        writer = CryptPartWriter(BytesIO(), 0, TITLE_KEY)
+        writer.seek(position)
+        records = []
+        result = WiiDiscBuilder._skip_committed_files(writer, files, resume, records)
+        return result, writer.tell(), records
+
+    def test_skips_files_in_committed_groups(self):
+        files = self._files()
+        (skipped, skipped_bytes), position, records = self._skip(files, self._resume(2))
+
+        self.assertEqual(skipped, 2)
+        self.assertEqual(skipped_bytes, GROUP_DATA_SIZE + 0x40)
+        self.assertEqual(position, 0x140 + GROUP_DATA_SIZE)
+        self.assertEqual(files[1][1].offset, 0x100 + GROUP_DATA_SIZE)
+        self.assertEqual([r.digest for r in records], ["aa", "bb"])
+
+    def test_stops_at_uncommitted_group(self):
+        (skipped, _), position, _ = self._skip(self._files(), self._resume(1))
+        self.assertEqual(skipped, 0)
+        self.assertEqual(position, 0x100)
+
+    def test_stops_when_layout_differs(self):
+        files = self._files()
+        files[1] = (["other"], FSTFile("b.bin"))
+        (skipped, _), _, _ = self._skip(files, self._resume(3))
+        self.assertEqual(skipped, 1)
+
+        (skipped, _), _, _ = self._skip(self._files(), self._resume(3), position=0x200)
+        self.assertEqual(skipped, 0)
@@ -0,0 +1,124 @@
+import tempfile
+import unittest
+from io import BytesIO
+from pathlib import Path
+from unittest.mock import patch
+
+from wiithon.builder.manifest import BuildManifest, FileRecord, IncrementalBuild, PartitionManifest
+from wiithon.crypto.layout import GROUP_DATA_SIZE, GROUP_SIZE
+from wiithon.crypto.part_writer import CryptPartWriter
+from wiithon.exceptions import InvalidFormatError
+
+TITLE_KEY = bytes(range(16))
+
+
+def _write(stream: BytesIO, data: bytes, **kwargs) -> CryptPartWriter:
+    writer = CryptPartWriter(stream, 0, TITLE_KEY, record_digests=True, **kwargs)
+    writer.write(data)
+    writer.close()
+    return writer
+
+
+def _manifest_of(writer: CryptPartWriter, groups: int) -> BuildManifest:
+    part = PartitionManifest(writer.data_offset, TITLE_KEY)
+    h3 = writer.get_h3_table()
+    part.groups = [(writer.group_digests[g], h3[g * 20:(g + 1) * 20]) for g in range(groups)]
+    manifest = BuildManifest()
+    manifest.partitions.append(part)
+    return manifest
+
+
+class TestBuildManifest(unittest.TestCase):
+
+    def test_path_for(self):
+        self.assertEqual(BuildManifest.path_for("out/game.iso"), Path("out/game.iso.manifest.json"))
+
+    def test_save_load_round_trip(self):
+        part = PartitionManifest(0x70000, TITLE_KEY)
+        part.files.append(FileRecord("dir/a.bin", 0x480, 0x10, "ab" * 32))
+        part.groups.append((b'\x01' * 32, b'\x02' * 20))
+        manifest = BuildManifest()
+        manifest.partitions.append(part)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "m.json"
+            manifest.save(path)
+            loaded = BuildManifest.load(path)
+
+        self.assertEqual(loaded.partitions[0].to_dict(), part.to_dict())
+
+    def test_load_rejects_other_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "m.json"
+            path.write_text("{}")
+            with self.assertRaises(InvalidFormatError):
+                BuildManifest.load(path)
+            path.write_text("not json")
+            with self.assertRaises(InvalidFormatError):
+                BuildManifest.load(path)
+
+
+class TestIncrementalBuild(unittest.TestCase):
+
+    def setUp(self):
+        self.data = bytes([1]) * GROUP_DATA_SIZE + bytes([2]) * GROUP_DATA_SIZE
+        self.previous = BytesIO()
+        self.manifest = _manifest_of(_write(self.previous, self.data), 2)
+
+    def test_find_by_digest(self):
+        digest, h3 = self.manifest.partitions[0].groups[1]
+        self.assertEqual(IncrementalBuild(self.manifest).find(TITLE_KEY, digest), (GROUP_SIZE, h3))
+        self.assertIsNone(IncrementalBuild(self.manifest).find(bytes(16), digest))
+
+    def test_copy_reuses_unchanged_groups(self):
+        changed = self.data[:-1] + b'\x03'
+        expected = BytesIO()
+        _write(expected, changed)
+
+        incremental = IncrementalBuild(self.manifest, self.previous)
+        output = BytesIO()
+        _write(output, changed, incremental=incremental)
+
+        self.assertEqual(output.getvalue(), expected.getvalue())
+        self.assertEqual(incremental.reused, 1)
+
+    def test_moved_group_is_copied(self):
+        swapped = self.data[GROUP_DATA_SIZE:] + self.data[:GROUP_DATA_SIZE]
+        incremental = IncrementalBuild(self.manifest, self.previous)
+        output = BytesIO()
+        with patch("wiithon.crypto.part_writer.encrypt_group") as encrypt:
+            _write(output, swapped, incremental=incremental)
+            encrypt.assert_not_called()
+
+        previous = self.previous.getvalue()
+        self.assertEqual(output.getvalue(), previous[GROUP_SIZE:] + previous[:GROUP_SIZE])
+
+    def test_in_place_keeps_unchanged_groups(self):
+        changed = self.data[:-1] + b'\x03'
+        expected = BytesIO()
+        _write(expected, changed)
+
+        incremental = IncrementalBuild(self.manifest)
+        with patch.object(self.previous, "write", wraps=self.previous.write) as write:
+            _write(self.previous, changed, incremental=incremental)
+            self.assertEqual(write.call_count, 1)
+
+        self.assertEqual(self.previous.getvalue(), expected.getvalue())
+        self.assertEqual(incremental.reused, 1)
+
+    def test_in_place_does_not_reuse_moved_groups(self):
+        swapped = self.data[GROUP_DATA_SIZE:] + self.data[:GROUP_DATA_SIZE]
+        expected = BytesIO()
+        _write(expected, swapped)
+
+        _write(self.previous, swapped, incremental=IncrementalBuild(self.manifest))
+        self.assertEqual(self.previous.getvalue(), expected.getvalue())
+
+    def test_in_place_does_not_keep_previous_bytes(self):
+        # The end of the second group is left unwritten, blank in a new image
+        shorter = self.data[:GROUP_DATA_SIZE + 0x100]
+        expected = BytesIO()
+        _write(expected, shorter)
+
+        _write(self.previous, shorter, incremental=IncrementalBuild(self.manifest))
+        self.assertEqual(self.previous.getvalue(), expected.getvalue())
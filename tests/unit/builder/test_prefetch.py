@@ -0,0 +1,89 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from wiithon.builder.prefetch import FilePrefetcher
+from wiithon.exceptions import FstFileNotFoundError
+
+
+def _source(files: dict[str, bytes]):
+    source = MagicMock()
+    source.get_file_data.side_effect = lambda path: files["/".join(path)]
+    return source
+
+
+class TestFilePrefetcher(unittest.TestCase):
+
+    def test_yields_in_order(self):
+        files = {f"f{i}": bytes([i]) * (i + 1) for i in range(10)}
+        paths = [[name] for name in files]
+        with FilePrefetcher(_source(files), paths, max_bytes=4) as prefetcher:
+            self.assertEqual(list(prefetcher), list(files.values()))
+
+    def test_empty(self):
+        with FilePrefetcher(_source({}), []) as prefetcher:
+            self.assertEqual(list(prefetcher), [])
+
+    def test_error_is_raised_in_order(self):
+        source = MagicMock()
+        source.get_file_data.side_effect = [b"a", FstFileNotFoundError("b"), b"c"]
+        with FilePrefetcher(source, [["a"], ["b"], ["c"]]) as prefetcher:
+            iterator = iter(prefetcher)
+            self.assertEqual(next(iterator), b"a")
+            with self.assertRaises(FstFileNotFoundError):
+                next(iterator)
+
+    def test_stays_within_budget(self):
+        fetched = threading.Semaphore(0)
+        source = MagicMock()
+
+        def get_file_data(path):
+            fetched.release()
+            return b"x" * 10
+
+        source.get_file_data.side_effect = get_file_data
+        prefetcher = FilePrefetcher(source, [[str(i)] for i in range(10)], max_bytes=20)
+        try:
+            # Two files fit in the budget, the third one waits in the thread
+            for _ in range(3):
+                self.assertTrue(fetched.acquire(timeout=5))
+            self.assertFalse(fetched.acquire(timeout=0.2))
+
+            next(iter(prefetcher))
+            self.assertTrue(fetched.acquire(timeout=5))
+        finally:
+            prefetcher.close()
+
+    def test_room_is_reserved_before_reading(self):
+        fetched = threading.Semaphore(0)
+        source = MagicMock()
+
+        def get_file_data(path):
+            fetched.release()
+            return b"x" * int(path[0])
+
+        source.get_file_data.side_effect = get_file_data
+        sizes = [50, 10, 10, 10]
+        prefetcher = FilePrefetcher(source, [[str(size)] for size in sizes], max_bytes=20, sizes=sizes)
+        try:
+            # The file bigger than the budget is read alone
+            self.assertTrue(fetched.acquire(timeout=5))
+            self.assertFalse(fetched.acquire(timeout=0.2))
+
+            iterator = iter(prefetcher)
+            self.assertEqual(len(next(iterator)), 50)
+            # Two files fit, the third one is not read before room is made
+            for _ in range(2):
+                self.assertTrue(fetched.acquire(timeout=5))
+            self.assertFalse(fetched.acquire(timeout=0.2))
+
+            next(iterator)
+            self.assertTrue(fetched.acquire(timeout=5))
+        finally:
+            prefetcher.close()
+
+    def test_close_before_consuming(self):
+        files = {f"f{i}": b"x" * 10 for i in range(100)}
+        prefetcher = FilePrefetcher(_source(files), [[name] for name in files], max_bytes=10)
+        prefetcher.close()
+        self.assertFalse(prefetcher._thread.is_alive())
@@ -0,0 +1,74 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from typer.testing import CliRunner
+
+from wiithon.cli import app
+from wiithon.exceptions import CorruptedDataError
+from wiithon.library.archive_index import ArchiveIndex, ArchiveIndexResult
+from wiithon.library.content_index import IndexResult
+
+
+class TestLibraryIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.runner = CliRunner()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        self.discs = [self.root / "a.iso", self.root / "b.iso"]
+
+    def _index(self, *args):
+        def index_archives(_, disc):
+            if disc.name == "a.iso":
+                raise CorruptedDataError("broken archive")
+            return ArchiveIndexResult(str(disc))
+
+        with patch("wiithon.cli.library.find_discs", return_value=self.discs), \
+                patch.object(ArchiveIndex, "index_disc", lambda _, disc, force: IndexResult(str(disc))), \
+                patch.object(ArchiveIndex, "index_archives", index_archives):
+            return self.runner.invoke(app, ["library", "index", str(self.root), "--archives", *args])
+
+    def test_failed_archive_scan_drops_the_disc(self):
+        result = self._index("--json")
+        self.assertEqual(result.exit_code, 0, msg=result.output)
+        entries = json.loads(result.stdout)
+        self.assertEqual([entry["path"] for entry in entries], [str(self.discs[1])])
+        self.assertEqual(entries[0]["archives"]["path"], str(self.discs[1]))
+
+    def test_failed_archive_scan_table(self):
+        result = self._index()
+        self.assertEqual(result.exit_code, 0, msg=result.output)
+        self.assertNotIn("a.iso", result.stdout)
+        self.assertEqual(result.stdout.count("b.iso"), 2)
+
+
+
+class TestLibraryQueries(unittest.TestCase):
+
+    def setUp(self):
+        self.runner = CliRunner()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+
+    def test_catalog_is_required(self):
+        for command in (["find", "00" * 20], ["member", "icon.bin"], ["diff", "a.iso", "b.iso"]):
+            with self.subTest(command=command[0]):
+                result = self.runner.invoke(app, ["library", *command])
+                self.assertEqual(result.exit_code, 2)
+
+    def test_missing_catalog_is_not_created(self):
+        catalog = self.root / "wiithon-library.sqlite"
+        for command in (["find", "00" * 20], ["member", "icon.bin"], ["diff", "a.iso", "b.iso"]):
+            with self.subTest(command=command[0]):
+                result = self.runner.invoke(app, ["library", *command, "--catalog", str(catalog)])
+                self.assertEqual(result.exit_code, 1)
+                self.assertFalse(catalog.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
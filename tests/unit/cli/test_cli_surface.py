@@ -8,8 +8,11 @@ from wiithon import __version__
 from wiithon.cli import app
 
 COMMANDS = [
-    ["iso", "info"], ["iso", "list"], ["iso", "extract"], ["iso", "cat"],
+    ["iso", "info"], ["iso", "list"], ["iso", "extract"], ["iso", "cat"], ["iso", "usage"], ["iso", "scrub"],
+    ["iso", "hash"], ["iso", "grep"],
     ["dol", "caves"],
+    ["library", "scan"], ["library", "list"], ["library", "index"], ["library", "find"], ["library", "member"],
+    ["library", "diff"],
     ["rarc", "info"], ["rarc", "extract"],
 ]
 
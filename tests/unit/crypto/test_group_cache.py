@@ -0,0 +1,203 @@
+import os
+import tempfile
+import threading
+import unittest
+from io import BytesIO
+from pathlib import Path
+from unittest.mock import patch
+
+from wiithon.crypto.group_cache import EncryptedGroupCache, SharedGroupCache, group_digest
+from wiithon.crypto.layout import BLOCK_SIZE, GROUP_DATA_SIZE, GROUP_SIZE, SHA1_SIZE
+from wiithon.crypto.part_reader import SharedCryptPartReader
+from wiithon.crypto.part_writer import CryptPartWriter
+
+TITLE_KEY = bytes(range(16))
+OTHER_KEY = bytes(16)
+
+ENTRY_SIZE = GROUP_SIZE + SHA1_SIZE
+
+
+def _group(fill: int) -> bytes:
+    return bytes([fill]) * GROUP_SIZE
+
+
+class _CacheTestCase(unittest.TestCase):
+    def make_cache(self, max_size: int = ENTRY_SIZE * 4) -> EncryptedGroupCache:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        return EncryptedGroupCache(tmp.name, max_size)
+
+
+class TestGroupDigest(unittest.TestCase):
+
+    def test_headers_are_ignored(self):
+        group = bytearray(GROUP_SIZE)
+        before = group_digest(group)
+        group[0:0x400] = b'\xFF' * 0x400
+        group[BLOCK_SIZE + 0x10] = 0xFF
+        self.assertEqual(group_digest(group), before)
+
+    def test_data_changes_digest(self):
+        group = bytearray(GROUP_SIZE)
+        before = group_digest(group)
+        group[0x400] = 1
+        self.assertNotEqual(group_digest(group), before)
+
+
+class TestEncryptedGroupCache(_CacheTestCase):
+
+    def test_miss_on_empty_cache(self):
+        cache = self.make_cache()
+        self.assertIsNone(cache.get(TITLE_KEY, b'\x00' * 32))
+        self.assertEqual(cache.misses, 1)
+
+    def test_put_then_get(self):
+        cache = self.make_cache()
+        cache.put(TITLE_KEY, b'\x01' * 32, _group(0xAA), b'\x02' * SHA1_SIZE)
+        self.assertEqual(cache.get(TITLE_KEY, b'\x01' * 32), (_group(0xAA), b'\x02' * SHA1_SIZE))
+        self.assertEqual(cache.hits, 1)
+
+    def test_title_key_is_part_of_the_key(self):
+        cache = self.make_cache()
+        cache.put(TITLE_KEY, b'\x01' * 32, _group(0xAA), b'\x02' * SHA1_SIZE)
+        self.assertIsNone(cache.get(OTHER_KEY, b'\x01' * 32))
+
+    def test_size_is_bounded(self):
+        cache = self.make_cache(max_size=ENTRY_SIZE * 2)
+        for i in range(4):
+            cache.put(TITLE_KEY, bytes([i]) * 32, _group(i), b'\x00' * SHA1_SIZE)
+        self.assertLessEqual(cache.size, ENTRY_SIZE * 2)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = self.make_cache(max_size=ENTRY_SIZE * 2)
+        cache.put(TITLE_KEY, b'\x00' * 32, _group(0), b'\x00' * SHA1_SIZE)
+        cache.put(TITLE_KEY, b'\x01' * 32, _group(1), b'\x00' * SHA1_SIZE)
+
+        # Both entries are old, then the first one is used again
+        for entry in cache.path.glob("*/*"):
+            os.utime(entry, ns=(0, 0))
+        cache.get(TITLE_KEY, b'\x00' * 32)
+        cache.put(TITLE_KEY, b'\x02' * 32, _group(2), b'\x00' * SHA1_SIZE)
+
+        self.assertIsNotNone(cache.get(TITLE_KEY, b'\x00' * 32))
+        self.assertIsNotNone(cache.get(TITLE_KEY, b'\x02' * 32))
+        self.assertIsNone(cache.get(TITLE_KEY, b'\x01' * 32))
+
+    def test_size_survives_reopening(self):
+        cache = self.make_cache()
+        cache.put(TITLE_KEY, b'\x01' * 32, _group(1), b'\x00' * SHA1_SIZE)
+        self.assertEqual(EncryptedGroupCache(cache.path, cache.max_size).size, ENTRY_SIZE)
+
+    def test_truncated_entry_is_dropped(self):
+        cache = self.make_cache()
+        cache.put(TITLE_KEY, b'\x01' * 32, _group(1), b'\x00' * SHA1_SIZE)
+        entry = next(cache.path.glob("*/*"))
+        entry.write_bytes(b'\x00' * 10)
+        self.assertIsNone(cache.get(TITLE_KEY, b'\x01' * 32))
+        self.assertFalse(entry.exists())
+
+    def test_too_small_max_size(self):
+        with self.assertRaises(ValueError):
+            EncryptedGroupCache(Path(tempfile.gettempdir()) / "unused", ENTRY_SIZE - 1)
+
+
+class TestCryptPartWriterCache(_CacheTestCase):
+
+    def _write(self, cache: EncryptedGroupCache | None) -> tuple[bytes, bytes]:
+        stream = BytesIO()
+        writer = CryptPartWriter(stream, 0, TITLE_KEY, encrypted_cache=cache)
+        writer.write(b'\x5A' * (GROUP_DATA_SIZE + 0x100))
+        writer.close()
+        return stream.getvalue(), writer.get_h3_table()
+
+    def test_same_output_with_and_without_cache(self):
+        cache = self.make_cache()
+        self.assertEqual(self._write(None), self._write(cache))
+        self.assertEqual(cache.misses, 2)
+
+    def test_hit_skips_encryption(self):
+        cache = self.make_cache()
+        expected = self._write(cache)
+
+        with patch("wiithon.crypto.part_writer.encrypt_group") as encrypt:
+            self.assertEqual(self._write(cache), expected)
+            encrypt.assert_not_called()
+        self.assertEqual(cache.hits, 2)
+
+
+class TestSharedGroupCache(_CacheTestCase):
+
+    def test_put_then_get(self):
+        cache = SharedGroupCache()
+        self.assertIsNone(cache.get(TITLE_KEY, b"d"))
+        cache.put(TITLE_KEY, b"d", _group(1), b"h" * SHA1_SIZE)
+        self.assertEqual(cache.get(TITLE_KEY, b"d"), (_group(1), b"h" * SHA1_SIZE))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_bounded(self):
+        cache = SharedGroupCache(max_groups=2)
+        for digest in (b"a", b"b", b"c"):
+            cache.get(TITLE_KEY, digest)
+            cache.put(TITLE_KEY, digest, _group(0), bytes(SHA1_SIZE))
+        self.assertIsNone(cache.get(TITLE_KEY, b"a"))
+        self.assertIsNotNone(cache.get(TITLE_KEY, b"c"))
+
+    def test_waits_for_the_reserved_group(self):
+        cache = SharedGroupCache()
+        self.assertIsNone(cache.get(TITLE_KEY, b"d"))
+
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(cache.get(TITLE_KEY, b"d")))
+        waiter.start()
+        cache.put(TITLE_KEY, b"d", _group(2), bytes(SHA1_SIZE))
+        waiter.join(5)
+
+        self.assertEqual(results, [(_group(2), bytes(SHA1_SIZE))])
+        self.assertEqual(cache.misses, 1)
+
+    def test_close_releases_waiters(self):
+        cache = SharedGroupCache()
+        cache.get(TITLE_KEY, b"d")
+
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(cache.get(TITLE_KEY, b"d")))
+        waiter.start()
+        cache.close()
+        waiter.join(5)
+
+        self.assertEqual(results, [None])
+
+    def test_backing_cache(self):
+        backing = self.make_cache()
+        backing.put(TITLE_KEY, b"d", _group(3), bytes(SHA1_SIZE))
+
+        cache = SharedGroupCache(backing=backing)
+        self.assertEqual(cache.get(TITLE_KEY, b"d"), (_group(3), bytes(SHA1_SIZE)))
+        cache.get(TITLE_KEY, b"e")
+        cache.put(TITLE_KEY, b"e", _group(4), bytes(SHA1_SIZE))
+        self.assertIsNotNone(backing.get(TITLE_KEY, b"e"))
+
+
+class TestSharedCryptPartReader(unittest.TestCase):
+
+    def _image(self) -> BytesIO:
+        stream = BytesIO()
+        writer = CryptPartWriter(stream, 0, TITLE_KEY)
+        writer.write(bytes(range(256)) * (GROUP_DATA_SIZE * 2 // 256))
+        writer.close()
+        return stream
+
+    def test_reads_across_groups(self):
+        reader = SharedCryptPartReader(self._image(), 0, TITLE_KEY)
+        offset = GROUP_DATA_SIZE - 2
+        self.assertEqual(reader.read_at(offset, 4), bytes((offset + i) % 256 for i in range(4)))
+
+    def test_each_group_decrypted_once(self):
+        reader = SharedCryptPartReader(self._image(), 0, TITLE_KEY)
+        threads = [threading.Thread(target=reader.read_at, args=(0, GROUP_DATA_SIZE * 2)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+
+        self.assertEqual(reader.decrypted_groups, 2)
@@ -0,0 +1,81 @@
+import os
+import unittest
+from io import BytesIO
+
+from wiithon.crypto.blocks import decrypt_group, encrypt_group, encrypt_hashed_group, group_user_data, hash_group
+from wiithon.crypto.layout import BLOCK_HEADER_SIZE, BLOCK_SIZE, GROUP_DATA_SIZE, GROUP_SIZE, SHA1_SIZE
+from wiithon.crypto.part_reader import CryptPartReader, SharedCryptPartReader
+from wiithon.crypto.part_writer import CryptPartWriter
+
+TITLE_KEY = bytes(range(16))
+
+
+class TestHashGroup(unittest.TestCase):
+
+    def test_hash_then_encrypt_is_encrypt_group(self):
+        group = os.urandom(GROUP_SIZE)
+        h3, h3_split = bytearray(SHA1_SIZE), bytearray(SHA1_SIZE)
+        self.assertEqual(encrypt_hashed_group(hash_group(group, h3_split), TITLE_KEY),
+                         encrypt_group(group, TITLE_KEY, h3))
+        self.assertEqual(h3, h3_split)
+
+    def test_user_data_is_kept(self):
+        group = os.urandom(GROUP_SIZE)
+        hashed = hash_group(group)
+        self.assertNotEqual(hashed[:BLOCK_HEADER_SIZE], group[:BLOCK_HEADER_SIZE])
+        self.assertEqual(group_user_data(hashed), group_user_data(group))
+        self.assertEqual(group_user_data(group)[:BLOCK_SIZE - BLOCK_HEADER_SIZE], group[BLOCK_HEADER_SIZE:BLOCK_SIZE])
+        self.assertEqual(bytes(decrypt_group(encrypt_group(group, TITLE_KEY), TITLE_KEY)), group_user_data(group))
+
+
+class TestPlainPartitions(unittest.TestCase):
+    DATA = bytes(range(256)) * (GROUP_DATA_SIZE * 2 // 256) + b"tail"
+
+    def _image(self, *, hashed: bool) -> BytesIO:
+        stream = BytesIO()
+        writer = CryptPartWriter(stream, 0x20, TITLE_KEY, encrypted=False, hashed=hashed)
+        writer.write(self.DATA)
+        writer.close()
+        return stream
+
+    def test_hashed_layout(self):
+        stream = self._image(hashed=True)
+        raw = stream.getvalue()
+        self.assertEqual(len(raw), 0x20 + 3 * GROUP_SIZE)
+        self.assertEqual(raw[0x20:0x20 + GROUP_SIZE], hash_group(raw[0x20:0x20 + GROUP_SIZE]))
+        self.assertEqual(raw[0x20 + BLOCK_HEADER_SIZE:0x20 + BLOCK_SIZE], self.DATA[:BLOCK_SIZE - BLOCK_HEADER_SIZE])
+
+    def test_unhashed_layout_is_linear(self):
+        raw = self._image(hashed=False).getvalue()
+        self.assertEqual(raw[0x20:0x20 + len(self.DATA)], self.DATA)
+        self.assertEqual(len(raw), 0x20 + 3 * GROUP_DATA_SIZE)
+
+    def test_read_back(self):
+        for hashed in (True, False):
+            with self.subTest(hashed=hashed):
+                stream = self._image(hashed=hashed)
+                offset = GROUP_DATA_SIZE - 2
+                for reader in (CryptPartReader(stream, 0x20, TITLE_KEY, encrypted=False, hashed=hashed),
+                               SharedCryptPartReader(stream, 0x20, TITLE_KEY, encrypted=False, hashed=hashed)):
+                    self.assertEqual(reader.read_at(offset, 8), self.DATA[offset:offset + 8])
+                    self.assertEqual(reader.read_at(len(self.DATA) - 4, 4), b"tail")
+
+    def test_rewrite_keeps_data(self):
+        for hashed in (True, False):
+            with self.subTest(hashed=hashed):
+                stream = self._image(hashed=hashed)
+                writer = CryptPartWriter(stream, 0x20, TITLE_KEY, encrypted=False, hashed=hashed)
+                writer.seek(GROUP_DATA_SIZE + 4)
+                writer.write(b"new")
+                writer.close()
+
+                expected = bytearray(self.DATA)
+                expected[GROUP_DATA_SIZE + 4:GROUP_DATA_SIZE + 7] = b"new"
+                reader = CryptPartReader(stream, 0x20, TITLE_KEY, encrypted=False, hashed=hashed)
+                self.assertEqual(reader.read_at(0, len(expected)), bytes(expected))
+
+    def test_encryption_needs_hashes(self):
+        with self.assertRaises(ValueError):
+            CryptPartReader(BytesIO(), 0, TITLE_KEY, hashed=False)
+        with self.assertRaises(ValueError):
+            CryptPartWriter(BytesIO(), 0, TITLE_KEY, hashed=False)
@@ -0,0 +1,101 @@
+import struct
+import unittest
+from io import BytesIO
+
+from wiithon.disc.backends.ciso import CISO_HEADER_SIZE, CISO_MAGIC, CisoStream
+from wiithon.exceptions import InvalidDiscError
+
+BLOCK = 0x8000
+
+
+class TestCisoStream(unittest.TestCase):
+
+    def setUp(self):
+        # A stream owns its file and closes it once garbage collected
+        self.streams = []
+
+    def _open(self, file: BytesIO, *, writable: bool = False) -> CisoStream:
+        stream = CisoStream.open(file, writable=writable)
+        self.streams.append(stream)
+        return stream
+
+    def _create(self, *chunks: tuple[int, bytes]) -> tuple[BytesIO, CisoStream]:
+        file = BytesIO()
+        stream = CisoStream.create(file, BLOCK)
+        self.streams.append(stream)
+        for offset, data in chunks:
+            stream.seek(offset)
+            stream.write(data)
+        return file, stream
+
+    def test_header(self):
+        file, stream = self._create((0, b"a"), (2 * BLOCK, b"b"))
+        stream.flush()
+
+        data = file.getvalue()
+        self.assertEqual(data[:4], CISO_MAGIC)
+        self.assertEqual(struct.unpack_from("<I", data, 4)[0], BLOCK)
+        self.assertEqual(data[8:11], b"\x01\x00\x01")
+        # Zero blocks are not stored
+        self.assertEqual(len(data), CISO_HEADER_SIZE + 2 * BLOCK)
+
+    def test_roundtrip(self):
+        file, stream = self._create((5, b"hello"), (3 * BLOCK - 1, b"xy"))
+        stream.flush()
+
+        stream = self._open(file)
+        self.assertEqual(stream.size, 4 * BLOCK)
+        self.assertEqual(stream.read(10), bytes(5) + b"hello")
+        stream.seek(3 * BLOCK - 1)
+        self.assertEqual(stream.read(2), b"xy")
+        stream.seek(BLOCK)
+        self.assertEqual(stream.read(BLOCK), bytes(BLOCK))
+
+    def test_out_of_order_writes_are_sorted_on_close(self):
+        file, stream = self._create((3 * BLOCK, b"late"), (0, b"early"))
+        # Keep the content readable once the stream closes the file
+        file.close = lambda: None
+        stream.close()
+
+        data = file.getvalue()
+        self.assertEqual(data[CISO_HEADER_SIZE:CISO_HEADER_SIZE + 5], b"early")
+        self.assertEqual(data[CISO_HEADER_SIZE + BLOCK:CISO_HEADER_SIZE + BLOCK + 4], b"late")
+
+    def test_truncate(self):
+        file, stream = self._create((0, b"a" * 8), (BLOCK, b"b"), (2 * BLOCK, b"c"))
+        stream.truncate(BLOCK + 1)
+        stream.flush()
+        self.assertEqual(len(file.getvalue()), CISO_HEADER_SIZE + 2 * BLOCK)
+
+        stream = self._open(file)
+        self.assertEqual(stream.size, 2 * BLOCK)
+        stream.seek(BLOCK)
+        self.assertEqual(stream.read(2), b"b\x00")
+
+    def test_rewrite_in_place(self):
+        file, stream = self._create((0, b"a" * 8))
+        stream.flush()
+
+        stream = self._open(file, writable=True)
+        stream.seek(BLOCK + 2)
+        stream.write(b"b")
+        stream.flush()
+
+        stream = self._open(file)
+        self.assertEqual(stream.read(8), b"a" * 8)
+        stream.seek(BLOCK + 2)
+        self.assertEqual(stream.read(1), b"b")
+
+    def test_invalid(self):
+        with self.assertRaises(InvalidDiscError):
+            CisoStream.open(BytesIO(bytes(CISO_HEADER_SIZE)))
+
+        header = bytearray(CISO_HEADER_SIZE)
+        header[:4] = CISO_MAGIC
+        struct.pack_into("<I", header, 4, 3)
+        with self.assertRaises(InvalidDiscError):
+            CisoStream.open(BytesIO(header))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import struct
+import unittest
+from io import BytesIO
+
+from wiithon.disc.backends.gcz import GCZ_MAGIC, UNCOMPRESSED_FLAG, GczStream, GczWriter
+from wiithon.exceptions import CorruptedDataError, InvalidDiscError
+
+BLOCK = 0x400
+
+
+class _KeptBytesIO(BytesIO):
+    """Keeps its content once the stream closes it"""
+    def close(self):
+        pass
+
+
+class TestGcz(unittest.TestCase):
+
+    def _build(self, *chunks: tuple[int, bytes], window_blocks: int = 2) -> _KeptBytesIO:
+        file = _KeptBytesIO()
+        with GczWriter(file, BLOCK, window_blocks=window_blocks, workers=2) as writer:
+            for offset, data in chunks:
+                writer.seek(offset)
+                writer.write(data)
+        return file
+
+    def _open(self, file: BytesIO) -> GczStream:
+        stream = GczStream.open(file)
+        self.addCleanup(stream.close)
+        return stream
+
+    def test_roundtrip(self):
+        data = os.urandom(BLOCK * 3) + b"text" * 1000 + bytes(BLOCK * 4) + b"end"
+        stream = self._open(self._build((0, data)))
+
+        self.assertEqual(stream.size, len(data))
+        self.assertEqual(stream.read(), data)
+        stream.seek(BLOCK * 3 - 2)
+        self.assertEqual(stream.read(6), data[BLOCK * 3 - 2:BLOCK * 3 + 4])
+
+    def test_header_and_index(self):
+        file = self._build((0, os.urandom(BLOCK)), (BLOCK, bytes(BLOCK)))
+        magic, _, _, image_size, block_size, block_count = struct.unpack_from("<4sIQQII", file.getvalue())
+        self.assertEqual((magic, image_size, block_size, block_count), (GCZ_MAGIC, 2 * BLOCK, BLOCK, 2))
+
+        pointers = struct.unpack_from("<2Q", file.getvalue(), 32)
+        # Random data does not compress, zeros do
+        self.assertTrue(pointers[0] & UNCOMPRESSED_FLAG)
+        self.assertEqual(pointers[1], BLOCK)
+
+    def test_revisited_blocks(self):
+        """The builder comes back to blocks already compressed"""
+        file = self._build((0, b"a" * BLOCK * 8), (10, b"first"), (BLOCK * 8, b"tail"), (BLOCK * 2 - 1, b"xy"))
+
+        expected = bytearray(b"a" * BLOCK * 8 + b"tail")
+        expected[10:15] = b"first"
+        expected[BLOCK * 2 - 1:BLOCK * 2 + 1] = b"xy"
+        self.assertEqual(self._open(file).read(), bytes(expected))
+
+    def test_read_back_while_writing(self):
+        file = _KeptBytesIO()
+        with GczWriter(file, BLOCK, window_blocks=1, workers=1) as writer:
+            writer.write(b"b" * BLOCK * 4)
+            writer.seek(BLOCK + 1)
+            self.assertEqual(writer.read(3), b"bbb")
+            writer.seek(BLOCK * 10)
+            self.assertEqual(writer.read(3), b"")
+
+    def test_truncate(self):
+        file = _KeptBytesIO()
+        with GczWriter(file, BLOCK, window_blocks=1, workers=1) as writer:
+            writer.write(b"c" * BLOCK * 4)
+            writer.truncate(BLOCK + 2)
+            writer.seek(BLOCK + 4)
+            writer.write(b"d")
+
+        self.assertEqual(self._open(file).read(), b"c" * (BLOCK + 2) + bytes(2) + b"d")
+
+    def test_corrupted_block(self):
+        file = self._build((0, os.urandom(BLOCK)))
+        file.getbuffer()[-1] ^= 0xFF
+        with self.assertRaises(CorruptedDataError):
+            self._open(file).read()
+
+    def test_invalid(self):
+        with self.assertRaises(InvalidDiscError):
+            GczStream.open(BytesIO(bytes(64)))
+        with self.assertRaises(ValueError):
+            GczStream.open(self._build((0, b"a")), writable=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import os
+import struct
+import tempfile
+import unittest
+from io import BytesIO
+
+from wiithon.disc.backends.registry import create_disc, open_disc
+from wiithon.disc.backends.wbfs import WBFS_MAGIC, WbfsStream
+from wiithon.exceptions import InvalidDiscError
+
+BLOCK = 1 << 21
+
+
+class TestWbfsStream(unittest.TestCase):
+
+    def setUp(self):
+        # A stream owns its file and closes it once garbage collected
+        self.streams = []
+
+    def _open(self, file: BytesIO, *, writable: bool = False) -> WbfsStream:
+        stream = WbfsStream.open(file, writable=writable)
+        self.streams.append(stream)
+        return stream
+
+    def _written(self, *chunks: tuple[int, bytes]) -> BytesIO:
+        file = BytesIO()
+        stream = WbfsStream.create(file)
+        self.streams.append(stream)
+        for offset, data in chunks:
+            stream.seek(offset)
+            stream.write(data)
+        stream.flush()
+        return file
+
+    def test_header(self):
+        file = self._written((0, b"RMGE01" + bytes(BLOCK)))
+        magic, hd_sectors, hd_shift, wbfs_shift = struct.unpack_from(">4sIBB", file.getvalue())
+        self.assertEqual((magic, hd_shift, wbfs_shift), (WBFS_MAGIC, 9, 21))
+        self.assertEqual(hd_sectors << hd_shift, len(file.getvalue()))
+        # Disc header copy
+        self.assertEqual(file.getvalue()[0x200:0x206], b"RMGE01")
+
+    def test_only_written_blocks_are_stored(self):
+        file = self._written((0, b"a"), (10 * BLOCK, bytes(BLOCK)), (20 * BLOCK + 5, b"b"))
+        # Header sector + 2 blocks, the zeros are not stored
+        self.assertEqual(len(file.getvalue()), 3 * BLOCK)
+
+    def test_roundtrip(self):
+        file = self._written((0, b"start"), (3 * BLOCK - 2, b"across"))
+        stream = self._open(file)
+
+        # WBFS does not store the image size, only its blocks
+        self.assertEqual(stream.size, 4 * BLOCK)
+        self.assertEqual(stream.read(5), b"start")
+        stream.seek(BLOCK)
+        self.assertEqual(stream.read(4), bytes(4))
+        stream.seek(3 * BLOCK - 2)
+        self.assertEqual(stream.read(6), b"across")
+        stream.seek(4 * BLOCK - 1)
+        self.assertEqual(stream.read(10), b"\x00")
+
+    def test_read_only(self):
+        stream = self._open(self._written((0, b"a")))
+        with self.assertRaises(OSError):
+            stream.write(b"b")
+
+    def test_rewrite_in_place(self):
+        file = self._written((0, b"a" * 10))
+        stream = self._open(file, writable=True)
+        stream.seek(2)
+        stream.write(b"bb")
+        stream.flush()
+
+        stream = self._open(file)
+        self.assertEqual(stream.read(10), b"aabbaaaaaa")
+
+    def test_truncate(self):
+        file = self._written((0, b"a" * 10), (BLOCK, b"c"))
+        stream = self._open(file, writable=True)
+        stream.truncate(4)
+        stream.seek(8)
+        stream.write(b"d")
+        stream.flush()
+
+        self.assertEqual(len(file.getvalue()), 2 * BLOCK)
+        stream = self._open(file)
+        self.assertEqual(stream.size, BLOCK)
+        self.assertEqual(stream.read(10), b"aaaa" + bytes(4) + b"d\x00")
+
+    def test_not_wbfs(self):
+        with self.assertRaises(InvalidDiscError):
+            WbfsStream.open(BytesIO(bytes(0x400)))
+
+    def test_empty_disc_table(self):
+        file = self._written((0, b"a"))
+        file.getbuffer()[0xC] = 0
+        with self.assertRaises(InvalidDiscError):
+            WbfsStream.open(file)
+
+
+class TestRegistry(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+
+    def test_container_chosen_by_extension(self):
+        path = os.path.join(self.tmp, "game.wbfs")
+        with create_disc(path) as stream:
+            stream.write(b"data")
+
+        with open(path, "rb") as file:
+            self.assertEqual(file.read(4), WBFS_MAGIC)
+        with open_disc(path) as stream:
+            self.assertIsInstance(stream, WbfsStream)
+            self.assertEqual(stream.read(4), b"data")
+
+    def test_plain_iso(self):
+        path = os.path.join(self.tmp, "game.iso")
+        with create_disc(path) as stream:
+            stream.write(b"data")
+
+        with open(path, "rb") as file:
+            self.assertEqual(file.read(), b"data")
+        with open_disc(path) as stream:
+            self.assertNotIsInstance(stream, WbfsStream)
+            self.assertEqual(stream.read(), b"data")
+
+
+if __name__ == "__main__":
+    unittest.main()
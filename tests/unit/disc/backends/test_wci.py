@@ -0,0 +1,120 @@
+import os
+import unittest
+from io import BytesIO
+
+from wiithon.crypto.blocks import encrypt_group
+from wiithon.crypto.layout import BLOCK_SIZE, GROUP_DATA_SIZE, GROUP_SIZE
+from wiithon.disc.backends.wci import (
+    CHUNK_DATA,
+    CHUNK_ENCRYPTED,
+    CHUNK_ZERO,
+    COMPRESSIONS,
+    REGION_PARTITION,
+    REGION_RAW,
+    WciPartReader,
+    WciRegion,
+    WciStream,
+    WciWriter,
+    _encode_chunk,
+    _plain_to_group,
+    write_wci,
+)
+from wiithon.exceptions import InvalidDiscError
+
+TITLE_KEY = bytes(range(16))
+
+
+class _KeptBytesIO(BytesIO):
+    """Keeps its content once the stream closes it"""
+    def close(self):
+        pass
+
+
+class TestWci(unittest.TestCase):
+
+    def _open(self, file: BytesIO) -> WciStream:
+        stream = WciStream.open(file)
+        self.addCleanup(stream.close)
+        return stream
+
+    def _partition_image(self) -> tuple[bytes, bytes, WciStream]:
+        """A raw group followed by a partition of two groups, the second one with non-standard hashes"""
+        plain = os.urandom(GROUP_DATA_SIZE)
+        encrypted = encrypt_group(_plain_to_group(plain), TITLE_KEY)
+        odd = bytearray(encrypt_group(_plain_to_group(bytes(GROUP_DATA_SIZE)), TITLE_KEY))
+        odd[BLOCK_SIZE] ^= 1
+        raw = b"disc header" + bytes(GROUP_SIZE - 11)
+
+        regions = [WciRegion(0, GROUP_SIZE, REGION_RAW),
+                   WciRegion(GROUP_SIZE, 2 * GROUP_SIZE, REGION_PARTITION, TITLE_KEY, 1)]
+        compress = COMPRESSIONS["bz2"][1]
+        file = BytesIO()
+        chunks = []
+        for region, data in ((regions[0], raw), (regions[1], encrypted), (regions[1], bytes(odd))):
+            kind, stored = _encode_chunk(data, region, compress)
+            chunks.append((file.tell(), len(stored), kind))
+            file.write(stored)
+
+        self.assertEqual([kind for _, _, kind in chunks], [CHUNK_DATA, CHUNK_DATA, CHUNK_ENCRYPTED])
+        stream = WciStream(file, 3 * GROUP_SIZE, regions, chunks, COMPRESSIONS["bz2"][2])
+        self.addCleanup(stream.close)
+        return raw + encrypted + bytes(odd), plain, stream
+
+    def test_raw_image_roundtrip(self):
+        image = (b"header" + os.urandom(0x1000)).ljust(GROUP_SIZE, b"\0") + bytes(GROUP_SIZE) + b"end"
+        for compression in COMPRESSIONS:
+            with self.subTest(compression=compression):
+                file = _KeptBytesIO()
+                write_wci(BytesIO(image), file, compression, workers=2)
+                stream = self._open(file)
+
+                self.assertEqual(stream.size, len(image))
+                self.assertEqual(stream.read(), image)
+                stream.seek(GROUP_SIZE - 3)
+                self.assertEqual(stream.read(10), image[GROUP_SIZE - 3:GROUP_SIZE + 7])
+                self.assertEqual([kind for _, _, kind in stream._chunks], [CHUNK_DATA, CHUNK_ZERO, CHUNK_DATA])
+
+    def test_zero_chunks_not_stored(self):
+        region = WciRegion(0, GROUP_SIZE, REGION_PARTITION, TITLE_KEY)
+        self.assertEqual(_encode_chunk(bytes(GROUP_SIZE), region, bytes), (CHUNK_ZERO, b""))
+
+    def test_partition_stored_decrypted(self):
+        image, plain, stream = self._partition_image()
+        self.assertEqual(stream.read(), image)
+        # Only the plaintext is stored, the encryption is regenerated
+        self.assertEqual(stream._stored(1), plain)
+
+    def test_plain_partition_reader(self):
+        _, plain, stream = self._partition_image()
+        reader = stream.open_plain_partition(GROUP_SIZE)
+
+        self.assertIsInstance(reader, WciPartReader)
+        self.assertEqual(reader.read_at(0x100, 0x20), plain[0x100:0x120])
+        self.assertEqual(reader.read_at(GROUP_DATA_SIZE - 4, 8)[:4], plain[-4:])
+        self.assertIsNone(stream.open_plain_partition(0))
+        self.assertIsNone(stream.open_plain_partition(GROUP_SIZE + 0x8000))
+
+    def test_writer(self):
+        image = os.urandom(0x100) + bytes(0x50000)
+        file = _KeptBytesIO()
+        with WciWriter(file, "none") as writer:
+            writer.write(image)
+            writer.seek(4)
+            self.assertEqual(writer.read(4), image[4:8])
+        self.assertEqual(self._open(file).read(), image)
+
+    def test_writer_needs_seekable_file(self):
+        class Pipe(BytesIO):
+            def seekable(self):
+                return False
+
+        with self.assertRaises(ValueError):
+            WciWriter(Pipe())
+
+    def test_invalid(self):
+        with self.assertRaises(InvalidDiscError):
+            WciStream.open(BytesIO(b"CISO" + bytes(0x100)))
+        with self.assertRaises(ValueError):
+            WciStream.open(BytesIO(), writable=True)
+        with self.assertRaises(ValueError):
+            write_wci(BytesIO(), BytesIO(), "zip")
@@ -0,0 +1,185 @@
+import hashlib
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from types import SimpleNamespace
+
+from wiithon.crypto.layout import GROUP_DATA_SIZE
+from wiithon.crypto.part_reader import CryptPartReader
+from wiithon.crypto.part_writer import CryptPartWriter
+from wiithon.disc.extractor import ByteBudget, ExtractedFile, ExtractionManifest, _PartitionExtraction
+from wiithon.formats.rarc import Rarc
+from wiithon.formats.yaz0 import Yaz0
+from wiithon.fst.node import FSTDirectory, FSTFile
+
+TITLE_KEY = bytes(range(16))
+DATA_OFFSET = 0x20000
+H3_OFFSET = 0x8000
+
+
+class TestByteBudget(unittest.TestCase):
+
+    def test_waits_for_release(self):
+        budget = ByteBudget(10)
+        budget.acquire(8)
+        acquired = threading.Event()
+        thread = threading.Thread(target=lambda: (budget.acquire(5), acquired.set()))
+        thread.start()
+        self.assertFalse(acquired.wait(0.05))
+        budget.release(8)
+        self.assertTrue(acquired.wait(1))
+        thread.join()
+
+    def test_oversized_request_goes_through_alone(self):
+        budget = ByteBudget(10)
+        budget.acquire(100)
+        self.assertEqual(budget.used, 100)
+
+
+class TestPartitionExtraction(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        self.written: list[int] = []
+
+        self.data = os.urandom(GROUP_DATA_SIZE * 3 + 0x100)
+        stream = BytesIO()
+        writer = CryptPartWriter(stream, DATA_OFFSET, TITLE_KEY)
+        writer.write(self.data)
+        writer.close()
+        stream.seek(H3_OFFSET)
+        stream.write(writer.h3_table)
+        crypto = CryptPartReader(stream, DATA_OFFSET, TITLE_KEY)
+
+        directory = FSTDirectory("dir")
+        directory.children = [
+            FSTFile("across.bin", GROUP_DATA_SIZE - 0x10, GROUP_DATA_SIZE + 0x20),
+            FSTFile("empty.bin", 0x40, 0),
+        ]
+        entries = [
+            FSTFile("last.bin", GROUP_DATA_SIZE * 3, 0x100),
+            FSTFile("small.bin", 0x10, 0x30),
+            directory,
+            FSTFile("empty_end.bin", GROUP_DATA_SIZE * 3 + 0x100, 0),
+        ]
+        partition = SimpleNamespace(crypto=crypto, fst=SimpleNamespace(entries=entries), partition_offset=0,
+                                    header=SimpleNamespace(global_hash_table_offset=H3_OFFSET))
+        self.reader = SimpleNamespace(file=stream, open_partition=lambda _: partition,
+                                      disc_header=SimpleNamespace(disable_hash_verification=0))
+        self.expected = {
+            "small.bin": self.data[0x10:0x40],
+            "dir/across.bin": self.data[GROUP_DATA_SIZE - 0x10:GROUP_DATA_SIZE * 2 + 0x10],
+            "dir/empty.bin": b"",
+            "last.bin": self.data[GROUP_DATA_SIZE * 3:],
+            "empty_end.bin": b"",
+        }
+
+    def _extract(self, budget: int, jobs: int, previous: dict[str, ExtractedFile] | None = None,
+                 quick_check: bool = True) -> _PartitionExtraction:
+        with ThreadPoolExecutor(jobs) as decoders, ThreadPoolExecutor(jobs) as writers:
+            extraction = _PartitionExtraction(self.reader, None, self.root, "data", decoders, writers,
+                                              ByteBudget(budget), self.written.append, previous,
+                                              quick_check=quick_check)
+            extraction.run(2 * jobs)
+        return extraction
+
+    def test_files_match_partition_data(self):
+        for budget, jobs in ((64 * 1024 * 1024, 4), (1, 1)):
+            with self.subTest(budget=budget, jobs=jobs):
+                self.written.clear()
+                self._extract(budget, jobs)
+                for path, data in self.expected.items():
+                    self.assertEqual((self.root / "data" / path).read_bytes(), data, msg=path)
+                self.assertEqual(sum(self.written), sum(len(data) for data in self.expected.values()))
+
+    def test_group_without_files_is_not_read(self):
+        read_groups = []
+        crypto = self.reader.open_partition(None).crypto
+        decode = crypto.decode_group
+        crypto.decode_group = lambda raw: (read_groups.append(raw), decode(raw))[1]
+        self._extract(64 * 1024 * 1024, 2)
+        self.assertEqual(len(read_groups), 4)
+
+        del self.expected["last.bin"]
+        self.reader.open_partition(None).fst.entries.pop(0)
+        read_groups.clear()
+        self._extract(64 * 1024 * 1024, 2)
+        self.assertEqual(len(read_groups), 3)
+
+    def test_incremental_keeps_unchanged_files(self):
+        first = self._extract(64 * 1024 * 1024, 2, {})
+        self.assertEqual(first.skipped, 0)
+        self.assertEqual(first.records["data/small.bin"].sha1, hashlib.sha1(self.expected["small.bin"]).hexdigest())
+
+        second = self._extract(64 * 1024 * 1024, 2, first.records)
+        self.assertEqual(second.skipped, len(self.expected))
+        self.assertEqual(second.records.keys(), first.records.keys())
+
+        # A changed file is extracted again, even if its size and modification time were kept
+        target = self.root / "data" / "last.bin"
+        stat = target.stat()
+        target.write_bytes(bytes(len(self.expected["last.bin"])))
+        os.utime(target, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        third = self._extract(64 * 1024 * 1024, 2, second.records)
+        self.assertEqual(third.skipped, len(self.expected))
+        fourth = self._extract(64 * 1024 * 1024, 2, second.records, quick_check=False)
+        self.assertEqual(fourth.skipped, len(self.expected) - 1)
+        self.assertEqual(target.read_bytes(), self.expected["last.bin"])
+
+    def test_manifest_round_trip(self):
+        manifest = ExtractionManifest("RTST01")
+        manifest.files["data/a.bin"] = ExtractedFile(0x10, 0x20, "ab" * 20, bytes(20), 123)
+        manifest.files["data/b.bin"] = ExtractedFile(0x40, 0, "cd" * 20, None)
+        manifest.save(self.root)
+
+        loaded = ExtractionManifest.load(self.root)
+        self.assertEqual(loaded.disc_id, "RTST01")
+        self.assertEqual({name: f.to_dict() for name, f in loaded.files.items()},
+                         {name: f.to_dict() for name, f in manifest.files.items()})
+        self.assertIsNone(ExtractionManifest.load(self.root / "missing"))
+
+
+class TestDeepExtraction(unittest.TestCase):
+
+    def test_packed_files_are_unpacked(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        root = Path(tmp.name)
+
+        rarc = Rarc.create_empty()
+        rarc.add_file("inner.bin", b"inner" * 100)
+        packed = Yaz0.from_data(rarc.get_bytes()).get_bytes()
+        data = bytearray(GROUP_DATA_SIZE * 2)
+        # Its magic word is cut by the end of the first group
+        data[GROUP_DATA_SIZE - 2:GROUP_DATA_SIZE - 2 + len(packed)] = packed
+        data[0x10:0x20] = b"Yaz0 plain file!"
+
+        stream = BytesIO()
+        writer = CryptPartWriter(stream, DATA_OFFSET, TITLE_KEY)
+        writer.write(bytes(data))
+        writer.close()
+        partition = SimpleNamespace(crypto=CryptPartReader(stream, DATA_OFFSET, TITLE_KEY), partition_offset=0,
+                                    fst=SimpleNamespace(entries=[FSTFile("stage.arc", GROUP_DATA_SIZE - 2, len(packed)),
+                                                                 FSTFile("plain.bin", 0x14, 0x0C)]))
+        reader = SimpleNamespace(file=stream, open_partition=lambda _: partition)
+
+        with ThreadPoolExecutor(2) as decoders, ThreadPoolExecutor(2) as writers, \
+                ThreadPoolExecutor(2) as unpackers:
+            extraction = _PartitionExtraction(reader, None, root, "data", decoders, writers, ByteBudget(1 << 26), None,
+                                              unpackers=unpackers)
+            extraction.run(4)
+
+        self.assertEqual((extraction.unpacked, extraction.unpacked_files), (1, 1))
+        self.assertFalse((root / "data" / "stage.arc").exists())
+        self.assertEqual((root / "data" / "stage.arc.d" / "inner.bin").read_bytes(), b"inner" * 100)
+        self.assertEqual((root / "data" / "plain.bin").read_bytes(), b" plain file!")
+
+
+if __name__ == "__main__":
+    unittest.main()
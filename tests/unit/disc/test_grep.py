@@ -0,0 +1,77 @@
+import os
+import unittest
+from io import BytesIO
+from types import SimpleNamespace
+
+from wiithon.crypto.layout import GROUP_DATA_SIZE
+from wiithon.crypto.part_reader import CryptPartReader
+from wiithon.crypto.part_writer import CryptPartWriter
+from wiithon.disc.grep import _batches, _grep_file, _literal_length, compile_pattern
+from wiithon.formats.rarc import Rarc
+from wiithon.formats.yaz0 import Yaz0
+from wiithon.fst.node import FSTFile
+
+TITLE_KEY = bytes(range(16))
+DATA_OFFSET = 0x20000
+
+
+class TestPatterns(unittest.TestCase):
+
+    def test_literal_length(self):
+        self.assertEqual(_literal_length(compile_pattern(b"a.b*")), 4)
+        self.assertEqual(_literal_length(compile_pattern("Mario", ignore_case=True)), 5)
+        self.assertEqual(_literal_length(compile_pattern(rb"a\.b", regex=True)), 3)
+        self.assertIsNone(_literal_length(compile_pattern(rb"\d+", regex=True)))
+
+    def test_batches_follow_physical_order(self):
+        files = [("c", FSTFile("c", 0x300, 0x100)), ("a", FSTFile("a", 0x100, 0x100)), ("b", FSTFile("b", 0x200, 0))]
+        self.assertEqual(list(_batches(files, 0x100)), [[("a", 0x100, 0x100)], [("b", 0x200, 0), ("c", 0x300, 0x100)]])
+
+
+class TestGrepFile(unittest.TestCase):
+
+    def setUp(self):
+        self.data = bytearray(os.urandom(GROUP_DATA_SIZE * 2))
+        # Across the groups, and twice in the second one
+        self.data[GROUP_DATA_SIZE - 3:GROUP_DATA_SIZE + 3] = b"needle"
+        self.data[GROUP_DATA_SIZE + 0x100:GROUP_DATA_SIZE + 0x106] = b"NEEDLE"
+
+        rarc = Rarc.create_empty()
+        rarc.add_file("plain.bin", b"..needle..")
+        rarc.add_file("inner.szs", Yaz0.from_data(b"a needle in a compressed file").get_bytes())
+        self.packed = Yaz0.from_data(rarc.get_bytes()).get_bytes()
+        self.data[0x1000:0x1000 + len(self.packed)] = self.packed
+
+        stream = BytesIO()
+        writer = CryptPartWriter(stream, DATA_OFFSET, TITLE_KEY)
+        writer.write(bytes(self.data))
+        writer.close()
+        self.partition = SimpleNamespace(crypto=CryptPartReader(stream, DATA_OFFSET, TITLE_KEY))
+
+    def _grep(self, pattern, offset, length, *, deep=False):
+        return [(m.member, m.offset, m.data)
+                for m in _grep_file(self.partition, "data", "file.bin", offset, length, pattern, deep=deep)]
+
+    def test_literal_is_found_across_groups(self):
+        start = GROUP_DATA_SIZE - 0x200
+        self.assertEqual(self._grep(compile_pattern(b"needle", ignore_case=True), start, 0x400), [
+            (None, 0x200 - 3, b"needle"),
+            (None, 0x300, b"NEEDLE"),
+        ])
+
+    def test_regex_searches_the_whole_file(self):
+        start = GROUP_DATA_SIZE - 0x200
+        matches = self._grep(compile_pattern(rb"n[e]+dle", regex=True), start, 0x400)
+        self.assertEqual(matches, [(None, 0x200 - 3, b"needle")])
+
+    def test_deep_search_looks_into_archives(self):
+        pattern = compile_pattern(b"needle")
+        self.assertEqual(self._grep(pattern, 0x1000, len(self.packed)), [])
+        self.assertEqual(self._grep(pattern, 0x1000, len(self.packed), deep=True), [
+            ("plain.bin", 2, b"needle"),
+            ("inner.szs", 2, b"needle"),
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import hashlib
+import os
+import unittest
+import zlib
+from io import BytesIO
+
+from wiithon.crypto.layout import GROUP_DATA_SIZE
+from wiithon.crypto.part_reader import CryptPartReader
+from wiithon.disc.hashing import MultiDigest, PartitionDigests, ThreadedMultiDigest, _PartitionSweep
+from wiithon.fst.node import FSTFile
+
+
+def _expected(data: bytes) -> dict[str, str]:
+    return {"crc32": f"{zlib.crc32(data):08x}", "md5": hashlib.md5(data).hexdigest(),
+            "sha1": hashlib.sha1(data).hexdigest()}
+
+
+class TestMultiDigest(unittest.TestCase):
+
+    def test_matches_separate_digests(self):
+        data = os.urandom(0x10000)
+        for digest in (MultiDigest(), ThreadedMultiDigest(queue_size=1)):
+            with self.subTest(digest=type(digest).__name__):
+                for start in range(0, len(data), 0x1000):
+                    digest.update(data[start:start + 0x1000])
+                self.assertEqual(digest.hexdigests(), _expected(data))
+
+    def test_empty(self):
+        self.assertEqual(ThreadedMultiDigest().hexdigests(), _expected(b""))
+
+
+class TestPartitionSweep(unittest.TestCase):
+    """Unhashed development partitions are stored linearly, their groups decode as they are"""
+    START = 0x1234
+
+    def _sweep(self, data_size: int, files: list[tuple[str, FSTFile]], group_limit: int = 100) -> _PartitionSweep:
+        crypto = CryptPartReader(BytesIO(), self.START, bytes(16), encrypted=False, hashed=False)
+        return _PartitionSweep(PartitionDigests("data", 0), crypto, data_size, group_limit, files)
+
+    def _run(self, sweep: _PartitionSweep, image: bytes, chunk_size: int) -> None:
+        for position in range(0, len(image), chunk_size):
+            for group, raw_group in sweep.gather(position, image[position:position + chunk_size]):
+                sweep.digest_group(group, sweep.crypto.decode_group(raw_group))
+        for group, raw_group in sweep.finish_gathering():
+            sweep.digest_group(group, sweep.crypto.decode_group(raw_group))
+        sweep.finish()
+
+    def test_partition_and_files(self):
+        data = os.urandom(GROUP_DATA_SIZE * 2 + 0x100)
+        image = os.urandom(self.START) + data + os.urandom(0x500)
+        files = [
+            ("a.bin", FSTFile("a.bin", 0x10, 0x20)),
+            ("across.bin", FSTFile("across.bin", GROUP_DATA_SIZE - 5, GROUP_DATA_SIZE + 10)),
+            ("empty.bin", FSTFile("empty.bin", 0x40, 0)),
+        ]
+        sweep = self._sweep(len(data), files)
+        self._run(sweep, image, 0x30000)
+
+        self.assertEqual(sweep.result.digests, _expected(data))
+        self.assertEqual(sweep.result.files["a.bin"], _expected(data[0x10:0x30]))
+        self.assertEqual(sweep.result.files["across.bin"], _expected(data[GROUP_DATA_SIZE - 5:2 * GROUP_DATA_SIZE + 5]))
+        self.assertEqual(sweep.result.files["empty.bin"], _expected(b""))
+
+    def test_image_cut_short(self):
+        data = os.urandom(0x1000)
+        sweep = self._sweep(GROUP_DATA_SIZE, [("cut.bin", FSTFile("cut.bin", 0xF00, 0x200))], group_limit=1)
+        self._run(sweep, bytes(self.START) + data, 0x800)
+
+        # Past the end of the image reads as zeros
+        self.assertEqual(sweep.result.digests, _expected(data + bytes(GROUP_DATA_SIZE - len(data))))
+        self.assertEqual(sweep.result.files["cut.bin"], _expected(data[0xF00:] + bytes(0x100)))
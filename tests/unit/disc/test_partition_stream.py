@@ -0,0 +1,54 @@
+import os
+import unittest
+from io import BytesIO
+
+from wiithon.crypto.layout import GROUP_DATA_SIZE
+from wiithon.crypto.part_reader import CryptPartReader
+from wiithon.crypto.part_writer import CryptPartWriter
+from wiithon.disc.partition import WiiPartitionInfo
+from wiithon.exceptions import FstFileNotFoundError, FstIsADirectoryError
+from wiithon.fst.node import FSTDirectory, FSTFile
+from wiithon.fst.tree import FST
+
+TITLE_KEY = bytes(range(16))
+DATA_OFFSET = 0x20000
+
+
+class TestIterFile(unittest.TestCase):
+
+    def setUp(self):
+        self.data = os.urandom(GROUP_DATA_SIZE * 3)
+        stream = BytesIO()
+        writer = CryptPartWriter(stream, DATA_OFFSET, TITLE_KEY)
+        writer.write(self.data)
+        writer.close()
+
+        fst = FST()
+        fst.entries = [FSTFile("file.bin", 0x100, GROUP_DATA_SIZE * 2), FSTDirectory("dir")]
+        self.content = self.data[0x100:0x100 + GROUP_DATA_SIZE * 2]
+        self.partition = WiiPartitionInfo(None, None, [], None, fst, CryptPartReader(stream, DATA_OFFSET, TITLE_KEY), 0)
+
+    def test_chunks_follow_groups(self):
+        chunks = list(self.partition.iter_file("file.bin"))
+        self.assertEqual([len(chunk) for chunk in chunks], [GROUP_DATA_SIZE - 0x100, GROUP_DATA_SIZE, 0x100])
+        self.assertEqual(b"".join(chunks), self.content)
+
+    def test_ranges(self):
+        for offset, length in ((0, 0), (0x10, 0x20), (GROUP_DATA_SIZE - 0x200, 0x400), (0x1000, None),
+                               (len(self.content) - 4, 100), (len(self.content) + 1, None)):
+            with self.subTest(offset=offset, length=length):
+                end = None if length is None else offset + length
+                self.assertEqual(b"".join(self.partition.iter_file("file.bin", offset, length)),
+                                 self.content[offset:end])
+
+    def test_errors(self):
+        with self.assertRaises(FstFileNotFoundError):
+            list(self.partition.iter_file("missing.bin"))
+        with self.assertRaises(FstIsADirectoryError):
+            list(self.partition.iter_file("dir"))
+        with self.assertRaises(ValueError):
+            list(self.partition.iter_file("file.bin", -1))
+
+
+if __name__ == "__main__":
+    unittest.main()
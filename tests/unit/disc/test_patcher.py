@@ -9,6 +9,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 from wiithon.disc.enums import WiiPartType
 from wiithon.disc.patcher import WiiIsoPatcher
 from wiithon.fst.node import FSTDirectory, FSTFile
+from wiithon.fst.tree import FST
 
 
 def _make_patcher():
@@ -136,7 +137,7 @@ class TestRemoveFile(unittest.TestCase):
 class TestBuildFstModifier(unittest.TestCase):
 
     def _fst_with(self, *entries):
-        fst = MagicMock()
+        fst = FST()
         fst.entries = list(entries)
         return fst
 
@@ -287,6 +288,95 @@ class TestBuildIntegration(unittest.TestCase):
 
         mock_flush.assert_called_once_with(p)
 
+# variants
+class TestVariants(unittest.TestCase):
+
+    def setUp(self):
+        self.patcher = _make_patcher()
+        entry = MagicMock()
+        entry.part_type = WiiPartType.DATA
+        self.patcher.reader.partitions = [entry]
+        self.patcher.data_partition.fst.find_node.side_effect = (
+            lambda path: FSTFile(name=path, offset=0, length=1) if path.startswith("old") else None
+        )
+
+    def _source_kwargs(self, overrides):
+        with patch("wiithon.disc.patcher.CopyPartitionSource") as mock_source:
+            self.patcher._copy_source(self.patcher.reader.partitions[0], overrides)
+        return mock_source.call_args.kwargs
+
+    def test_duplicate_name_rejected(self):
+        self.patcher.add_variant("eu", "eu.iso")
+        with self.assertRaises(ValueError):
+            self.patcher.add_variant("eu", "other.iso")
+
+    def test_paths_are_normalized(self):
+        self.patcher.add_variant("eu", "eu.iso", {"/old.bin": b"x"})
+        self.assertEqual(self.patcher.variants["eu"], ("eu.iso", {"old.bin": b"x"}))
+
+    def test_override_replaces_existing_file(self):
+        kwargs = self._source_kwargs({"old.bin": b"x"})
+        self.assertEqual(kwargs["file_overrides"], {"old.bin": b"x"})
+        self.assertIsNone(kwargs["fst_modifier"])
+
+    def test_override_adds_missing_file(self):
+        kwargs = self._source_kwargs({"new.bin": b"x"})
+        self.assertEqual(kwargs["file_overrides"], {"new.bin": b"x"})
+        self.assertIsNotNone(kwargs["fst_modifier"])
+
+    def test_override_of_directory_is_added(self):
+        self.patcher.data_partition.fst.find_node.side_effect = lambda path: FSTDirectory(name=path)
+        kwargs = self._source_kwargs({"files": b"x"})
+        self.assertEqual(kwargs["file_overrides"], {"files": b"x"})
+        self.assertIsNotNone(kwargs["fst_modifier"])
+
+    def test_variant_overrides_win(self):
+        self.patcher.replace_file("old.bin", b"base")
+        self.patcher.replace_file("old2.bin", b"base")
+        kwargs = self._source_kwargs({"old.bin": b"variant"})
+        self.assertEqual(kwargs["file_overrides"], {"old.bin": b"variant", "old2.bin": b"base"})
+
+    def test_none_removes_file(self):
+        self.patcher.replace_file("old.bin", b"base")
+        kwargs = self._source_kwargs({"old.bin": None})
+        self.assertEqual(kwargs["file_overrides"], {})
+        self.assertIsNotNone(kwargs["fst_modifier"])
+
+    def test_none_drops_added_file(self):
+        self.patcher.add_file("new.bin", b"base")
+        kwargs = self._source_kwargs({"new.bin": None})
+        self.assertEqual(kwargs["file_overrides"], {})
+        self.assertIsNone(kwargs["fst_modifier"])
+
+    def test_patcher_is_left_untouched(self):
+        self.patcher.replace_file("old.bin", b"base")
+        self._source_kwargs({"old.bin": None, "new.bin": b"x"})
+        self.assertEqual(self.patcher.file_replacements, {"old.bin": b"base"})
+        self.assertEqual(self.patcher.files_to_add, {})
+        self.assertEqual(self.patcher.files_to_remove, [])
+
+    def test_build_without_variant(self):
+        with self.assertRaises(ValueError):
+            self.patcher.build_variants()
+
+    @patch("wiithon.disc.patcher.SharedCryptPartReader")
+    @patch("wiithon.disc.patcher.WiiDiscBuilder")
+    @patch("wiithon.disc.patcher.CopyPartitionSource")
+    def test_every_variant_is_built_with_shared_readers(self, mock_source, mock_builder, mock_shared):
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ("eu", "us"):
+                self.patcher.add_variant(name, os.path.join(tmp, f"{name}.iso"))
+            self.patcher.build_variants()
+
+            self.assertTrue(os.path.exists(os.path.join(tmp, "us.iso")))
+
+        self.assertEqual(mock_builder.return_value.finish.call_count, 2)
+        mock_shared.assert_called_once()
+        for call in mock_source.call_args_list:
+            self.assertIs(call.kwargs["crypto"], mock_shared.return_value)
+        caches = {call.kwargs["encrypted_cache"] for call in mock_builder.call_args_list}
+        self.assertEqual(len(caches), 1)
+
 # patch_dol
 class TestPatchDol(unittest.TestCase):
     def setUp(self):
@@ -0,0 +1,55 @@
+import unittest
+
+from wiithon.crypto.layout import BLOCK_DATA_SIZE, BLOCK_PER_GROUP, BLOCK_SIZE, GROUP_SIZE
+from wiithon.disc.layout import FIRST_PARTITION_OFFSET
+from wiithon.disc.usage import DiscUsage, PartitionUsage
+
+PARTITION = 0x50000
+DATA = PARTITION + 0x20000
+
+
+class TestPartitionUsage(unittest.TestCase):
+
+    def test_mark_spans_blocks(self):
+        usage = PartitionUsage(PARTITION, DATA)
+        usage.mark(BLOCK_DATA_SIZE - 1, 2)
+        usage.mark(5 * BLOCK_DATA_SIZE, 0)
+        self.assertEqual(list(usage.blocks), [1, 1])
+        self.assertEqual(usage.used_blocks(), 2)
+
+    def test_image_ranges(self):
+        usage = PartitionUsage(PARTITION, DATA)
+        usage.mark(0, 10)
+        usage.mark(3 * BLOCK_DATA_SIZE, BLOCK_DATA_SIZE * 2)
+        usage.mark(BLOCK_PER_GROUP * BLOCK_DATA_SIZE, 1)
+
+        self.assertEqual(usage.image_ranges(), [
+            (DATA, DATA + BLOCK_SIZE),
+            (DATA + 3 * BLOCK_SIZE, DATA + 5 * BLOCK_SIZE),
+            (DATA + GROUP_SIZE, DATA + GROUP_SIZE + BLOCK_SIZE),
+        ])
+        self.assertEqual(usage.used_groups(), [0, 1])
+        self.assertEqual(usage.image_ranges(whole_groups=True), [(DATA, DATA + 2 * GROUP_SIZE)])
+
+    def test_unhashed_blocks_are_linear(self):
+        usage = PartitionUsage(PARTITION, DATA, hashed=False)
+        usage.mark(BLOCK_DATA_SIZE, 1)
+        self.assertEqual(usage.image_ranges(), [(DATA + BLOCK_DATA_SIZE, DATA + 2 * BLOCK_DATA_SIZE)])
+
+
+class TestDiscUsage(unittest.TestCase):
+
+    def test_used_ranges_merge_headers(self):
+        partition = PartitionUsage(PARTITION, DATA)
+        partition.mark(0, 1)
+        partition.mark(10 * BLOCK_DATA_SIZE, 1)
+        usage = DiscUsage(DATA + 10 * BLOCK_SIZE + 0x100, [partition])
+
+        self.assertEqual(usage.used_ranges(), [
+            (0, DATA + BLOCK_SIZE),
+            (DATA + 10 * BLOCK_SIZE, DATA + 10 * BLOCK_SIZE + 0x100),
+        ])
+        self.assertEqual(usage.used_bytes(), DATA + BLOCK_SIZE + 0x100)
+
+    def test_no_partition(self):
+        self.assertEqual(DiscUsage(FIRST_PARTITION_OFFSET * 2, []).used_ranges(), [(0, FIRST_PARTITION_OFFSET)])
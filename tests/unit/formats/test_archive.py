@@ -1,11 +1,21 @@
+import tempfile
 import unittest
 from io import BytesIO
+from pathlib import Path
 from unittest.mock import MagicMock, patch
 
 from wiithon import InvalidFormatError
 from wiithon.disc.patcher import WiiIsoPatcher
 from wiithon.formats import archive
-from wiithon.formats.archive import flush_archive_cache, resolve_read, resolve_write
+from wiithon.formats.archive import (
+    flush_archive_cache,
+    is_packed,
+    resolve_read,
+    resolve_write,
+    unpack_to,
+    walk_members,
+)
+from wiithon.formats.lz77 import Lz77
 from wiithon.formats.rarc import NodeAttribute, Rarc, RarcFileEntry, RarcNode
 from wiithon.formats.yaz0 import Yaz0
 
@@ -381,5 +391,64 @@ class TestArchiveCache(unittest.TestCase):
         self.assertEqual(int.from_bytes(rarc.get_file("a.bin").data, "big"), 10)
 
 
+class TestUnpackTo(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+
+    def test_nested_archives_become_directories(self):
+        inner = Rarc.create_empty()
+        inner.add_file("deep.bin", b"deep")
+        outer = Rarc.create_empty()
+        outer.add_node("layout")
+        outer.add_file("layout/inner.arc", Yaz0.from_data(inner.get_bytes()).get_bytes())
+        outer.add_file("text.bin", b"text")
+
+        data = Yaz0.from_data(outer.get_bytes()).get_bytes()
+        self.assertTrue(is_packed(data))
+        self.assertEqual(unpack_to(data, self.root / "stage.arc"), 2)
+        self.assertFalse((self.root / "stage.arc").exists())
+        self.assertEqual((self.root / "stage.arc.d" / "text.bin").read_bytes(), b"text")
+        self.assertEqual((self.root / "stage.arc.d" / "layout" / "inner.arc.d" / "deep.bin").read_bytes(), b"deep")
+
+    def test_walk_members_follows_nested_archives(self):
+        inner = Rarc.create_empty()
+        inner.add_file("deep.bin", b"deep")
+        outer = Rarc.create_empty()
+        packed_inner = Yaz0.from_data(inner.get_bytes()).get_bytes()
+        outer.add_file("inner.szs", packed_inner)
+
+        self.assertEqual(list(walk_members(Yaz0.from_data(outer.get_bytes()).get_bytes())), [
+            ("inner.szs", packed_inner),
+            ("inner.szs/deep.bin", b"deep"),
+        ])
+        self.assertEqual(list(walk_members(b"plain data")), [])
+
+    def test_compressed_file_is_decompressed(self):
+        lz = Lz77()
+        lz.magic_word = "LZ77"
+        lz.compression_method = 0x10
+        lz.data = b"message " * 20
+        self.assertEqual(unpack_to(lz.get_bytes(), self.root / "msg.lz"), 1)
+        self.assertEqual((self.root / "msg.lz").read_bytes(), b"message " * 20)
+
+    def test_unreadable_data_is_kept(self):
+        data = b"RARC" + bytes(12)
+        self.assertEqual(unpack_to(data, self.root / "bad.arc"), 1)
+        self.assertEqual((self.root / "bad.arc").read_bytes(), data)
+        self.assertFalse(is_packed(b"\x00\x00"))
+
+    def test_members_stay_in_the_archive_directory(self):
+        rarc = Rarc.create_empty()
+        rarc.add_file("ok.bin", b"ok")
+        rarc.add_file("evil.bin", b"evil").name = "../escape"
+        data = rarc.get_bytes()
+        self.assertIn(("../escape", b"evil"), list(Rarc.read(BytesIO(data)).iter_files()))
+        self.assertEqual(unpack_to(data, self.root / "x" / "a.arc"), 1)
+        self.assertFalse((self.root / "x" / "escape").exists())
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -231,6 +231,15 @@ class TestRarc(unittest.TestCase):
         self.assertEqual(reloaded.get_file("hello.txt").data, b"Hello World!")
         self.assertEqual(reloaded.nodes[0].entry_count, 3)
 
+    def test_iter_files_walks_subdirectories(self):
+        rarc = Rarc.create_empty()
+        rarc.add_file("top.bin", b"top")
+        rarc.add_node("sub")
+        rarc.add_file("sub/inner.bin", b"inner")
+        reloaded = Rarc.read(BytesIO(rarc.get_bytes()))
+
+        self.assertEqual(sorted(reloaded.iter_files()), [("sub/inner.bin", b"inner"), ("top.bin", b"top")])
+
     def test_add_node_creates_subdirectory(self):
         rarc = Rarc.create_empty()
         sub_node = rarc.add_node("sub")
@@ -87,6 +87,9 @@ class TestU8Read(unittest.TestCase):
         with self.assertRaises(ArchiveIsADirectoryError):
             self.u8.get_file("meta")
 
+    def test_iter_files(self):
+        self.assertEqual(list(self.u8.iter_files()), [(f"meta/{name}", data) for name, data in SAMPLE.items()])
+
 
 class TestU8Replace(unittest.TestCase):
 
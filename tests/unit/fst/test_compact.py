@@ -0,0 +1,77 @@
+import unittest
+from io import BytesIO
+
+from wiithon.fst.compact import CompactDirectory, CompactFile, CompactFST
+from wiithon.fst.node import FSTDirectory, FSTFile
+from wiithon.fst.tree import FST
+
+
+class TestCompactFST(unittest.TestCase):
+
+    def setUp(self):
+        stage = FSTDirectory("Stage")
+        objects = FSTDirectory("Object")
+        objects.children = [FSTFile("Kuribo.arc", 0x1000, 0x20), FSTFile("マリオ.szs", 0x2000, 0x40)]
+        stage.children = [FSTFile(f"Map{i}.arc", 0x3000 + i * 0x100, 0x80) for i in range(3)] + [objects]
+        self.fst = FST()
+        self.fst.entries = [stage, FSTDirectory("empty"), FSTFile("opening.bnr", 0x8000, 0x20)]
+        self.compact = CompactFST.from_tree(self.fst)
+
+    def _paths(self, fst: FST | CompactFST) -> list[tuple]:
+        return [(path, node.is_directory, getattr(node, "offset", None), getattr(node, "length", None))
+                for path, node in fst.walk()]
+
+    def test_navigation(self):
+        self.assertEqual(len(self.compact), 10)
+        self.assertEqual([node.name for node in self.compact.entries], ["Stage", "empty", "opening.bnr"])
+        self.assertEqual(self._paths(self.compact), self._paths(self.fst))
+        self.assertEqual(self.compact.count_files(), self.fst.count_files())
+
+        node = self.compact.find_node("Stage/Object/マリオ.szs")
+        self.assertIsInstance(node, CompactFile)
+        self.assertEqual((node.offset, node.length, node.path), (0x2000, 0x40, "Stage/Object/マリオ.szs"))
+        self.assertEqual(node.parent, self.compact.find_node("Stage/Object"))
+        self.assertEqual(self.compact.find_node("stage/object/KURIBO.arc", case_sensitive=False),
+                         self.compact.find_node("Stage/Object/Kuribo.arc"))
+        self.assertIsNone(self.compact.find_node("Stage/Map0.arc/x"))
+        self.assertIsNone(self.compact.find_node("Stage/Missing"))
+
+        stage = self.compact.find_node("Stage")
+        self.assertIsInstance(stage, CompactDirectory)
+        self.assertEqual(stage.count_files(), 5)
+        self.assertEqual(stage.find("Object/Kuribo.arc").name, "Kuribo.arc")
+        self.assertEqual([path for path, _ in self.compact.walk("Stage/Object")],
+                         ["Stage/Object/Kuribo.arc", "Stage/Object/マリオ.szs"])
+        self.assertEqual(self.compact.find_node("empty").children, [])
+
+    def test_round_trip(self):
+        self.assertEqual(self._paths(self.compact.to_tree()), self._paths(self.fst))
+
+        out = BytesIO()
+        self.compact.write(out)
+        self.assertEqual(self._paths(FST.from_bytes(out.getvalue())), self._paths(self.fst))
+        for compact in (CompactFST.from_bytes(out.getvalue()), CompactFST.read(out, offset=0)):
+            self.assertEqual(compact.to_bytes(), out.getvalue())
+
+        # Written by the object tree
+        out = BytesIO()
+        self.fst.write(out)
+        self.assertEqual(self._paths(CompactFST.from_bytes(b"\x00" * 4 + out.getvalue(), offset=4)),
+                         self._paths(self.fst))
+
+    def test_file_views_write_through(self):
+        node = self.compact.find_node("opening.bnr")
+        node.offset = 0x12340
+        node.length = 0x99
+        self.assertEqual(self.compact.to_tree().find_node("opening.bnr").offset, 0x12340)
+        self.assertEqual(self.compact.find_node("opening.bnr").length, 0x99)
+
+    def test_empty(self):
+        for compact in (CompactFST.from_tree([]), CompactFST.from_bytes(b"")):
+            self.assertEqual(compact.entries, [])
+            self.assertEqual(compact.to_tree().entries, [])
+            self.assertIsNone(compact.find_node("a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
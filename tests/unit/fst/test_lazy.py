@@ -0,0 +1,67 @@
+import unittest
+from io import BytesIO
+
+from wiithon.fst.lazy import LazyFSTDirectory
+from wiithon.fst.node import FSTDirectory, FSTFile
+from wiithon.fst.tree import FST
+
+
+class TestLazyFST(unittest.TestCase):
+
+    def setUp(self):
+        objects = FSTDirectory("Object")
+        objects.children = [FSTFile("Kuribo.arc", 0x1000, 0x20), FSTFile("マリオ.szs", 0x2000, 0x40)]
+        stage = FSTDirectory("Stage")
+        stage.children = [FSTFile(f"Map{i}.arc", 0x3000 + i * 0x100, 0x80) for i in range(3)] + [objects]
+        sound = FSTDirectory("Sound")
+        sound.children = [FSTFile("bgm.brstm", 0x9000, 0x100)]
+        self.fst = FST()
+        self.fst.entries = [stage, sound, FSTDirectory("empty"), FSTFile("opening.bnr", 0x8000, 0x20)]
+        out = BytesIO()
+        self.fst.write(out)
+        self.data = out.getvalue()
+
+    def _paths(self, fst: FST) -> list[tuple]:
+        return [(path, type(node) is FSTFile, getattr(node, "offset", None), getattr(node, "length", None))
+                for path, node in fst.walk()]
+
+    def test_same_tree(self):
+        lazy = FST.from_bytes(self.data, lazy=True)
+        self.assertEqual(lazy.count_files(), self.fst.count_files())
+        self.assertEqual(self._paths(lazy), self._paths(self.fst))
+        self.assertEqual(self._paths(FST.read(BytesIO(self.data), offset=0, lazy=True)), self._paths(self.fst))
+
+        out = BytesIO()
+        lazy.write(out)
+        self.assertEqual(out.getvalue(), self.data)
+
+    def test_only_the_path_is_built(self):
+        lazy = FST.from_bytes(self.data, lazy=True)
+        stage, sound = lazy.entries[0], lazy.entries[1]
+        self.assertIsInstance(stage, LazyFSTDirectory)
+        self.assertFalse(stage.is_loaded)
+
+        node = lazy.find_node("Stage/Object/マリオ.szs")
+        self.assertEqual((node.offset, node.length), (0x2000, 0x40))
+        self.assertTrue(stage.is_loaded)
+        self.assertTrue(stage.children[3].is_loaded)
+        self.assertFalse(sound.is_loaded)
+
+        # Counted from the node table
+        self.assertEqual(sound.count_files(), 1)
+        self.assertFalse(sound.is_loaded)
+
+    def test_edits(self):
+        lazy = FST.from_bytes(self.data, lazy=True)
+        stage = lazy.entries[0]
+        stage.children.append(FSTFile("New.arc", 0xA000, 0x10))
+        self.assertEqual(lazy.find_node("Stage/New.arc").offset, 0xA000)
+        self.assertEqual(stage.count_files(), 6)
+
+        sound = lazy.entries[1]
+        sound.children = []
+        self.assertIsNone(lazy.find_node("Sound/bgm.brstm"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,7 +2,7 @@ import unittest
 
 from wiithon.exceptions import FstError
 from wiithon.fst.node import FSTDirectory, FSTFile, FSTNode
-from wiithon.fst.operations import add_node, find_node, remove_node
+from wiithon.fst.operations import add_node, file_nodes, find_node, remove_node
 
 
 class TestFindNode(unittest.TestCase):
@@ -111,5 +111,18 @@ class TestAddNode(unittest.TestCase):
             add_node(entries, ["Data", "movie", "intro.thp", "impossible"], new_file)
 
 
+
+class TestFileNodes(unittest.TestCase):
+    """Unit tests for file_nodes."""
+
+    def test_files_with_paths(self) -> None:
+        movie = FSTDirectory("movie")
+        intro = FSTFile("intro.thp", offset=0x1000, length=0x5000)
+        movie.children = [intro, FSTDirectory("empty")]
+        banner = FSTFile("opening.bnr", offset=0, length=0x20)
+        self.assertEqual(list(file_nodes([movie, banner])), [("movie/intro.thp", intro), ("opening.bnr", banner)])
+        self.assertEqual(list(file_nodes([movie], "Data/")), [("Data/movie/intro.thp", intro)])
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,111 @@
+import unittest
+
+from wiithon.fst.node import FSTDirectory, FSTFile
+from wiithon.fst.operations import add_node, find_node, remove_node
+from wiithon.fst.tree import FST
+
+
+class TestPathIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.stage = FSTDirectory("Stage")
+        self.stage.children = [FSTFile(f"Map{i:04}.arc", i * 0x100, 0x100) for i in range(2000)]
+        self.object = FSTDirectory("Object")
+        self.object.children = [FSTFile("Kuribo.arc", 0, 0x20), FSTFile("Mario.szs", 0x20, 0x40)]
+        self.object_data = FSTDirectory("ObjectData")
+        self.object_data.children = [self.object]
+        self.stage.children.append(self.object_data)
+        self.fst = FST()
+        self.fst.entries = [self.stage, FSTFile("opening.bnr", 0, 0x20)]
+
+    def test_lookup(self):
+        self.assertIs(self.fst.find_node("Stage/Map1999.arc"), self.stage.children[1999])
+        self.assertIs(self.fst.find_node(["Stage", "ObjectData", "Object", "Mario.szs"]), self.object.children[1])
+        self.assertIs(self.fst.find_node("\\Stage\\ObjectData/"), self.object_data)
+        self.assertIsNone(self.fst.find_node("Stage/Map2000.arc"))
+        self.assertIsNone(self.fst.find_node(""))
+        # A file in the middle of the path
+        self.assertIsNone(self.fst.find_node("opening.bnr/Map0000.arc"))
+
+    def test_case_insensitive_lookup(self):
+        self.assertIsNone(self.fst.find_node("stage/map0001.ARC"))
+        self.assertIs(self.fst.find_node("stage/map0001.ARC", case_sensitive=False), self.stage.children[1])
+
+    def test_changed_children_are_indexed_again(self):
+        self.assertIsNotNone(self.fst.find_node("Stage/Map0000.arc"))
+
+        added = FSTFile("New.arc", 0, 0x10)
+        self.stage.children.append(added)
+        self.assertIs(self.fst.find_node("Stage/New.arc"), added)
+
+        self.stage.children.remove(added)
+        self.assertIsNone(self.fst.find_node("Stage/New.arc"))
+
+        replaced = FSTFile("Other.arc", 0, 0x10)
+        self.stage.children[0] = replaced
+        self.assertIsNone(self.fst.find_node("Stage/Map0000.arc"))
+        self.assertIs(self.fst.find_node("Stage/Other.arc"), replaced)
+
+        self.stage.children = [added]
+        self.assertIs(self.fst.find_node("Stage/New.arc"), added)
+
+    def test_rename(self):
+        node = self.fst.find_node("Stage/Map0005.arc")
+        node.name = "Renamed.arc"
+        self.assertIsNone(self.fst.find_node("Stage/Map0005.arc"))
+        self.fst.invalidate_index()
+        self.assertIs(self.fst.find_node("Stage/Renamed.arc"), node)
+
+    def test_child_swapped_without_changing_length(self):
+        directory = FSTDirectory("d")
+        directory.children = [FSTFile("a", 0, 0x10), FSTFile("b", 0x10, 0x10)]
+        self.fst.entries.append(directory)
+        self.assertIs(self.fst.find_node("d/a"), directory.children[0])
+
+        remove_node(self.fst.entries, ["d", "b"])
+        added = FSTFile("c", 0x20, 0x10)
+        add_node(self.fst.entries, ["d"], added)
+        self.assertIs(self.fst.find_node("d/c"), added)
+        self.assertIs(find_node(self.fst.entries, ["d", "c"]), added)
+
+    def test_root_entry_swapped_through_the_fst(self):
+        self.assertIs(find_node(self.fst, ["opening.bnr"]), self.fst.entries[1])
+
+        remove_node(self.fst, ["opening.bnr"])
+        added = FSTFile("banner.bin", 0, 0x20)
+        add_node(self.fst, [], added)
+        self.assertIs(self.fst.find_node("banner.bin"), added)
+        self.assertIsNone(find_node(self.fst, ["opening.bnr"]))
+
+    def test_miss_keeps_the_map(self):
+        self.assertIsNone(self.fst.find_node("Stage/Missing.arc"))
+        index = self.stage.child_index
+        self.assertIsNone(self.fst.find_node("Stage/Other.arc"))
+        self.assertIs(self.stage.child_index, index)
+
+    def test_glob(self):
+        self.assertEqual([path for path, _ in self.fst.glob("Stage/Map000?.arc")],
+                         [f"Stage/Map000{i}.arc" for i in range(10)])
+        self.assertEqual([path for path, _ in self.fst.glob("**/*.szs")], ["Stage/ObjectData/Object/Mario.szs"])
+        self.assertEqual([path for path, _ in self.fst.glob("stage/objectdata/*/*.ARC", case_sensitive=False)],
+                         ["Stage/ObjectData/Object/Kuribo.arc"])
+        self.assertEqual(self.fst.glob("Missing/*"), [])
+
+    def test_walk(self):
+        self.assertEqual([path for path, _ in self.fst.walk("Stage/ObjectData")],
+                         ["Stage/ObjectData/Object", "Stage/ObjectData/Object/Kuribo.arc",
+                          "Stage/ObjectData/Object/Mario.szs"])
+        self.assertEqual(len(self.fst.walk()), 2000 + 6)
+        self.assertEqual(self.fst.walk("opening.bnr"), [])
+
+    def test_operations_find_node(self):
+        self.assertIs(find_node(self.fst.entries, ["Stage", "ObjectData", "Object"]), self.object)
+        self.assertIs(find_node(self.fst.entries, ["opening.bnr"]), self.fst.entries[1])
+        self.assertIsNone(find_node(self.fst.entries, ["opening.bnr", "x"]))
+        self.assertIsNone(find_node(self.fst.entries, []))
+
+        self.assertIs(find_node(self.fst, ["Stage", "ObjectData", "Object"]), self.object)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -130,6 +130,28 @@ class TestFST(unittest.TestCase):
         fst2 = FST.read(out, offset=0)
         self.assertEqual(len(fst2.entries), 0)
 
+    def test_from_bytes(self) -> None:
+        raw = self._build_raw_fst()
+        fst1 = FST.read(BytesIO(raw), offset=0)
+
+        # Data around the FST is ignored
+        fst2 = FST.from_bytes(b"\xff" * 0x20 + raw + b"trailing", offset=0x20)
+        self._compare_nodes(fst1.entries, fst2.entries)
+
+        stream = BytesIO(b"\xff" * 0x20 + raw + b"trailing")
+        self._compare_nodes(fst1.entries, FST.read(stream, offset=0x20).entries)
+
+    def test_shift_jis_names(self) -> None:
+        fst = FST()
+        directory = FSTDirectory("ステージ")
+        directory.children = [FSTFile("マリオ.arc", 0x100, 0x20)]
+        fst.entries = [directory, FSTFile("opening.bnr", 0x200, 0x40)]
+        out = BytesIO()
+        fst.write(out)
+
+        for fst2 in (FST.from_bytes(out.getvalue()), FST.read(BytesIO(out.getvalue()), offset=0)):
+            self._compare_nodes(fst.entries, fst2.entries)
+
     def _compare_nodes(self, a: list, b: list) -> None:
         """Recursively compare two lists of FSTNodes."""
         self.assertEqual(len(a), len(b))
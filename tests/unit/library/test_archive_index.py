@@ -0,0 +1,49 @@
+import unittest
+
+from wiithon.library.archive_index import ArchiveIndex
+
+
+class TestArchiveIndexQueries(unittest.TestCase):
+
+    def setUp(self):
+        self.index = ArchiveIndex(":memory:")
+        self.addCleanup(self.index.close)
+        with self.index.connection as connection:
+            for disc in ("/discs/v1.iso", "/discs/v2.iso"):
+                connection.execute("INSERT INTO indexed_discs VALUES (?, 0, 0, 'RTST01', 0)", (disc,))
+            connection.executemany("INSERT INTO file_digests VALUES (?, 'data', ?, 0, 0, NULL, ?)", [
+                ("/discs/v1.iso", "stage.arc", "aa"),
+                ("/discs/v2.iso", "stage.arc", "aa"),
+                ("/discs/v2.iso", "other.arc", "bb"),
+            ])
+            connection.executemany("INSERT INTO packed_scans VALUES (?, 1, ?)", [("aa", 2), ("bb", 1)])
+            connection.executemany("INSERT INTO archive_members VALUES (?, ?, ?, ?, ?)", [
+                ("aa", "jmp/ObjNameTable.bcsv", "ObjNameTable.bcsv", 10, "11"),
+                ("aa", "jmp/layout.szs", "layout.szs", 20, "22"),
+                ("bb", "ObjNameTable.bcsv", "ObjNameTable.bcsv", 30, "33"),
+            ])
+
+    def test_find_member_by_name(self):
+        matches = [(m.disc, m.archive, m.member) for m in self.index.find_member("ObjNameTable.bcsv")]
+        self.assertEqual(matches, [
+            ("/discs/v1.iso", "stage.arc", "jmp/ObjNameTable.bcsv"),
+            ("/discs/v2.iso", "other.arc", "ObjNameTable.bcsv"),
+            ("/discs/v2.iso", "stage.arc", "jmp/ObjNameTable.bcsv"),
+        ])
+
+    def test_find_member_by_path(self):
+        matches = self.index.find_member("/jmp/ObjNameTable.bcsv")
+        self.assertEqual([(m.disc, m.size, m.sha1) for m in matches], [("/discs/v1.iso", 10, "11"),
+                                                                        ("/discs/v2.iso", 10, "11")])
+        self.assertEqual(self.index.find_member("nope.bcsv"), [])
+
+    def test_members(self):
+        self.assertEqual(self.index.members("AA"), [("jmp/ObjNameTable.bcsv", 10, "11"), ("jmp/layout.szs", 20, "22")])
+
+    def test_removed_disc_is_not_found(self):
+        self.index.remove("/discs/v2.iso")
+        self.assertEqual([m.disc for m in self.index.find_member("ObjNameTable.bcsv")], ["/discs/v1.iso"])
+
+
+if __name__ == "__main__":
+    unittest.main()
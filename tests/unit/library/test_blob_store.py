@@ -0,0 +1,68 @@
+import hashlib
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from wiithon.exceptions import InvalidFormatError
+from wiithon.fst.node import FSTFile
+from wiithon.library.blob_store import BlobStore, DiscManifest, StoredFile, StoreResult
+
+
+class TestBlobStore(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        self.store = BlobStore(self.root / "store")
+        self.data = os.urandom(0x300000)
+
+    def _store(self, offset: int, length: int) -> tuple[str, StoreResult]:
+        result = StoreResult(DiscManifest("disc", "RTST01", 0))
+        node = FSTFile("file.bin", offset, length)
+        sha1 = self.store._store_blob(lambda position, size: self.data[position:position + size], node, result)
+        return sha1, result
+
+    def test_blob_is_written_once(self):
+        sha1, result = self._store(0x100, 0x250000)
+        self.assertEqual(sha1, hashlib.sha1(self.data[0x100:0x250100]).hexdigest())
+        self.assertEqual(self.store.blob_path(sha1).read_bytes(), self.data[0x100:0x250100])
+        self.assertEqual((result.written, result.existing, result.bytes_written), (1, 0, 0x250000))
+
+        _, result = self._store(0x100, 0x250000)
+        self.assertEqual((result.written, result.existing), (0, 1))
+        self.assertEqual(list(self.store.tmp.iterdir()), [])
+
+    def test_manifest_round_trip(self):
+        manifest = DiscManifest("disc", "RTST01", 1)
+        manifest.partitions["data"] = [StoredFile("a/b.bin", 0x10, 0x20, "ab" * 20, bytes(20)),
+                                       StoredFile("c.bin", 0x40, 0, "cd" * 20)]
+        self.store.save_manifest(manifest)
+
+        loaded = self.store.load_manifest("disc")
+        self.assertEqual(self.store.manifest_names(), ["disc"])
+        self.assertEqual(loaded.to_dict(), manifest.to_dict())
+
+    def test_invalid_manifest(self):
+        (self.store.manifests / "bad.json").write_text("{}", encoding="utf-8")
+        with self.assertRaises(InvalidFormatError):
+            self.store.load_manifest("bad")
+
+    def test_materialize(self):
+        sha1, _ = self._store(0, 0x10)
+        manifest = DiscManifest("disc", "RTST01", 0)
+        manifest.partitions["data"] = [StoredFile("dir/a.bin", 0, 0x10, sha1), StoredFile("b.bin", 0, 0x10, sha1)]
+        self.store.save_manifest(manifest)
+
+        for hardlink in (True, False):
+            with self.subTest(hardlink=hardlink):
+                dest = self.root / f"out-{hardlink}"
+                self.assertEqual(self.store.materialize("disc", dest, hardlink=hardlink), 2)
+                self.assertEqual((dest / "data" / "dir" / "a.bin").read_bytes(), self.data[:0x10])
+                linked = (dest / "data" / "b.bin").stat().st_ino == self.store.blob_path(sha1).stat().st_ino
+                self.assertEqual(linked, hardlink)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from wiithon.library.catalog import DiscRecord, LibraryCatalog
+from wiithon.library.scanner import scan_library
+
+
+def _record(path: str, **kwargs) -> DiscRecord:
+    return DiscRecord(path, 100, 5, game_id="RMGE01", title="Super Mario Galaxy", disc_number=0, version=1,
+                      region=1, partitions=["update", "data"], **kwargs)
+
+
+class TestLibraryCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = LibraryCatalog(":memory:")
+        self.addCleanup(self.catalog.close)
+
+    def test_round_trip(self):
+        self.catalog.put(_record("/discs/a.iso", files=[("sys/main.dol", 0x10, 0x20), ("a.bin", 0x8, 0x4)]))
+        record = self.catalog.get("/discs/a.iso")
+
+        self.assertEqual(record.game_id, "RMGE01")
+        self.assertEqual(record.partitions, ["update", "data"])
+        self.assertEqual(record.files, [("a.bin", 0x8, 0x4), ("sys/main.dol", 0x10, 0x20)])
+        self.assertEqual(record.to_dict()["files_size"], 0x24)
+        self.assertIsNone(self.catalog.get("/discs/b.iso"))
+
+    def test_is_current(self):
+        self.catalog.put(_record("/discs/a.iso"))
+
+        self.assertTrue(self.catalog.is_current("/discs/a.iso", 100, 5))
+        self.assertFalse(self.catalog.is_current("/discs/a.iso", 100, 6))
+        self.assertFalse(self.catalog.is_current("/discs/a.iso", 101, 5))
+        self.assertFalse(self.catalog.is_current("/discs/a.iso", 100, 5, with_fst=True))
+
+    def test_put_replaces_files(self):
+        self.catalog.put(_record("/discs/a.iso", files=[("a.bin", 0, 1)]))
+        self.catalog.put(_record("/discs/a.iso", files=[("b.bin", 0, 1)]))
+        self.assertEqual(self.catalog.get("/discs/a.iso").files, [("b.bin", 0, 1)])
+
+        self.catalog.remove("/discs/a.iso")
+        self.assertEqual(self.catalog.connection.execute("SELECT COUNT(*) FROM fst_files").fetchone()[0], 0)
+
+    def test_paths_under_root(self):
+        for path in ("/discs/a.iso", "/discs/sub/b.iso", "/other/c.iso"):
+            self.catalog.put(_record(path))
+        self.assertEqual(self.catalog.paths("/discs"), ["/discs/a.iso", "/discs/sub/b.iso"])
+        self.assertEqual(len(self.catalog.discs("RMGE01")), 3)
+        self.assertEqual(self.catalog.discs("RSBE01"), [])
+
+
+class TestScanLibrary(unittest.TestCase):
+    """Unreadable images are cataloged with their error, so they are not read again until they change"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name).resolve()
+        self.catalog = LibraryCatalog(":memory:")
+        self.addCleanup(self.catalog.close)
+
+    def test_rescan_only_reads_changed_images(self):
+        (self.root / "sub").mkdir()
+        (self.root / "a.iso").write_bytes(os.urandom(0x100))
+        (self.root / "sub" / "b.wbfs").write_bytes(os.urandom(0x100))
+        (self.root / "notes.txt").write_text("not a disc")
+
+        result = scan_library(self.root, self.catalog, jobs=1)
+        self.assertEqual(sorted(result.scanned), [str(self.root / "a.iso"), str(self.root / "sub" / "b.wbfs")])
+        self.assertEqual(len(result.failed), 2)
+        self.assertIsNotNone(self.catalog.get(str(self.root / "a.iso")).error)
+
+        (self.root / "a.iso").write_bytes(os.urandom(0x200))
+        (self.root / "sub" / "b.wbfs").unlink()
+        result = scan_library(self.root, self.catalog, jobs=1)
+        self.assertEqual(result.scanned, [str(self.root / "a.iso")])
+        self.assertEqual(result.removed, [str(self.root / "sub" / "b.wbfs")])
+
+        result = scan_library(self.root, self.catalog, jobs=1)
+        self.assertEqual(result.scanned, [])
+        self.assertEqual(result.unchanged, [str(self.root / "a.iso")])
+
+
+if __name__ == "__main__":
+    unittest.main()
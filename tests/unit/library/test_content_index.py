@@ -0,0 +1,65 @@
+import hashlib
+import unittest
+
+from wiithon.crypto.layout import GROUP_DATA_SIZE, SHA1_SIZE
+from wiithon.disc.group_digests import group_digest
+from wiithon.library.content_index import ContentIndex
+
+
+def _h3(*groups: int) -> bytes:
+    return b"".join(bytes([group]) * SHA1_SIZE for group in groups)
+
+
+class TestGroupDigest(unittest.TestCase):
+
+    def test_covers_spanned_groups_only(self):
+        h3 = _h3(1, 2, 3)
+        self.assertEqual(group_digest(h3, 0x10, 0x20), hashlib.sha1(_h3(1)).digest())
+        self.assertEqual(group_digest(h3, GROUP_DATA_SIZE - 1, 2), hashlib.sha1(_h3(1, 2)).digest())
+        self.assertEqual(group_digest(h3, GROUP_DATA_SIZE, GROUP_DATA_SIZE), hashlib.sha1(_h3(2)).digest())
+
+    def test_empty_file_uses_its_group(self):
+        self.assertEqual(group_digest(_h3(1, 2), GROUP_DATA_SIZE, 0), hashlib.sha1(_h3(2)).digest())
+
+
+class TestContentIndexQueries(unittest.TestCase):
+
+    def setUp(self):
+        self.index = ContentIndex(":memory:")
+        self.addCleanup(self.index.close)
+        discs = {
+            "/discs/v1.iso": {"a.arc": "aa", "b.arc": "bb", "old.bin": "cc"},
+            "/discs/v2.iso": {"a.arc": "aa", "b.arc": "b2", "new.bin": "dd"},
+        }
+        with self.index.connection as connection:
+            for disc, files in discs.items():
+                connection.execute("INSERT INTO indexed_discs VALUES (?, 0, 0, 'RTST01', 0)", (disc,))
+                connection.executemany(
+                    "INSERT INTO file_digests VALUES (?, 'data', ?, 0, 0, NULL, ?)",
+                    ((disc, path, sha1) for path, sha1 in files.items()),
+                )
+
+    def test_find_blob(self):
+        self.assertEqual(self.index.find_blob("AA"), [
+            ("/discs/v1.iso", "data", "a.arc"),
+            ("/discs/v2.iso", "data", "a.arc"),
+        ])
+        self.assertEqual(self.index.find_blob("ff"), [])
+
+    def test_shared_blobs(self):
+        self.assertEqual(self.index.shared_blobs(), {"aa": ["/discs/v1.iso", "/discs/v2.iso"]})
+
+    def test_diff(self):
+        diff = self.index.diff("/discs/v1.iso", "/discs/v2.iso")
+        self.assertEqual(diff.added, [("data", "new.bin")])
+        self.assertEqual(diff.removed, [("data", "old.bin")])
+        self.assertEqual(diff.changed, [("data", "b.arc")])
+
+    def test_remove_drops_files(self):
+        self.index.remove("/discs/v1.iso")
+        self.assertEqual(self.index.discs(), ["/discs/v2.iso"])
+        self.assertEqual(self.index.files("/discs/v1.iso"), {})
+
+
+if __name__ == "__main__":
+    unittest.main()